@@ -0,0 +1,132 @@
+"""On-disk cache of API JSON responses."""
+
+from __future__ import annotations
+
+from pathlib import Path
+from time import time
+import hashlib
+import logging
+import os
+
+from .utils import atomic_write
+
+__all__ = ('ResponseCache',)
+
+log = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    Keep recent API responses on disk so re-runs and retries do not request them again.
+
+    Each response is stored in a file named after the SHA-256 digest of its key (normally the
+    request URL including the query string). Entries older than :py:attr:`ttl` are discarded on
+    lookup. When the total size exceeds :py:attr:`max_bytes`, the least recently used entries
+    are removed. The access time of an entry records its last use and is updated explicitly, so
+    eviction does not depend on the file system's ``atime`` mount options.
+    """
+    def __init__(self,
+                 root: str | Path,
+                 *,
+                 max_bytes: int = 256 * 1024 * 1024,
+                 ttl: float = 3600) -> None:
+        """
+        Initialise the cache.
+
+        Parameters
+        ----------
+        root : str | Path
+            Cache directory. It is resolved immediately, so later changes of the working
+            directory do not affect it.
+        max_bytes : int
+            Maximum total size of the cached responses.
+        ttl : float
+            Number of seconds a response stays valid after it was stored.
+        """
+        self.root = Path(root).resolve()
+        """Cache directory."""
+        self.max_bytes = max_bytes
+        """Maximum total size of the cached responses."""
+        self.ttl = ttl
+        """Number of seconds a response stays valid after it was stored."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._size = sum(path.stat().st_size for path in self.root.glob('*.json'))
+
+    def path(self, key: str) -> Path:
+        """
+        Get the location of the entry for a key.
+
+        Parameters
+        ----------
+        key : str
+            Cache key.
+
+        Returns
+        -------
+        Path
+            Entry location inside :py:attr:`root`.
+        """
+        return self.root / f'{hashlib.sha256(key.encode()).hexdigest()}.json'
+
+    def get(self, key: str) -> bytes | None:
+        """
+        Get a cached response.
+
+        Parameters
+        ----------
+        key : str
+            Cache key.
+
+        Returns
+        -------
+        bytes | None
+            The response body, or ``None`` if it is not cached or has expired.
+        """
+        path = self.path(key)
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        now = time()
+        if now - stat.st_mtime > self.ttl:
+            log.debug('Cached response for %s has expired.', key)
+            self._remove(path, stat.st_size)
+            return None
+        content = path.read_bytes()
+        os.utime(path, (now, stat.st_mtime))
+        log.debug('Using cached response for %s.', key)
+        return content
+
+    def put(self, key: str, content: bytes) -> None:
+        """
+        Store a response, evicting the least recently used entries if the cache is full.
+
+        Parameters
+        ----------
+        key : str
+            Cache key.
+        content : bytes
+            Response body. Bodies larger than :py:attr:`max_bytes` are not stored.
+        """
+        if len(content) > self.max_bytes:
+            return
+        path = self.path(key)
+        if path.exists():
+            self._remove(path, path.stat().st_size)
+        atomic_write(path, content)
+        self._size += len(content)
+        if self._size > self.max_bytes:
+            self._evict()
+
+    def _remove(self, path: Path, size: int) -> None:
+        path.unlink(missing_ok=True)
+        self._size -= size
+
+    def _evict(self) -> None:
+        entries = sorted(((path, path.stat()) for path in self.root.glob('*.json')),
+                         key=lambda entry: entry[1].st_atime)
+        for path, stat in entries:
+            if self._size <= self.max_bytes:
+                break
+            log.debug('Evicting cached response %s.', path.name)
+            self._remove(path, stat.st_size)
@@ -0,0 +1,154 @@
+"""SQLite catalogue of archived post, media and comment metadata."""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+import logging
+import sqlite3
+
+from .constants import CATALOGUE_SCHEMA
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator, Mapping, Sequence
+
+__all__ = ('Catalogue',)
+
+log = logging.getLogger(__name__)
+
+_POST_COLUMNS = ('id', 'pk', 'code', 'owner_id', 'owner_username', 'taken_at', 'media_type',
+                 'caption', 'like_count', 'comment_count')
+_MEDIA_COLUMNS = ('id', 'post_id', 'position', 'media_type', 'width', 'height', 'image_url',
+                  'video_url')
+_COMMENT_COLUMNS = ('pk', 'media_id', 'parent_pk', 'user_id', 'username', 'text', 'created_at',
+                    'like_count')
+
+
+def _upsert(table: str, columns: Sequence[str]) -> str:
+    # Table and column names are the constants above. Values that are missing from a payload
+    # (``NULL``) do not overwrite what an earlier, more complete payload recorded.
+    names = ', '.join(columns)
+    placeholders = ', '.join('?' * len(columns))
+    updates = ', '.join(
+        f'{column} = COALESCE(excluded.{column}, {column})' for column in columns[1:])
+    return (
+        f'INSERT INTO {table} ({names}) VALUES ({placeholders}) '  # ruff:ignore[hardcoded-sql-expression]
+        f'ON CONFLICT ({columns[0]}) DO UPDATE SET {updates}, date = CURRENT_TIMESTAMP')
+
+
+def _first(key: str, *sources: Mapping[str, Any]) -> Any:
+    return next((source[key] for source in sources if source.get(key) is not None), None)
+
+
+def _text(value: Any) -> str | None:
+    return None if value is None else str(value)
+
+
+def _best_url(candidates: Iterable[Mapping[str, Any]] | None) -> tuple[str | None, Any, Any]:
+    best = max(candidates or (), key=lambda x: x['width'] * x['height'], default=None)
+    return (None, None, None) if best is None else (best['url'], best['width'], best['height'])
+
+
+def _post_row(node: Mapping[str, Any], item: Mapping[str, Any]) -> tuple[Any, ...]:
+    owner = _first('owner', node, item) or _first('user', node, item) or {}
+    caption = _first('caption', item, node)
+    return (str(node['id']), _text(_first('pk', node, item)), _first('code', node, item),
+            _text(_first('id', owner)
+                  or _first('pk', owner)), owner.get('username'), _first('taken_at', item, node),
+            _first('media_type', item,
+                   node), caption.get('text') if isinstance(caption, dict) else None,
+            _first('like_count', item, node), _first('comment_count', item, node))
+
+
+def _media_rows(post_id: str, items: Iterable[Mapping[str, Any]]) -> Iterator[tuple[Any, ...]]:
+    position = 0
+    for item in items:
+        for sub_item in item.get('carousel_media') or (item,):
+            image_url, width, height = _best_url((sub_item.get('image_versions2')
+                                                  or {}).get('candidates'))
+            video_url, _, _ = _best_url(sub_item.get('video_versions'))
+            yield (str(sub_item['id']), post_id, position, sub_item.get('media_type'),
+                   _first('original_width', sub_item) or width, _first('original_height', sub_item)
+                   or height, image_url, video_url)
+            position += 1
+
+
+def _comment_rows(media_id: str,
+                  comments: Iterable[Mapping[str, Any]],
+                  parent_pk: str | None = None) -> Iterator[tuple[Any, ...]]:
+    for comment in comments:
+        pk = _text(_first('pk', comment) or _first('id', comment))
+        if pk is None:
+            continue
+        user = comment.get('user') or {}
+        yield (pk, media_id, parent_pk, _text(_first('pk', user)
+                                              or _first('id', user)), user.get('username'),
+               comment.get('text'), comment.get('created_at'), comment.get('comment_like_count'))
+        yield from _comment_rows(media_id, comment.get('child_comments') or (), pk)
+
+
+class Catalogue:
+    """
+    Normalised metadata of archived posts in a SQLite database.
+
+    The JSON files of an archive keep the full API responses. The catalogue keeps the fields
+    that are commonly queried (owner, time, caption, counts, media dimensions and URLs, comment
+    authors and text) in indexed ``posts``, ``media`` and ``comments`` tables, so questions
+    about the archive do not require reading every JSON file. Rows are inserted or updated as
+    posts and comments are saved, and one catalogue can be shared by several output
+    directories.
+    """
+    def __init__(self, path: str | Path) -> None:
+        """
+        Open or create the catalogue.
+
+        Parameters
+        ----------
+        path : str | Path
+            Location of the SQLite database file.
+        """
+        self.path = Path(path)
+        """Location of the SQLite database file."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(self.path)
+        self._connection.executescript(CATALOGUE_SCHEMA)
+
+    def save_post(self, node: Mapping[str, Any], items: Iterable[Mapping[str, Any]] = ()) -> None:
+        """
+        Insert or update a post and its media items.
+
+        Parameters
+        ----------
+        node : Mapping[str, Any]
+            Post node, as saved to ``{id}.json``.
+        items : Iterable[Mapping[str, Any]]
+            Media information items of the post, as saved to ``{id}-media-info-0000.json``.
+            When empty, the node itself is used as the only item.
+        """
+        items = tuple(items) or (node,)
+        post_id = str(node['id'])
+        with self._connection:
+            self._connection.execute(_upsert('posts', _POST_COLUMNS), _post_row(node, items[0]))
+            self._connection.executemany(_upsert('media', _MEDIA_COLUMNS),
+                                         _media_rows(post_id, items))
+        log.debug('Catalogued post %s.', post_id)
+
+    def save_comments(self, media_id: str, comments: Iterable[Mapping[str, Any]]) -> None:
+        """
+        Insert or update the comments of a post, including embedded replies.
+
+        Parameters
+        ----------
+        media_id : str
+            Media ID of the post.
+        comments : Iterable[Mapping[str, Any]]
+            Top-level comments, as saved to ``{id}-comments.json``. Replies under
+            ``child_comments`` are recorded with the primary key of their parent.
+        """
+        with self._connection:
+            self._connection.executemany(_upsert('comments', _COMMENT_COLUMNS),
+                                         _comment_rows(media_id, comments))
+
+    def close(self) -> None:
+        """Close the database connection."""
+        self._connection.close()
@@ -2,18 +2,38 @@
 
 from __future__ import annotations
 
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+from functools import wraps
 from http import HTTPStatus
 from os import utime
-from typing import TYPE_CHECKING, Any, TypeVar, cast
+from pathlib import Path
+from time import perf_counter
+from typing import TYPE_CHECKING, Any, Concatenate, Literal, ParamSpec, TypeVar, cast
+from urllib.parse import urlencode
+import asyncio
+import hashlib
 import json
 import logging
 
-from niquests.exceptions import HTTPError, RetryError
-from typing_extensions import Self
-from yt_dlp_utils.aio import setup_session
+from niquests.exceptions import (
+    ConnectionError as RequestConnectionError,
+    HTTPError,
+    Timeout,
+)
+from typing_extensions import Self, override
+from yt_dlp_utils.aio import AsyncYoutubeDL, setup_session
 
 from .constants import API_HEADERS, SHARED_HEADERS
+from .layout import OutputLayout, media_id_of
+from .metrics import RequestSample
+from .retry import RETRY_STATUSES, RetryPolicy
 from .typing import (
+    ENDPOINT_CDN_GET,
+    ENDPOINT_CDN_HEAD,
+    ENDPOINT_CHILD_COMMENTS,
+    ENDPOINT_COMMENTS,
+    ENDPOINT_GRAPHQL,
+    ENDPOINT_MEDIA_INFO,
     POSTS_HANDLED,
     CarouselMedia,
     ChildCommentsPage,
@@ -24,23 +44,50 @@ from .typing import (
     MediaInfoItem,
     MediaInfoItemImageVersions2Candidate,
     StoryReelItem,
+    XDTMediaDict,
     XDTStoriesV3ReelPageGalleryConnection,
     XDTStoriesV3ReelPageGalleryQueryResponse,
 )
-from .utils import dump_json, get_extension, json_dumps_formatted, write_bytes, write_if_new
+from .utils import (
+    JSON_SUFFIXES,
+    WriteSync,
+    encode_json,
+    get_extension,
+    json_variants,
+    write_bytes,
+    write_failed_urls,
+)
+from .workers import failure_key
 
 if TYPE_CHECKING:
-    from collections.abc import Iterable, Mapping, Sequence
+    from collections.abc import (
+        Awaitable,
+        Callable,
+        Coroutine,
+        Generator,
+        Iterable,
+        Mapping,
+        Sequence,
+    )
     from types import TracebackType
-    import asyncio
 
-    from niquests import AsyncSession
+    from niquests import AsyncSession, Response
 
-    from .typing import BrowserName, Stats, YTDLPState
+    from .cache import ResponseCache
+    from .catalogue import Catalogue
+    from .dedup import LogDB
+    from .store import ContentStore
+    from .typing import BrowserName, FailedItem, Stats, YTDLPState
+    from .utils import JSONFormat
+    from .workers import DeferredRetries
 
-__all__ = ('CSRFTokenNotFound', 'InstagramClient', 'UnexpectedRedirect')
+__all__ = ('CSRFTokenNotFound', 'InstagramClient', 'LogDBClient', 'QueryRejected',
+           'UnexpectedRedirect')
 
 T = TypeVar('T')
+_C = TypeVar('_C', bound='InstagramClient')
+_P = ParamSpec('_P')
+_R = TypeVar('_R')
 log = logging.getLogger(__name__)
 
 _REEL_PAGE_GALLERY_DOC_ID = '26659189347081290'
@@ -75,6 +122,70 @@ def _extract_reel_connection(
     return None
 
 
+def _has_image_data(node: XDTMediaDict) -> bool:
+    """
+    Check whether a timeline node carries everything needed to archive its images.
+
+    Parameters
+    ----------
+    node : XDTMediaDict
+        Timeline edge node.
+
+    Returns
+    -------
+    bool
+        ``True`` if the node has ``taken_at`` and image candidates for itself or for every
+        carousel item.
+    """
+    if 'taken_at' not in node:
+        return False
+    if carousel_media := node.get('carousel_media'):
+        return all(
+            sub_item.get('image_versions2', {}).get('candidates') for sub_item in carousel_media)
+    return bool(node.get('image_versions2', {}).get('candidates'))
+
+
+def _is_stub(node: XDTMediaDict) -> bool:
+    """
+    Check whether a node only identifies a post, as failures queued without the saved node are.
+
+    Parameters
+    ----------
+    node : XDTMediaDict
+        Timeline edge node.
+
+    Returns
+    -------
+    bool
+        ``True`` if the node has no keys other than ``id``, ``pk`` and ``taken_at``.
+    """
+    return set(node) <= {'id', 'pk', 'taken_at'}
+
+
+def _timed(
+    func: Callable[Concatenate[_C, _P], Awaitable[_R]]
+) -> Callable[Concatenate[_C, _P], Coroutine[Any, Any, _R]]:
+    """
+    Record each call of an async client method as a span named after the method.
+
+    Parameters
+    ----------
+    func : Callable[Concatenate[_C, _P], Awaitable[_R]]
+        Method to wrap.
+
+    Returns
+    -------
+    Callable[Concatenate[_C, _P], Coroutine[Any, Any, _R]]
+        Wrapped method. Spans are only recorded when :py:meth:`Stats.enable_spans` was called.
+    """
+    @wraps(func)
+    async def wrapper(client: _C, /, *args: _P.args, **kwargs: _P.kwargs) -> _R:
+        with client._span(func.__name__):  # ruff:ignore[private-member-access]
+            return await func(client, *args, **kwargs)
+
+    return wrapper
+
+
 class CSRFTokenNotFound(RuntimeError):
     """CSRF token not found in cookies."""
 
@@ -83,6 +194,10 @@ class UnexpectedRedirect(RuntimeError):
     """Unexpected redirect in a request."""
 
 
+class QueryRejected(RuntimeError):
+    """GraphQL query rejected by the server as invalid."""
+
+
 class InstagramClient:
     """Generic asynchronous client for Instagram."""
     def __init__(self, browser: BrowserName = 'chrome', browser_profile: str = 'Default') -> None:
@@ -100,25 +215,203 @@ class InstagramClient:
         self._browser_profile = browser_profile
         self.session: AsyncSession
         """The niquests :py:class:`~niquests.AsyncSession` used for all HTTP calls."""
+        self.catalogue: Catalogue | None = None
+        """Catalogue that saved post metadata and comments are recorded in, when set."""
+        self.deferred_retries: DeferredRetries | None = None
+        """Retry stage that failed worker items are handed to, when set."""
         self.failed_urls: set[str] = set()
         """Set of failed URLs."""
+        self.in_flight: set[str] = set()
+        """
+        Media ``pk`` values and video permalinks queued or fetched during this run.
+
+        Entries are never removed, so an item reached through more than one endpoint is only
+        fetched once per run, even before :py:meth:`is_saved` can know about it.
+        """
+        self.json_format: JSONFormat = 'pretty'
+        """Format the per-post JSON files are written in."""
+        self.layout = OutputLayout()
+        """Layout deciding which sub-directory each per-media file is written to."""
+        self.media_store: ContentStore | None = None
+        """Content-addressed store that saved images are linked from, when set."""
+        self.response_cache: ResponseCache | None = None
+        """On-disk cache consulted for media information and comments, when set."""
+        self.retry_policy = RetryPolicy()
+        """Policy for retrying failed requests."""
         self.should_save_child_comments: bool = False
         """Whether to recursively fetch child (reply) comments."""
         self.should_save_comments: bool = False
         """Whether to fetch comments. Subclasses or mixins flip this on."""
+        self.stats: Stats | None = None
+        """Live statistics receiving per-endpoint request timings, when set."""
         self.video_urls: list[str] = []
         """List of video URLs to download."""
+        self.write_sync = WriteSync()
+        """
+        Policy for flushing the files this client writes. Scrapers make it active with
+        :py:func:`~instagram_archiver.utils.use_write_sync` while processing.
+        """
+        self._retries_used: dict[str, int] = {}
+
+    def _yt_dlp_in_output_dir(self, ydl: AsyncYoutubeDL) -> AsyncYoutubeDL:
+        # yt-dlp resolves a relative ``home`` path against the working directory, which is shared
+        # by every scraper in the process, so anchor it to the output directory instead. ``ydl``
+        # may be shared with other scrapers, and its extractor and post-processor instances refer
+        # back to it, so build a separate instance from the same parameters.
+        paths = ydl.ydl.params.get('paths') or {}
+        home = Path(paths.get('home', ''))
+        if home.is_absolute():
+            return ydl
+        return AsyncYoutubeDL(
+            type(ydl.ydl)({
+                **ydl.ydl.params, 'paths': {
+                    **paths, 'home': str(self.layout.root.resolve() / home)
+                }
+            }))
 
     async def _setup_session(self) -> None:
         """Create the underlying :py:class:`~niquests.AsyncSession`."""
         self.session = await setup_session(self._browser,
                                            self._browser_profile,
-                                           domains={'instagram.com'},
-                                           setup_retry=True)
+                                           domains={'instagram.com'})
         # ``CaseInsensitiveDict`` keys are invariant ``str | bytes``, so pass items() to hit the
         # covariant ``Iterable[tuple[...]]`` overload instead of the ``Mapping`` one.
         self.session.headers.update(SHARED_HEADERS.items())
 
+    @contextmanager
+    def _measure(self, endpoint: str) -> Generator[RequestSample, None, None]:
+        """
+        Time a request and record it under ``endpoint`` in :py:attr:`stats`.
+
+        Parameters
+        ----------
+        endpoint : str
+            Endpoint key, typically one of the ``ENDPOINT_*`` constants.
+
+        Yields
+        ------
+        RequestSample
+            Accumulator the caller passes each response to so its body size and status are
+            counted. Exceptions raised inside the block mark the request as failed.
+        """
+        sample = RequestSample()
+        stats = self.stats
+        if stats is not None:
+            stats.in_flight += 1
+        started = perf_counter()
+        try:
+            yield sample
+        except Exception:
+            sample.failed = True
+            raise
+        finally:
+            if stats is not None:
+                stats.in_flight -= 1
+                stats.observe_request(endpoint,
+                                      perf_counter() - started,
+                                      sample.nbytes,
+                                      failed=sample.failed)
+
+    async def _request(self,
+                       method: Literal['get', 'head', 'post'],
+                       url: str,
+                       *,
+                       endpoint: str | None = None,
+                       **kwargs: Any) -> Response:
+        """
+        Send a request, retrying it according to :py:attr:`retry_policy`.
+
+        Parameters
+        ----------
+        method : Literal['get', 'head', 'post']
+            Session method to call.
+        url : str
+            URL to request.
+        endpoint : str | None
+            Endpoint key under which each attempt is timed in :py:attr:`stats` and whose retry
+            budget is used. Requests without a key are not timed and share one budget.
+        **kwargs : Any
+            Arguments passed to the session method.
+
+        Returns
+        -------
+        Response
+            The last response. Its status may still be an error once the retries or the
+            endpoint budget are used up.
+
+        Raises
+        ------
+        ConnectionError
+            If the connection fails and no retries are left.
+        Timeout
+            If the request times out and no retries are left.
+        """
+        budget_key = endpoint or 'other'
+        attempt = 0
+        while True:
+            retry_after = None
+            try:
+                with (self._measure(endpoint)
+                      if endpoint is not None else nullcontext(RequestSample())) as sample:
+                    r: Response = await getattr(self.session, method)(url, **kwargs)
+                    sample.record(r)
+            except (RequestConnectionError, Timeout):
+                if not self._use_retry(budget_key, attempt):
+                    raise
+                log.debug('Request to %s failed.', url, exc_info=True)
+            else:
+                if r.status_code not in RETRY_STATUSES or not self._use_retry(budget_key, attempt):
+                    return r
+                retry_after = r.headers.get('Retry-After')
+            delay = self.retry_policy.delay(attempt, retry_after)
+            attempt += 1
+            log.warning('Retrying %s in %.1f seconds (retry %d of %d).', url, delay, attempt,
+                        self.retry_policy.max_retries)
+            await asyncio.sleep(delay)
+
+    def _use_retry(self, budget_key: str, attempt: int) -> bool:
+        """
+        Take one retry from the budget of an endpoint.
+
+        Parameters
+        ----------
+        budget_key : str
+            Endpoint key.
+        attempt : int
+            Number of retries of the request so far.
+
+        Returns
+        -------
+        bool
+            ``True`` if the request may be retried.
+        """
+        if attempt >= self.retry_policy.max_retries:
+            return False
+        used = self._retries_used.get(budget_key, 0)
+        if used >= self.retry_policy.budget_for(budget_key):
+            log.debug('Retry budget of %s is used up.', budget_key)
+            return False
+        self._retries_used[budget_key] = used + 1
+        if self.stats is not None:
+            self.stats.retries += 1
+        return True
+
+    def _span(self, name: str) -> AbstractContextManager[None]:
+        """
+        Time a block as a named span in :py:attr:`stats`.
+
+        Parameters
+        ----------
+        name : str
+            Span name, typically the name of the wrapped method.
+
+        Returns
+        -------
+        AbstractContextManager[None]
+            :py:meth:`Stats.span` context, or a no-op context without :py:attr:`stats`.
+        """
+        return nullcontext() if self.stats is None else self.stats.span(name)
+
     def add_video_url(self, url: str) -> None:
         """
         Add a video URL to the list of video URLs.
@@ -145,12 +438,14 @@ class InstagramClient:
             raise CSRFTokenNotFound
         self.session.headers.update({'x-csrftoken': token})
 
+    @_timed
     async def graphql_query(
             self,
             variables: Mapping[str, Any],
             *,
             cast_to: type[T],  # ruff:ignore[unused-method-argument]
-            doc_id: str = '9806959572732215') -> T | None:
+            doc_id: str = '9806959572732215',
+            raise_rejected: bool = False) -> T | None:
         """
         Make a GraphQL query.
 
@@ -162,27 +457,42 @@ class InstagramClient:
             Expected type of the ``data`` field in a successful response.
         doc_id : str
             GraphQL document identifier.
+        raise_rejected : bool
+            Whether to raise :py:class:`QueryRejected` instead of returning ``None`` when the
+            server rejects the query itself (a 400 status, or errors without data), as opposed
+            to failing for a reason that may clear, such as rate limiting.
 
         Returns
         -------
         T | None
             The ``data`` payload, or ``None`` if the request failed or the response was invalid.
+
+        Raises
+        ------
+        QueryRejected
+            If ``raise_rejected`` is ``True`` and the server rejected the query.
         """
-        r = await self.session.post('https://www.instagram.com/graphql/query',
-                                    headers={
-                                        'content-type': 'application/x-www-form-urlencoded',
-                                        **API_HEADERS
-                                    },
-                                    data={
-                                        'doc_id': doc_id,
-                                        'variables': json.dumps(variables, separators=(',', ':'))
-                                    })
+        r = await self._request('post',
+                                'https://www.instagram.com/graphql/query',
+                                endpoint=ENDPOINT_GRAPHQL,
+                                headers={
+                                    'content-type': 'application/x-www-form-urlencoded',
+                                    **API_HEADERS
+                                },
+                                data={
+                                    'doc_id': doc_id,
+                                    'variables': json.dumps(variables, separators=(',', ':'))
+                                })
         if r.status_code != HTTPStatus.OK:
+            if raise_rejected and r.status_code == HTTPStatus.BAD_REQUEST:
+                raise QueryRejected(r.text)
             return None
         data = r.json()
         if not isinstance(data, dict):
             log.error('GraphQL response was not a JSON object.')
             return None
+        if raise_rejected and data.get('errors') and not data.get('data'):
+            raise QueryRejected(json.dumps(data['errors']))
         if (status := data.get('status')) != 'ok':
             log.error('GraphQL status not "ok": %s', status)
             return None
@@ -209,7 +519,7 @@ class InstagramClient:
         str
             Response body as text.
         """
-        r = await self.session.get(url, params=params, headers=API_HEADERS)
+        r = await self._request('get', url, params=params, headers=API_HEADERS)
         r.raise_for_status()
         return r.text or ''
 
@@ -218,6 +528,8 @@ class InstagramClient:
             url: str,
             *,
             cast_to: type[T],  # ruff:ignore[unused-method-argument]
+            cached: bool = False,
+            endpoint: str | None = None,
             headers: Mapping[str, str] | None = None,
             params: Mapping[str, str] | None = None) -> T:
         """
@@ -229,6 +541,11 @@ class InstagramClient:
             URL to fetch.
         cast_to : type[T]
             Expected type of the decoded JSON body.
+        cached : bool
+            Whether the response may be served from and stored in :py:attr:`response_cache`.
+        endpoint : str | None
+            Endpoint key under which the request is timed in :py:attr:`stats`. Requests without
+            a key are not timed.
         headers : Mapping[str, str] | None
             Optional per-call headers. When ``None`` (the default), :py:data:`API_HEADERS` is
             used. Passing an explicit dict (typically ``API_HEADERS`` plus a ``Referer``) lets
@@ -241,9 +558,19 @@ class InstagramClient:
         T
             Response body decoded from JSON.
         """
+        cache = self.response_cache if cached else None
+        cache_key = f'{url}?{urlencode(sorted(params.items()))}' if params else url
+        if cache is not None and (content := cache.get(cache_key)) is not None:
+            return cast('T', json.loads(content))
         request_headers = dict(API_HEADERS if headers is None else headers)
-        r = await self.session.get(url, params=params, headers=request_headers)
+        r = await self._request('get',
+                                url,
+                                endpoint=endpoint,
+                                params=params,
+                                headers=request_headers)
         r.raise_for_status()
+        if cache is not None and r.content is not None:
+            cache.put(cache_key, r.content)
         return cast('T', r.json())
 
     async def highlights_tray(self, user_id: int | str) -> HighlightsTray:
@@ -278,7 +605,9 @@ class InstagramClient:
 
     async def __aexit__(self, _: type[BaseException] | None, __: BaseException | None,
                         ___: TracebackType | None) -> None:
-        """Close the underlying session."""
+        """Close the underlying session and the catalogue, if any."""
+        if self.catalogue is not None:
+            self.catalogue.close()
         await self.session.close()
 
     def is_saved(  # ruff: ignore[no-self-use]
@@ -310,8 +639,73 @@ class InstagramClient:
             URL to record.
         """
 
+    def is_archived(self, path: Path) -> bool:  # ruff: ignore[no-self-use]
+        """
+        Check whether a file has already been archived.
+
+        A JSON file archived in another JSON format counts as archived.
+
+        Parameters
+        ----------
+        path : Path
+            File location, as returned by :py:meth:`OutputLayout.path
+            <instagram_archiver.layout.OutputLayout.path>`.
+
+        Returns
+        -------
+        bool
+            Whether the file exists in any JSON format, in the base implementation.
+        """
+        return any(variant.is_file() for variant in json_variants(path))
+
+    def record_file(self, path: Path, content: bytes) -> None:
+        """
+        Record a file that was just archived.
+
+        Parameters
+        ----------
+        path : Path
+            File location.
+        content : bytes
+            Content that was written.
+        """
+
+    def _write_file(self, path: Path, content: bytes) -> None:
+        write_bytes(path, content)
+        self.record_file(path, content)
+
+    def _json_path(self, name: str, taken_at: int | None) -> Path:
+        return self.layout.path(f'{name}{JSON_SUFFIXES[self.json_format]}', taken_at)
+
+    def _write_if_new(self, path: Path, content: bytes, timestamp: int) -> None:
+        if not self.is_archived(path):
+            self._write_file(path, content)
+            utime(path, (timestamp, timestamp))
+
+    def claim(self, key: str) -> bool:
+        """
+        Mark an item as in flight for this run.
+
+        Parameters
+        ----------
+        key : str
+            Media ``pk`` or video permalink.
+
+        Returns
+        -------
+        bool
+            ``True`` if the item was not in flight yet and the caller should fetch it, ``False``
+            if it is a duplicate.
+        """
+        if key in self.in_flight:
+            log.debug('Skipping %s, already in flight.', key)
+            return False
+        self.in_flight.add(key)
+        return True
+
+    @_timed
     async def save_image_versions2(self, sub_item: CarouselMedia | MediaInfoItem | StoryReelItem,
-                                   timestamp: int) -> None:
+                                   timestamp: int) -> bool:
         """
         Save images in the ``image_versions2`` dictionary.
 
@@ -321,26 +715,42 @@ class InstagramClient:
             Source item containing ``image_versions2`` candidates.
         timestamp : int
             Timestamp to apply to the saved file.
+
+        Returns
+        -------
+        bool
+            ``True`` if the image is saved (now or on an earlier run), ``False`` if the CDN did
+            not serve it.
         """
         def key(x: MediaInfoItemImageVersions2Candidate) -> int:
             return x['width'] * x['height']
 
         best = max(sub_item['image_versions2']['candidates'], key=key)
         if self.is_saved(best['url']):
-            return
-        r = await self.session.head(best['url'])
+            return True
+        r = await self._request('head', best['url'], endpoint=ENDPOINT_CDN_HEAD)
         if r.status_code != HTTPStatus.OK:
             log.warning('HEAD request failed with status code %s.', r.status_code)
-            return
+            return False
         content_type = r.headers['content-type']
         ext = get_extension(content_type)
-        name = f'{sub_item["id"]}.{ext}'
-        body = await self.session.get(best['url'])
-        if body.content is not None:
-            write_bytes(name, body.content)
-        utime(name, (timestamp, timestamp))
+        name = self.layout.path(f'{sub_item["id"]}.{ext}', timestamp)
+        body = await self._request('get', best['url'], endpoint=ENDPOINT_CDN_GET)
+        if body.content is None:
+            log.warning('Empty response for %s.', best['url'])
+            return False
+        if self.media_store is not None:
+            self.media_store.put(name, body.content)
+            self.record_file(name, body.content)
+        else:
+            self._write_file(name, body.content)
+        # A hard link into the media store shares its modification time with every other post
+        # linked to the same blob, so only a file of its own gets the time of the post.
+        if self.media_store is None or name.stat().st_nlink == 1:
+            utime(name, (timestamp, timestamp))
         if r.url is not None:
             self.save_to_log(r.url)
+        return True
 
     async def reel_page_gallery(
             self,
@@ -414,14 +824,14 @@ class InstagramClient:
                              video_queue: asyncio.Queue[str | None] | None = None,
                              *,
                              username: str | None = None,
-                             yt_dlp_state: YTDLPState | None = None) -> None:
+                             yt_dlp_state: YTDLPState | None = None) -> bool:
         """
         Save a single story item.
 
         Image-only items are written via :py:meth:`save_image_versions2`; items with a video are
         routed to ``video_queue`` for the yt-dlp worker (or appended to
         :py:attr:`video_urls` when no queue is supplied, mirroring the synchronous helper used
-        elsewhere).
+        elsewhere). Items whose ``pk`` is already in :py:attr:`in_flight` are skipped.
 
         Parameters
         ----------
@@ -437,7 +847,15 @@ class InstagramClient:
         yt_dlp_state : YTDLPState | None
             Optional yt-dlp progress state whose ``total_urls`` counter is incremented when a
             video URL is enqueued.
+
+        Returns
+        -------
+        bool
+            ``False`` if the image of the item could not be saved, ``True`` otherwise (including
+            skipped items and queued videos).
         """
+        if not self.claim(item['pk']):
+            return True
         has_video = bool(item.get('video_versions')) or bool(item.get('video_dash_manifest'))
         if has_video:
             permalink = (f'https://www.instagram.com/stories/{username or "_"}/'
@@ -448,12 +866,13 @@ class InstagramClient:
                 await video_queue.put(permalink)
                 if yt_dlp_state is not None:
                     yt_dlp_state.total_urls += 1
-            return
+            return True
         if 'image_versions2' not in item:
             log.debug('Reel item `%s` has neither image nor video data.', item.get('pk'))
-            return
-        await self.save_image_versions2(item, item['taken_at'])
+            return True
+        return await self.save_image_versions2(item, item['taken_at'])
 
+    @_timed
     async def save_comments(self, edge: Edge) -> None:
         """
         Save comments for an edge node.
@@ -480,6 +899,8 @@ class InstagramClient:
                                                params={
                                                    **shared_params, 'permalink_enabled': 'false'
                                                },
+                                               cached=True,
+                                               endpoint=ENDPOINT_COMMENTS,
                                                headers=request_headers,
                                                cast_to=Comments)
         except HTTPError:
@@ -495,6 +916,8 @@ class InstagramClient:
                                                        'sort_order':
                                                            'popular'
                                                    },
+                                                   cached=True,
+                                                   endpoint=ENDPOINT_COMMENTS,
                                                    headers=request_headers,
                                                    cast_to=Comments)
             except HTTPError:
@@ -506,8 +929,11 @@ class InstagramClient:
             await self._embed_child_comments(media_pk,
                                              top_comment_data['comments'],
                                              headers=request_headers)
-        comments_json = f'{media_id}-comments.json'
-        dump_json(comments_json, top_comment_data, mode='w+')
+        comments_json = self._json_path(f'{media_id}-comments', edge['node'].get('taken_at'))
+        self._write_file(comments_json, encode_json(top_comment_data, self.json_format))
+        if self.catalogue is not None:
+            with self._span('catalogue.save_comments'):
+                self.catalogue.save_comments(media_id, top_comment_data['comments'])
 
     async def _embed_child_comments(self,
                                     media_pk: str,
@@ -573,6 +999,8 @@ class InstagramClient:
             try:
                 page = await self.get_json(url,
                                            params=params,
+                                           cached=True,
+                                           endpoint=ENDPOINT_CHILD_COMMENTS,
                                            headers=headers,
                                            cast_to=ChildCommentsPage)
             except HTTPError:
@@ -585,10 +1013,18 @@ class InstagramClient:
             params = {**params, 'min_id': next_min_id}
         return replies
 
+    @_timed
     async def save_media(self, edge: Edge) -> None:
         """
         Save media for an edge node.
 
+        When the node already carries ``taken_at`` and image candidates (as timeline nodes
+        usually do), the images are saved from it directly, unless the edge sets
+        ``force_media_info``. Otherwise the media information endpoint is requested for them. The
+        media information URL is only logged once every image is saved, so a later attempt
+        downloads what is missing. A node that only identifies the post is not written to
+        ``{id}.json``.
+
         Parameters
         ----------
         edge : Edge
@@ -603,33 +1039,65 @@ class InstagramClient:
         log.debug('Saving media at URL: %s', media_info_url)
         if self.is_saved(media_info_url):
             return
-        r = await self.session.get(media_info_url, headers=API_HEADERS, allow_redirects=False)
-        if r.status_code != HTTPStatus.OK:
-            if r.status_code in {HTTPStatus.MOVED_PERMANENTLY, HTTPStatus.FOUND}:
-                raise UnexpectedRedirect
-            log.warning('GET request failed with status code %s.', r.status_code)
-            log.debug('Content: %s', r.text)
-            return
-        text = r.text or ''
-        if 'image_versions2' not in text or 'taken_at' not in text:
-            log.warning('Invalid response. image_versions2 dict not found.')
+        if _has_image_data(edge['node']) and not edge.get('force_media_info'):
+            log.debug('Saving media from the edge node.')
+            timestamp = edge['node']['taken_at']
+            id_json_file = self._json_path(edge['node']['id'], timestamp)
+            self._write_if_new(id_json_file, encode_json(edge['node'], self.json_format), timestamp)
+            self._catalogue_post(edge)
+            if await self._save_items((cast('MediaInfoItem', edge['node']),)):
+                self.save_to_log(media_info_url)
             return
-        media_info: MediaInfo = r.json()
+        media_info: MediaInfo
+        if (self.response_cache is not None
+                and (content := self.response_cache.get(media_info_url)) is not None):
+            media_info = json.loads(content)
+        else:
+            r = await self._request('get',
+                                    media_info_url,
+                                    endpoint=ENDPOINT_MEDIA_INFO,
+                                    headers=API_HEADERS,
+                                    allow_redirects=False)
+            if r.status_code != HTTPStatus.OK:
+                if r.status_code in {HTTPStatus.MOVED_PERMANENTLY, HTTPStatus.FOUND}:
+                    raise UnexpectedRedirect
+                log.warning('GET request failed with status code %s.', r.status_code)
+                log.debug('Content: %s', r.text)
+                return
+            text = r.text or ''
+            if 'image_versions2' not in text or 'taken_at' not in text:
+                log.warning('Invalid response. image_versions2 dict not found.')
+                return
+            media_info = r.json()
+            if self.response_cache is not None:
+                self.response_cache.put(media_info_url, text.encode())
         timestamp = media_info['items'][0]['taken_at']
-        id_json_file = f'{edge["node"]["id"]}.json'
-        media_info_json_file = f'{edge["node"]["id"]}-media-info-0000.json'
-        write_if_new(id_json_file, str(json_dumps_formatted(edge['node'])))
-        write_if_new(media_info_json_file, str(json_dumps_formatted(media_info)))
-        for file in (id_json_file, media_info_json_file):
-            utime(file, (timestamp, timestamp))
-        self.save_to_log(media_info_url)
-        for item in media_info['items']:
+        id_json_file = self._json_path(edge['node']['id'], timestamp)
+        media_info_json_file = self._json_path(f'{edge["node"]["id"]}-media-info-0000', timestamp)
+        if not _is_stub(edge['node']):
+            self._write_if_new(id_json_file, encode_json(edge['node'], self.json_format), timestamp)
+        self._write_if_new(media_info_json_file, encode_json(media_info, self.json_format),
+                           timestamp)
+        self._catalogue_post(edge, media_info['items'])
+        if await self._save_items(media_info['items']):
+            self.save_to_log(media_info_url)
+
+    def _catalogue_post(self, edge: Edge, items: Iterable[MediaInfoItem] = ()) -> None:
+        if self.catalogue is not None:
+            with self._span('catalogue.save_post'):
+                self.catalogue.save_post(edge['node'], items)
+
+    async def _save_items(self, items: Iterable[MediaInfoItem]) -> bool:
+        saved = True
+        for item in items:
             timestamp = item['taken_at']
             if carousel_media := item.get('carousel_media'):
                 for sub_item in carousel_media:
-                    await self.save_image_versions2(sub_item, timestamp)
-            elif 'image_versions2' in item:
-                await self.save_image_versions2(item, timestamp)
+                    if not await self.save_image_versions2(sub_item, timestamp):
+                        saved = False
+            elif 'image_versions2' in item and not await self.save_image_versions2(item, timestamp):
+                saved = False
+        return saved
 
     async def dispatch_edges(self,
                              edges: Iterable[Edge],
@@ -643,6 +1111,9 @@ class InstagramClient:
         """
         Dispatch edges to the appropriate worker queue.
 
+        Edges whose ``pk`` or video permalink is already in :py:attr:`in_flight` are skipped, so
+        posts returned by more than one endpoint are only queued once.
+
         Parameters
         ----------
         edges : Iterable[Edge]
@@ -663,6 +1134,9 @@ class InstagramClient:
             every URL routed to the video worker.
         """
         for edge in edges:
+            pk = edge['node'].get('pk')
+            if pk is not None and not self.claim(pk):
+                continue
             if stats is not None:
                 stats.increment(POSTS_HANDLED)
             if edge['node']['__typename'] != 'XDTMediaDict':
@@ -685,7 +1159,10 @@ class InstagramClient:
                     log.exception('Unknown shortcode.')
                     continue
             if edge['node'].get('video_dash_manifest'):
-                await video_queue.put(f'https://www.instagram.com/p/{shortcode}/')
+                permalink = f'https://www.instagram.com/p/{shortcode}/'
+                if not self.claim(permalink):
+                    continue
+                await video_queue.put(permalink)
                 if yt_dlp_state is not None:
                     yt_dlp_state.total_urls += 1
             else:
@@ -693,6 +1170,78 @@ class InstagramClient:
                 if self.should_save_comments:
                     await comments_queue.put(edge)
 
+    async def _feed(self, producer: Awaitable[None], queues: Iterable[asyncio.Queue[Any]],
+                    stop_event: asyncio.Event) -> None:
+        """
+        Run a producer, then wait for the work it queued including deferred retries.
+
+        Parameters
+        ----------
+        producer : Awaitable[None]
+            Coroutine that fills the worker queues.
+        queues : Iterable[asyncio.Queue[Any]]
+            Worker queues.
+        stop_event : asyncio.Event
+            Event indicating that workers should stop.
+        """
+        await producer
+        if self.deferred_retries is not None:
+            await self.deferred_retries.settle(queues, stop_event)
+
+    async def enqueue_failures(self,
+                               failures: Mapping[str, FailedItem],
+                               image_queue: asyncio.Queue[Edge | None],
+                               comments_queue: asyncio.Queue[Edge | None],
+                               video_queue: asyncio.Queue[str | None],
+                               *,
+                               failed_urls: Iterable[str] = (),
+                               yt_dlp_state: YTDLPState | None = None) -> None:
+        """
+        Queue work items that failed on a previous run, without fetching any listing.
+
+        Only the CSRF token header is set up, so no request is sent before the workers start.
+
+        Parameters
+        ----------
+        failures : Mapping[str, FailedItem]
+            Failed items, typically loaded from the dedup log.
+        image_queue : asyncio.Queue[Edge | None]
+            Queue receiving ``media`` items.
+        comments_queue : asyncio.Queue[Edge | None]
+            Queue receiving ``comments`` items.
+        video_queue : asyncio.Queue[str | None]
+            Queue receiving ``video`` items and ``failed_urls``.
+        failed_urls : Iterable[str]
+            URLs from a list written by :py:func:`~instagram_archiver.utils.write_failed_urls`.
+            They are queued for yt-dlp unless ``failures`` already holds them.
+        yt_dlp_state : YTDLPState | None
+            Optional yt-dlp progress state whose ``total_urls`` counter is incremented for
+            every URL routed to the video worker.
+        """
+        self.add_csrf_token_header()
+        queued: dict[str, FailedItem] = {
+            **{
+                failure_key('video', url): {
+                    'error': 'Listed in the failed URL list.',
+                    'kind': 'video',
+                    'payload': url
+                }
+                for url in failed_urls
+            },
+            **failures
+        }
+        for key, item in queued.items():
+            if not self.claim(key):
+                continue
+            if item['kind'] == 'video':
+                await video_queue.put(item['payload'])
+                if yt_dlp_state is not None:
+                    yt_dlp_state.total_urls += 1
+            elif item['kind'] == 'media':
+                await image_queue.put(cast('Edge', json.loads(item['payload'])))
+            else:
+                await comments_queue.put(cast('Edge', json.loads(item['payload'])))
+
     async def save_edges(self, edges: Iterable[Edge], parent_edge: Edge | None = None) -> None:
         """
         Save edge node media.
@@ -723,7 +1272,7 @@ class InstagramClient:
                     try:
                         await self.save_comments(edge)
                         await self.save_media(edge)
-                    except RetryError:
+                    except (RequestConnectionError, Timeout):
                         log.exception('Retries exhausted.')
                         return
             else:
@@ -732,3 +1281,97 @@ class InstagramClient:
                     edge['node']['__typename'], edge['node']['id'])
                 shortcode = edge['node']['code']
                 self.failed_urls.add(f'https://www.instagram.com/p/{shortcode}/')
+
+
+class LogDBClient(InstagramClient):
+    """
+    Client that archives to an output directory and records what it saved in a log database.
+
+    Subclasses set :py:attr:`_log_db` and :py:attr:`_output_dir` when initialised.
+    """
+    _log_db: LogDB
+    _output_dir: Path
+
+    @override
+    def save_to_log(self, url: str) -> None:
+        with self._span('log_db.save'):
+            self._log_db.save(url)
+
+    def _record_failures(self, retried: Mapping[str, FailedItem], *, completed: bool,
+                         retry_failed: bool) -> None:
+        """
+        Persist what failed in a run and update ``failed.txt``.
+
+        Parameters
+        ----------
+        retried : Mapping[str, FailedItem]
+            Failures recorded by an earlier run that this run processed again.
+        completed : bool
+            Whether the run finished without a fatal error. Only then are the retried items
+            that did not fail again removed from the log.
+        retry_failed : bool
+            Whether the run was started with ``retry_failed``. ``failed.txt`` is removed when
+            such a run completes with nothing left failing.
+        """
+        if completed:
+            self._log_db.remove_failures(
+                key for key, item in retried.items() if item['payload'] not in self.failed_urls)
+        if self.deferred_retries is not None:
+            self._log_db.save_failures(self.deferred_retries.failures)
+        if self.failed_urls:
+            log.warning('Some URIs failed. Check failed.txt.')
+            write_failed_urls(self._output_dir / 'failed.txt', self.failed_urls)
+        elif completed and retry_failed:
+            (self._output_dir / 'failed.txt').unlink(missing_ok=True)
+
+    @override
+    def is_saved(self, url: str) -> bool:
+        with self._span('log_db.is_saved'):
+            return self._log_db.is_saved(url)
+
+    @override
+    def is_archived(self, path: Path) -> bool:
+        key = self.layout.relative(path)
+        media_id = media_id_of(path.name)
+        variants = json_variants(path)
+        with self._span('log_db.manifest_entry'):
+            if media_id is None:
+                entry = self._log_db.manifest_entry(key)
+                recorded = {key: entry} if entry is not None else {}
+            else:
+                # One lookup covers the file in every JSON format.
+                recorded = self._log_db.manifest(media_id)
+        if any(self.layout.relative(variant) in recorded for variant in variants):
+            return True
+        # Other files of the same media being recorded says nothing about this one, which may
+        # have been archived before the manifest was kept.
+        for variant in variants:
+            try:
+                size = variant.stat().st_size
+            except FileNotFoundError:
+                continue
+            # The content is not read to compute a digest.
+            self._log_db.save_manifest_entry(self.layout.relative(variant), {
+                'digest': None,
+                'media_id': media_id,
+                'size': size
+            })
+            return True
+        return False
+
+    @override
+    def record_file(self, path: Path, content: bytes) -> None:
+        with self._span('log_db.record_file'):
+            self._log_db.save_manifest_entry(
+                self.layout.relative(path), {
+                    'digest': hashlib.sha256(content).hexdigest(),
+                    'media_id': media_id_of(path.name),
+                    'size': len(content)
+                })
+
+    @override
+    async def __aexit__(self, _: type[BaseException] | None, __: BaseException | None,
+                        ___: TracebackType | None) -> None:
+        """Close the SQLite log and the underlying session."""
+        self._log_db.close()
+        await super().__aexit__(_, __, ___)
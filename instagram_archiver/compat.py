@@ -1,16 +1,51 @@
-"""Compatibility helpers for Python versions before 3.11."""
+"""Compatibility helpers for older Python versions."""
 
 from __future__ import annotations
 
-from contextlib import contextmanager
+from contextlib import contextmanager, suppress
 from pathlib import Path
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any, cast
+import asyncio
+import importlib
+import importlib.util
 import os
+import warnings
 
 if TYPE_CHECKING:
-    from collections.abc import Generator
+    from collections.abc import Coroutine, Generator
 
-__all__ = ('chdir',)
+__all__ = ('HAS_ZSTD', 'UnsupportedCompressionError', 'chdir', 'gather_or_cancel', 'zstd_compress',
+           'zstd_decompress')
+
+
+class UnsupportedCompressionError(NotImplementedError):
+    """Compression format that cannot be read or written with the installed modules."""
+
+
+def _find_zstd() -> str | None:
+    # backports.zstd has the same API as compression.zstd for Python before 3.14.
+    for name in ('compression.zstd', 'backports.zstd'):
+        with suppress(ModuleNotFoundError):
+            if importlib.util.find_spec(name) is not None:
+                return name
+    return None
+
+
+_ZSTD_MODULE = _find_zstd()
+HAS_ZSTD = _ZSTD_MODULE is not None
+"""
+Whether Zstandard compression is available (:py:mod:`compression.zstd` from Python 3.14, or the
+``backports.zstd`` package installed with the ``zstd`` extra).
+"""
+
+
+def _zstd() -> Any:
+    # Imported dynamically: the modules and their stubs are not available on every version.
+    if _ZSTD_MODULE is None:
+        msg = ('Zstandard compression requires Python 3.14 or newer, or the backports.zstd '
+               'package.')
+        raise UnsupportedCompressionError(msg)
+    return importlib.import_module(_ZSTD_MODULE)
 
 
 @contextmanager
@@ -18,6 +53,9 @@ def chdir(path: str | Path) -> Generator[None, None, None]:
     """
     Temporarily change the current working directory.
 
+    Deprecated: the scrapers no longer change the working directory. Use
+    :py:func:`contextlib.chdir` (Python 3.11+) instead.
+
     Parameters
     ----------
     path : str | Path
@@ -28,9 +66,99 @@ def chdir(path: str | Path) -> Generator[None, None, None]:
     None
         Execution continues with the working directory set to ``path``.
     """
+    warnings.warn('compat.chdir is deprecated and will be removed in a future version.',
+                  DeprecationWarning,
+                  stacklevel=3)
     previous = Path.cwd()
     os.chdir(path)
     try:
         yield
     finally:
         os.chdir(previous)
+
+
+async def gather_or_cancel(*coros: Coroutine[Any, Any, None]) -> None:
+    """
+    Run coroutines concurrently and cancel the rest as soon as one fails.
+
+    A minimal stand-in for :py:class:`asyncio.TaskGroup` (Python 3.11+). The exception of the
+    first failed coroutine (in argument order) is re-raised once every other coroutine has been
+    cancelled and awaited.
+
+    Parameters
+    ----------
+    *coros : Coroutine[Any, Any, None]
+        Coroutines to run.
+
+    Raises
+    ------
+    asyncio.CancelledError
+        Re-raised after cancelling every coroutine when the caller is cancelled.
+    """
+    tasks = [asyncio.ensure_future(coro) for coro in coros]
+    if not tasks:
+        return
+    try:
+        _, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+    except asyncio.CancelledError:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    for task in tasks:
+        if task in pending or task.cancelled():
+            continue
+        if (error := task.exception()) is not None:
+            raise error
+
+
+def zstd_compress(data: bytes) -> bytes:
+    """
+    Compress ``data`` with Zstandard at the default level.
+
+    Without Zstandard support (see :py:data:`HAS_ZSTD`), :py:exc:`UnsupportedCompressionError` is
+    raised.
+
+    Parameters
+    ----------
+    data : bytes
+        Data to compress.
+
+    Returns
+    -------
+    bytes
+        A complete Zstandard frame.
+    """
+    return cast('bytes', _zstd().compress(data))
+
+
+def zstd_decompress(data: bytes) -> bytes:
+    """
+    Decompress Zstandard ``data``.
+
+    Without Zstandard support (see :py:data:`HAS_ZSTD`), :py:exc:`UnsupportedCompressionError` is
+    raised.
+
+    Parameters
+    ----------
+    data : bytes
+        Compressed data.
+
+    Returns
+    -------
+    bytes
+        Decompressed data.
+
+    Raises
+    ------
+    ValueError
+        If the data is not a complete Zstandard frame.
+    """
+    zstd = _zstd()
+    try:
+        return cast('bytes', zstd.decompress(data))
+    except zstd.ZstdError as e:
+        raise ValueError(str(e)) from e
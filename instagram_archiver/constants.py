@@ -2,7 +2,8 @@
 
 from __future__ import annotations
 
-__all__ = ('API_HEADERS', 'BROWSER_CHOICES', 'PAGE_FETCH_HEADERS', 'SHARED_HEADERS', 'USER_AGENT')
+__all__ = ('API_HEADERS', 'BROWSER_CHOICES', 'PAGE_FETCH_HEADERS', 'REEL_PAGE_SIZES',
+           'SHARED_HEADERS', 'TIMELINE_PAGE_SIZES', 'USER_AGENT')
 
 USER_AGENT = ('Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) '
               'Chrome/148.0.0.0 Safari/537.36')
@@ -72,6 +73,103 @@ LOG_SCHEMA = """CREATE TABLE log (
 """
 Schema for log database.
 
+:meta hide-value:
+"""
+HIGHLIGHTS_SCHEMA = """CREATE TABLE IF NOT EXISTS highlights (
+    id TEXT PRIMARY KEY NOT NULL,
+    watermark TEXT NOT NULL,
+    date TEXT DEFAULT CURRENT_TIMESTAMP NOT NULL
+);"""
+"""
+Schema for the per-highlight watermarks stored next to the log.
+
+:meta hide-value:
+"""
+HTTP_CACHE_SCHEMA = """CREATE TABLE IF NOT EXISTS http_cache (
+    key TEXT PRIMARY KEY NOT NULL,
+    digest TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    date TEXT DEFAULT CURRENT_TIMESTAMP NOT NULL
+);"""
+"""
+Schema for the validators and content digests of cached profile metadata, stored next to the log.
+
+:meta hide-value:
+"""
+FAILURES_SCHEMA = """CREATE TABLE IF NOT EXISTS failures (
+    key TEXT PRIMARY KEY NOT NULL,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    error TEXT NOT NULL,
+    date TEXT DEFAULT CURRENT_TIMESTAMP NOT NULL
+);"""
+"""
+Schema for the work items that still failed at the end of a run, stored next to the log.
+
+:meta hide-value:
+"""
+MANIFEST_SCHEMA = """CREATE TABLE IF NOT EXISTS manifest (
+    path TEXT PRIMARY KEY NOT NULL,
+    media_id TEXT,
+    size INTEGER NOT NULL,
+    digest TEXT,
+    date TEXT DEFAULT CURRENT_TIMESTAMP NOT NULL
+);"""
+"""
+Schema for the manifest of archived files, stored next to the log.
+
+:meta hide-value:
+"""
+MANIFEST_INDEX_SCHEMA = 'CREATE INDEX IF NOT EXISTS manifest_media_id ON manifest (media_id);'
+"""
+Index of the manifest by media ID.
+
+:meta hide-value:
+"""
+CATALOGUE_SCHEMA = """CREATE TABLE IF NOT EXISTS posts (
+    id TEXT PRIMARY KEY NOT NULL,
+    pk TEXT,
+    code TEXT,
+    owner_id TEXT,
+    owner_username TEXT,
+    taken_at INTEGER,
+    media_type INTEGER,
+    caption TEXT,
+    like_count INTEGER,
+    comment_count INTEGER,
+    date TEXT DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+CREATE TABLE IF NOT EXISTS media (
+    id TEXT PRIMARY KEY NOT NULL,
+    post_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    media_type INTEGER,
+    width INTEGER,
+    height INTEGER,
+    image_url TEXT,
+    video_url TEXT,
+    date TEXT DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+CREATE TABLE IF NOT EXISTS comments (
+    pk TEXT PRIMARY KEY NOT NULL,
+    media_id TEXT NOT NULL,
+    parent_pk TEXT,
+    user_id TEXT,
+    username TEXT,
+    text TEXT,
+    created_at INTEGER,
+    like_count INTEGER,
+    date TEXT DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+CREATE INDEX IF NOT EXISTS posts_owner_taken_at ON posts (owner_username, taken_at);
+CREATE INDEX IF NOT EXISTS posts_taken_at ON posts (taken_at);
+CREATE INDEX IF NOT EXISTS media_post_id ON media (post_id);
+CREATE INDEX IF NOT EXISTS comments_media_id ON comments (media_id);
+CREATE INDEX IF NOT EXISTS comments_username ON comments (username);"""
+"""
+Schema of the metadata catalogue: one row per post, per media item and per comment.
+
 :meta hide-value:
 """
 BROWSER_CHOICES = ('brave', 'chrome', 'chromium', 'edge', 'opera', 'vivaldi', 'firefox', 'safari')
@@ -80,3 +178,22 @@ Possible browser choices to get cookies from.
 
 :meta hide-value:
 """
+REEL_PAGE_SIZES = (50, 20, 10, 5)
+"""
+Reel gallery page sizes (``first``) to probe, largest first.
+
+The first size for which the reel page gallery query succeeds is used for the rest of the run.
+The last entry is the size the web client itself requests.
+
+:meta hide-value:
+"""
+TIMELINE_PAGE_SIZES = (50, 36, 24, 12)
+"""
+Timeline page sizes (``count``/``first``) to probe, largest first.
+
+Used unless a page size is given explicitly. The first size for which the first timeline query
+succeeds is used for the rest of the run. The last entry is the size the web client itself
+requests.
+
+:meta hide-value:
+"""
@@ -7,11 +7,21 @@ from urllib.parse import urlparse
 import logging
 import sqlite3
 
-from .constants import LOG_SCHEMA
+from .constants import (
+    FAILURES_SCHEMA,
+    HIGHLIGHTS_SCHEMA,
+    HTTP_CACHE_SCHEMA,
+    LOG_SCHEMA,
+    MANIFEST_INDEX_SCHEMA,
+    MANIFEST_SCHEMA,
+)
 
 if TYPE_CHECKING:
+    from collections.abc import Iterable, Mapping
     from pathlib import Path
 
+    from .typing import FailedItem, HTTPCacheEntry, ManifestEntry
+
 __all__ = ('LogDB', 'clean_url')
 
 log = logging.getLogger(__name__)
@@ -50,6 +60,10 @@ class LogDB:
             returns ``False``.
         """
         self._disabled = disabled
+        self._has_failures_table = False
+        self._has_highlights_table = False
+        self._has_http_cache_table = False
+        self._has_manifest_table = False
         self._path = path
         self._connection = sqlite3.connect(path)
         self._cursor = self._connection.cursor()
@@ -99,6 +113,301 @@ class LogDB:
         self._cursor.execute('INSERT INTO log (url) VALUES (?)', (clean_url(url),))
         self._connection.commit()
 
+    def forget(self, urls: Iterable[str]) -> None:
+        """
+        Remove URLs from the log, so they are fetched again.
+
+        Parameters
+        ----------
+        urls : Iterable[str]
+            URLs to remove.
+        """
+        urls = tuple(urls)
+        if self._disabled or not urls:
+            return
+        self._cursor.executemany('DELETE FROM log WHERE url = ?',
+                                 ((clean_url(url),) for url in urls))
+        self._connection.commit()
+
+    def _ensure_highlights_table(self) -> None:
+        if not self._has_highlights_table:
+            self._cursor.execute(HIGHLIGHTS_SCHEMA)
+            self._has_highlights_table = True
+
+    def highlight_watermark(self, highlight_id: str) -> str | None:
+        """
+        Get the watermark recorded for a highlight on a previous run.
+
+        Parameters
+        ----------
+        highlight_id : str
+            Numeric highlight identifier.
+
+        Returns
+        -------
+        str | None
+            The recorded watermark, or ``None`` if there is none (or always when the log is
+            disabled).
+        """
+        if self._disabled:
+            return None
+        self._ensure_highlights_table()
+        self._cursor.execute('SELECT watermark FROM highlights WHERE id = ?', (highlight_id,))
+        row: tuple[str] | None = self._cursor.fetchone()
+        return None if row is None else row[0]
+
+    def save_highlight_watermark(self, highlight_id: str, watermark: str) -> None:
+        """
+        Record the watermark of a fully archived highlight.
+
+        Parameters
+        ----------
+        highlight_id : str
+            Numeric highlight identifier.
+        watermark : str
+            Value that changes whenever items are added to the highlight.
+        """
+        if self._disabled:
+            return
+        self._ensure_highlights_table()
+        self._cursor.execute('INSERT OR REPLACE INTO highlights (id, watermark) VALUES (?, ?)',
+                             (highlight_id, watermark))
+        self._connection.commit()
+
+    def _ensure_http_cache_table(self) -> None:
+        if not self._has_http_cache_table:
+            self._cursor.execute(HTTP_CACHE_SCHEMA)
+            self._has_http_cache_table = True
+
+    def http_cache_entry(self, key: str) -> HTTPCacheEntry | None:
+        """
+        Get the cache entry recorded for a file on a previous run.
+
+        Parameters
+        ----------
+        key : str
+            Cache key, typically the archived file name.
+
+        Returns
+        -------
+        HTTPCacheEntry | None
+            The recorded entry, or ``None`` if there is none (or always when the log is
+            disabled).
+        """
+        if self._disabled:
+            return None
+        self._ensure_http_cache_table()
+        self._cursor.execute('SELECT digest, etag, last_modified FROM http_cache WHERE key = ?',
+                             (key,))
+        for digest, etag, last_modified in self._cursor:
+            return {'digest': digest, 'etag': etag, 'last_modified': last_modified}
+        return None
+
+    def save_http_cache_entry(self, key: str, entry: HTTPCacheEntry) -> None:
+        """
+        Record the cache entry of a file that was just archived.
+
+        Parameters
+        ----------
+        key : str
+            Cache key, typically the archived file name.
+        entry : HTTPCacheEntry
+            Validators and content digest to record.
+        """
+        if self._disabled:
+            return
+        self._ensure_http_cache_table()
+        self._cursor.execute(
+            'INSERT OR REPLACE INTO http_cache (key, digest, etag, last_modified) '
+            'VALUES (?, ?, ?, ?)', (key, entry['digest'], entry['etag'], entry['last_modified']))
+        self._connection.commit()
+
+    def _ensure_failures_table(self) -> None:
+        if not self._has_failures_table:
+            self._cursor.execute(FAILURES_SCHEMA)
+            self._has_failures_table = True
+
+    def failures(self) -> dict[str, FailedItem]:
+        """
+        Get the work items that still failed at the end of previous runs.
+
+        Returns
+        -------
+        dict[str, FailedItem]
+            Failed items keyed by their failure key (always empty when the log is disabled).
+        """
+        if self._disabled:
+            return {}
+        self._ensure_failures_table()
+        self._cursor.execute('SELECT key, kind, payload, error FROM failures ORDER BY date, key')
+        return {
+            key: {
+                'error': error,
+                'kind': kind,
+                'payload': payload
+            }
+            for key, kind, payload, error in self._cursor
+        }
+
+    def save_failures(self, failures: Mapping[str, FailedItem]) -> None:
+        """
+        Record work items that still failed at the end of a run.
+
+        Parameters
+        ----------
+        failures : Mapping[str, FailedItem]
+            Failed items keyed by their failure key. Existing entries with the same key are
+            replaced.
+        """
+        if self._disabled or not failures:
+            return
+        self._ensure_failures_table()
+        self._cursor.executemany(
+            'INSERT OR REPLACE INTO failures (key, kind, payload, error) VALUES (?, ?, ?, ?)',
+            ((key, item['kind'], item['payload'], item['error']) for key, item in failures.items()))
+        self._connection.commit()
+
+    def remove_failures(self, keys: Iterable[str]) -> None:
+        """
+        Forget failed work items, typically because they were processed again.
+
+        Parameters
+        ----------
+        keys : Iterable[str]
+            Failure keys to remove.
+        """
+        keys = tuple(keys)
+        if self._disabled or not keys:
+            return
+        self._ensure_failures_table()
+        self._cursor.executemany('DELETE FROM failures WHERE key = ?', ((key,) for key in keys))
+        self._connection.commit()
+
+    def _ensure_manifest_table(self) -> None:
+        if not self._has_manifest_table:
+            self._cursor.execute(MANIFEST_SCHEMA)
+            self._cursor.execute(MANIFEST_INDEX_SCHEMA)
+            self._has_manifest_table = True
+
+    def manifest_entry(self, path: str) -> ManifestEntry | None:
+        """
+        Get the manifest record of an archived file.
+
+        Parameters
+        ----------
+        path : str
+            File path relative to the output directory, with ``/`` separators.
+
+        Returns
+        -------
+        ManifestEntry | None
+            The record, or ``None`` if the file is not in the manifest (or always when the log is
+            disabled).
+        """
+        if self._disabled:
+            return None
+        self._ensure_manifest_table()
+        self._cursor.execute('SELECT digest, media_id, size FROM manifest WHERE path = ?', (path,))
+        for digest, media_id, size in self._cursor:
+            return {'digest': digest, 'media_id': media_id, 'size': size}
+        return None
+
+    def manifest(self, media_id: str | None = None) -> dict[str, ManifestEntry]:
+        """
+        Get the manifest records of archived files.
+
+        Parameters
+        ----------
+        media_id : str | None
+            If given, only the files of this media item are returned.
+
+        Returns
+        -------
+        dict[str, ManifestEntry]
+            Records keyed by file path relative to the output directory (always empty when the
+            log is disabled).
+        """
+        if self._disabled:
+            return {}
+        self._ensure_manifest_table()
+        if media_id is None:
+            self._cursor.execute('SELECT path, digest, media_id, size FROM manifest ORDER BY path')
+        else:
+            self._cursor.execute(
+                'SELECT path, digest, media_id, size FROM manifest WHERE media_id = ? '
+                'ORDER BY path', (media_id,))
+        return {
+            path: {
+                'digest': digest,
+                'media_id': file_media_id,
+                'size': size
+            }
+            for path, digest, file_media_id, size in self._cursor
+        }
+
+    def save_manifest_entry(self, path: str, entry: ManifestEntry) -> None:
+        """
+        Record an archived file in the manifest, replacing an existing record.
+
+        Parameters
+        ----------
+        path : str
+            File path relative to the output directory, with ``/`` separators.
+        entry : ManifestEntry
+            Record to store.
+        """
+        self.save_manifest_entries({path: entry})
+
+    def save_manifest_entries(self, entries: Mapping[str, ManifestEntry]) -> None:
+        """
+        Record several archived files in the manifest, replacing existing records.
+
+        Parameters
+        ----------
+        entries : Mapping[str, ManifestEntry]
+            Records keyed by file path relative to the output directory.
+        """
+        if self._disabled or not entries:
+            return
+        self._ensure_manifest_table()
+        self._cursor.executemany(
+            'INSERT OR REPLACE INTO manifest (path, digest, media_id, size) VALUES (?, ?, ?, ?)',
+            ((path, entry['digest'], entry['media_id'], entry['size'])
+             for path, entry in entries.items()))
+        self._connection.commit()
+
+    def remove_manifest_entries(self, paths: Iterable[str]) -> None:
+        """
+        Remove files from the manifest, typically because they have to be archived again.
+
+        Parameters
+        ----------
+        paths : Iterable[str]
+            File paths relative to the output directory.
+        """
+        paths = tuple(paths)
+        if self._disabled or not paths:
+            return
+        self._ensure_manifest_table()
+        self._cursor.executemany('DELETE FROM manifest WHERE path = ?', ((path,) for path in paths))
+        self._connection.commit()
+
+    def rename_manifest_entries(self, renames: Mapping[str, str]) -> None:
+        """
+        Move manifest records to new paths, typically because their files were moved.
+
+        Parameters
+        ----------
+        renames : Mapping[str, str]
+            New file paths keyed by old file path, both relative to the output directory.
+        """
+        if self._disabled or not renames:
+            return
+        self._ensure_manifest_table()
+        self._cursor.executemany('UPDATE OR REPLACE manifest SET path = ? WHERE path = ?',
+                                 ((new, old) for old, new in renames.items()))
+        self._connection.commit()
+
     def close(self) -> None:
         """Close the underlying cursor and connection."""
         self._cursor.close()
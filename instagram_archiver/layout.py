@@ -0,0 +1,204 @@
+"""Placement of archived files inside an output directory."""
+
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Literal, TypeAlias
+import hashlib
+import logging
+import re
+
+from .dedup import LogDB
+from .utils import json_suffix_of
+
+__all__ = ('LAYOUTS', 'LayoutKind', 'OutputLayout', 'media_id_of')
+
+log = logging.getLogger(__name__)
+
+LAYOUTS = ('date', 'flat', 'hash')
+"""Names of the supported output layouts."""
+LayoutKind: TypeAlias = Literal['date', 'flat', 'hash']
+"""Name of an output layout."""
+
+_MEDIA_FILE_RE = re.compile(
+    r'^(?P<id>\d+(?:_\d+)?)(?:-comments|-media-info-\d{4})?\.\w+(?:\.(?:gz|zst))?$')
+
+
+def media_id_of(name: str) -> str | None:
+    """
+    Get the media ID an archived file belongs to.
+
+    Parameters
+    ----------
+    name : str
+        File name, such as ``{id}.jpg``, ``{id}.json``, ``{id}-media-info-0000.json`` or
+        ``{id}-comments.json``. Compressed JSON suffixes (``.json.gz``, ``.json.zst``) are
+        recognised.
+
+    Returns
+    -------
+    str | None
+        The media ID, or ``None`` if the file is not a per-media file (for example
+        ``web_profile_info.json`` or a video downloaded by yt-dlp).
+    """
+    return m.group('id') if (m := _MEDIA_FILE_RE.match(name)) else None
+
+
+class OutputLayout:
+    """
+    Decide which sub-directory of the output directory a per-media file is written to.
+
+    With the ``flat`` layout every file is written to the output directory itself. The ``date``
+    layout uses ``YYYY/MM`` directories derived from the UTC ``taken_at`` time of the post
+    (``undated`` when the time is unknown). The ``hash`` layout uses a directory named after the
+    first two hexadecimal digits of the SHA-256 digest of the media ID, which spreads files
+    evenly over 256 directories regardless of when they were posted. Each file is placed by the
+    ID its name starts with, so the images of carousel items, which are named after the ID of
+    the item, are usually in a different directory from the ``{id}.json`` of their post.
+
+    Profile-level files (``web_profile_info.json``, ``profile_pic.jpg``, ``failed.txt`` and the
+    log) and videos downloaded by yt-dlp always stay in the output directory.
+    """
+    def __init__(self, kind: LayoutKind = 'flat', root: str | Path = '.') -> None:
+        """
+        Initialise the layout.
+
+        Parameters
+        ----------
+        kind : LayoutKind
+            Name of the layout.
+        root : str | Path
+            Output directory the layout applies to.
+        """
+        self.kind: LayoutKind = kind
+        """Name of the layout."""
+        self.root = Path(root)
+        """Output directory the layout applies to."""
+        self._created: set[Path] = set()
+
+    def directory(self, media_id: str, taken_at: float | None = None) -> Path:
+        """
+        Get the directory the files of a media item belong in.
+
+        Parameters
+        ----------
+        media_id : str
+            Media ID.
+        taken_at : float | None
+            Time the media was posted as a UNIX timestamp, if known. Only used by the ``date``
+            layout.
+
+        Returns
+        -------
+        Path
+            Directory relative to the output directory.
+        """
+        if self.kind == 'hash':
+            return Path(hashlib.sha256(media_id.encode()).hexdigest()[:2])
+        if self.kind == 'date':
+            if taken_at is None:
+                return Path('undated')
+            when = datetime.fromtimestamp(taken_at, timezone.utc)
+            return Path(f'{when:%Y}', f'{when:%m}')
+        return Path()
+
+    def path(self, name: str, taken_at: float | None = None) -> Path:
+        """
+        Get the location of a file in the output directory, creating its directory if necessary.
+
+        Parameters
+        ----------
+        name : str
+            File name. The media ID is taken from its prefix (see :py:func:`media_id_of`).
+        taken_at : float | None
+            Time the media was posted as a UNIX timestamp, if known.
+
+        Returns
+        -------
+        Path
+            File location inside :py:attr:`root`. Files that do not belong to a media item are
+            placed directly in :py:attr:`root`.
+        """
+        media_id = media_id_of(name)
+        if media_id is None:
+            return self.root / name
+        directory = self.root / self.directory(media_id, taken_at)
+        if directory not in self._created:
+            directory.mkdir(parents=True, exist_ok=True)
+            self._created.add(directory)
+        return directory / name
+
+    def relative(self, path: Path) -> str:
+        """
+        Get the location of a file relative to :py:attr:`root`.
+
+        Parameters
+        ----------
+        path : Path
+            File location, as returned by :py:meth:`path`.
+
+        Returns
+        -------
+        str
+            Relative location with ``/`` separators, independent of the platform.
+        """
+        return path.relative_to(self.root).as_posix()
+
+    def migrate(self, log_file: str | Path | None = None) -> int:
+        """
+        Move the per-media files of the archive in :py:attr:`root` into this layout.
+
+        Files may currently be in any layout, so this can also convert between sharded layouts.
+        For the ``date`` layout the time of a file is read from the modification time of the
+        media's ``{id}.json`` file in any JSON format (or of the file itself when that is
+        missing), which is set to ``taken_at`` when the file is archived (except for images hard
+        linked into a :py:class:`~instagram_archiver.store.ContentStore`). Files whose target
+        already exists are left in place. Directories emptied by the move are removed. The
+        manifest records of the moved files are moved with them.
+
+        Parameters
+        ----------
+        log_file : str | Path | None
+            Custom path for the dedup log database. Defaults to ``.log.db`` inside
+            :py:attr:`root`. Nothing is recorded when it does not exist.
+
+        Returns
+        -------
+        int
+            Number of files moved.
+        """
+        root = self.root
+        files = [(path, media_id) for path in root.rglob('*')
+                 if (media_id := media_id_of(path.name)) is not None and path.is_file() and not any(
+                     part.startswith('.') for part in path.relative_to(root).parts)]
+        taken_at = {
+            media_id: path.stat().st_mtime
+            for path, media_id in files
+            if path.name.removesuffix(json_suffix_of(path.name) or '') == media_id
+        }
+        renames: dict[str, str] = {}
+        emptied: set[Path] = set()
+        for path, media_id in files:
+            target = root / self.directory(media_id, taken_at.get(media_id,
+                                                                  path.stat().st_mtime)) / path.name
+            if target == path:
+                continue
+            if target.exists():
+                log.warning('Not moving %s because %s already exists.', path, target)
+                continue
+            target.parent.mkdir(parents=True, exist_ok=True)
+            path.replace(target)
+            emptied.update(parent for parent in path.parents if parent.is_relative_to(root))
+            renames[self.relative(path)] = self.relative(target)
+        for directory in sorted(emptied - {root}, key=lambda path: len(path.parts), reverse=True):
+            if not any(directory.iterdir()):
+                directory.rmdir()
+        log_path = Path(log_file or root / '.log.db')
+        if renames and log_path.exists():
+            db = LogDB(log_path)
+            try:
+                db.rename_manifest_entries(renames)
+            finally:
+                db.close()
+        return len(renames)
@@ -6,6 +6,7 @@ from contextlib import suppress
 from pathlib import Path
 from typing import TYPE_CHECKING, Any, cast
 import asyncio
+import cProfile
 import logging
 import signal
 import sys
@@ -15,19 +16,30 @@ from bascom import setup_logging
 from yt_dlp_utils.aio import get_configured_yt_dlp
 import click
 
+from .cache import ResponseCache
 from .client import UnexpectedRedirect
+from .compat import HAS_ZSTD
 from .constants import BROWSER_CHOICES
+from .layout import LAYOUTS, OutputLayout
+from .metrics import METRICS_FORMATS, MetricsWriter, write_profile_report
 from .profile_scraper import ProfileScraper
+from .retry import RetryPolicy
 from .saved_scraper import SavedScraper
 from .typing import Stats, YTDLPState
+from .utils import FSYNC_POLICIES, JSON_FORMATS
+from .verify import QUARANTINE_DIR, verify_archive
+from .workers import DeferredRetries
 
 if TYPE_CHECKING:
     from collections.abc import Callable, Iterable, Mapping
     from types import FrameType
 
+    from .layout import LayoutKind
+    from .metrics import MetricsFormat
     from .typing import BrowserName, OnMessage
+    from .utils import FsyncPolicy, JSONFormat
 
-__all__ = ('main',)
+__all__ = ('main', 'migrate_layout_main', 'verify_main')
 
 log = logging.getLogger(__name__)
 
@@ -92,6 +104,14 @@ def _set_transient_message(display: StatusDisplay | None, message: str) -> None:
     display.set_message(message)
 
 
+def _echo_summary(stats: Stats) -> None:
+    if not (lines := stats.summary_lines()):
+        return
+    click.echo('Request summary:', err=True)
+    for line in lines:
+        click.echo(f'  {line}', err=True)
+
+
 async def _cancel_task(task: asyncio.Task[None] | None) -> None:
     if task is None:
         return
@@ -147,6 +167,19 @@ def _start_status_display(
     return display, spin_update, refresh_task
 
 
+async def _write_metrics_periodically(writer: MetricsWriter, stats: Stats,
+                                      stop_event: asyncio.Event, interval: float) -> None:
+    try:
+        while not stop_event.is_set():
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(stop_event.wait(), interval)
+            if not stop_event.is_set():
+                writer.write(stats.snapshot())
+    finally:
+        # Final snapshot, whether the run ended normally or the task was cancelled.
+        writer.write(stats.snapshot())
+
+
 def _register_termination_signal_handlers(
         loop: asyncio.AbstractEventLoop, on_signal: Any
 ) -> tuple[list[signal.Signals], list[signal.Signals], dict[signal.Signals, Any]]:
@@ -194,13 +227,24 @@ def _restore_termination_signal_handlers(
 
 
 async def _drive_scraper(scraper: ProfileScraper | SavedScraper,
-                         scraper_coro_factory: Callable[..., Any], *, debug: bool, quiet: bool,
+                         scraper_coro_factory: Callable[..., Any],
+                         *,
+                         debug: bool,
+                         metrics_interval: float = 10,
+                         metrics_writer: MetricsWriter | None = None,
+                         profile_output: Path | None = None,
+                         quiet: bool,
                          sleep_time: int) -> None:
     async with scraper:
         ydl = get_configured_yt_dlp(sleep_time, debug=debug)
         for cookie in scraper.session.cookies:
             ydl.ydl.cookiejar.set_cookie(cookie)
         stats = Stats()
+        profiler: cProfile.Profile | None = None
+        if profile_output is not None:
+            stats.enable_spans()
+            profiler = cProfile.Profile()
+            profiler.enable()
         yt_dlp_state = YTDLPState()
         yt_dlp_idle_event = asyncio.Event()
         yt_dlp_idle_event.set()
@@ -211,6 +255,10 @@ async def _drive_scraper(scraper: ProfileScraper | SavedScraper,
         stop_event = asyncio.Event()
         if not debug and not quiet:
             display, on_message, refresh_task = _start_status_display(stats, stop_event)
+        metrics_task: asyncio.Task[None] | None = None
+        if metrics_writer is not None:
+            metrics_task = asyncio.create_task(
+                _write_metrics_periodically(metrics_writer, stats, stop_event, metrics_interval))
 
         def on_cleanup(message: str) -> None:
             if termination_state.signal_count == 0:
@@ -239,8 +287,16 @@ async def _drive_scraper(scraper: ProfileScraper | SavedScraper,
             stop_event.set()
             await _cancel_task(termination_state.warning_task)
             await _cancel_task(refresh_task)
+            if metrics_task is not None:
+                # Setting stop_event ends the loop, and the task writes the final snapshot.
+                await metrics_task
+            if profiler is not None and profile_output is not None:
+                profiler.disable()
+                write_profile_report(profiler, profile_output)
             if display is not None:
                 display.stop()
+            if not quiet:
+                _echo_summary(stats)
             _restore_termination_signal_handlers(loop, registered_loop_signals,
                                                  registered_windows_signal_handlers,
                                                  previous_windows_signal_handlers)
@@ -248,48 +304,178 @@ async def _drive_scraper(scraper: ProfileScraper | SavedScraper,
             raise click.Abort
 
 
-async def _async_profile_main(browser: BrowserName, profile: str, username: str, output_dir: Path,
-                              *, debug: bool, include_child_comments: bool, include_comments: bool,
-                              no_log: bool, quiet: bool, sleep_time: int) -> None:
+async def _async_profile_main(browser: BrowserName,
+                              profile: str,
+                              username: str,
+                              output_dir: Path,
+                              *,
+                              catalogue: str | None = None,
+                              debug: bool,
+                              deferred_retries: DeferredRetries | None = None,
+                              fsync: FsyncPolicy = 'batch',
+                              include_child_comments: bool,
+                              include_comments: bool,
+                              json_format: JSONFormat = 'pretty',
+                              layout: LayoutKind = 'flat',
+                              media_store: str | None = None,
+                              metrics_interval: float = 10,
+                              metrics_writer: MetricsWriter | None = None,
+                              no_log: bool,
+                              profile_output: Path | None = None,
+                              quiet: bool,
+                              reel_concurrency: int = 1,
+                              response_cache: ResponseCache | None = None,
+                              retry_failed: bool = False,
+                              retry_policy: RetryPolicy | None = None,
+                              sleep_time: int,
+                              timeline_page_size: int | None = None) -> None:
     scraper = ProfileScraper(browser=browser,
                              browser_profile=profile,
+                             catalogue=catalogue,
                              child_comments=include_child_comments,
                              comments=include_comments,
+                             deferred_retries=deferred_retries,
                              disable_log=no_log,
+                             fsync=fsync,
+                             json_format=json_format,
+                             layout=layout,
+                             media_store=media_store,
                              output_dir=output_dir,
+                             reel_concurrency=reel_concurrency,
+                             response_cache=response_cache,
+                             retry_policy=retry_policy,
+                             timeline_page_size=timeline_page_size,
                              username=username)
-    await _drive_scraper(scraper, scraper.process, debug=debug, quiet=quiet, sleep_time=sleep_time)
-
 
-async def _async_saved_main(browser: BrowserName, profile: str, output_dir: str, *, debug: bool,
-                            include_child_comments: bool, include_comments: bool, no_log: bool,
-                            quiet: bool, sleep_time: int, unsave: bool) -> None:
+    async def coro_factory(ydl: Any, **kwargs: Any) -> None:
+        await scraper.process(ydl, retry_failed=retry_failed, **kwargs)
+
+    await _drive_scraper(scraper,
+                         coro_factory,
+                         debug=debug,
+                         metrics_interval=metrics_interval,
+                         metrics_writer=metrics_writer,
+                         profile_output=profile_output,
+                         quiet=quiet,
+                         sleep_time=sleep_time)
+
+
+async def _async_saved_main(browser: BrowserName,
+                            profile: str,
+                            output_dir: str,
+                            *,
+                            catalogue: str | None = None,
+                            debug: bool,
+                            deferred_retries: DeferredRetries | None = None,
+                            fsync: FsyncPolicy = 'batch',
+                            include_child_comments: bool,
+                            include_comments: bool,
+                            json_format: JSONFormat = 'pretty',
+                            layout: LayoutKind = 'flat',
+                            media_store: str | None = None,
+                            metrics_interval: float = 10,
+                            metrics_writer: MetricsWriter | None = None,
+                            no_log: bool,
+                            profile_output: Path | None = None,
+                            quiet: bool,
+                            response_cache: ResponseCache | None = None,
+                            retry_failed: bool = False,
+                            retry_policy: RetryPolicy | None = None,
+                            sleep_time: int,
+                            unsave: bool) -> None:
     scraper = SavedScraper(browser,
                            profile,
                            output_dir,
+                           catalogue=catalogue,
                            child_comments=include_child_comments,
                            comments=include_comments,
-                           disable_log=no_log)
+                           deferred_retries=deferred_retries,
+                           disable_log=no_log,
+                           fsync=fsync,
+                           json_format=json_format,
+                           layout=layout,
+                           media_store=media_store,
+                           response_cache=response_cache,
+                           retry_policy=retry_policy)
 
     async def coro_factory(ydl: Any, **kwargs: Any) -> None:
-        await scraper.process(ydl, unsave=unsave, **kwargs)
-
-    await _drive_scraper(scraper, coro_factory, debug=debug, quiet=quiet, sleep_time=sleep_time)
-
-
-def _run_archive(browser: BrowserName, profile: str, output_dir: str | None, username: str | None,
-                 *, debug: bool, include_child_comments: bool, include_comments: bool, no_log: bool,
-                 quiet: bool, saved: bool, sleep_time: int, unsave: bool) -> None:
+        await scraper.process(ydl, retry_failed=retry_failed, unsave=unsave, **kwargs)
+
+    await _drive_scraper(scraper,
+                         coro_factory,
+                         debug=debug,
+                         metrics_interval=metrics_interval,
+                         metrics_writer=metrics_writer,
+                         profile_output=profile_output,
+                         quiet=quiet,
+                         sleep_time=sleep_time)
+
+
+def _run_archive(browser: BrowserName,
+                 profile: str,
+                 output_dir: str | None,
+                 username: str | None,
+                 *,
+                 catalogue: str | None = None,
+                 debug: bool,
+                 deferred_retries: int = 0,
+                 fsync: FsyncPolicy = 'batch',
+                 include_child_comments: bool,
+                 include_comments: bool,
+                 json_format: JSONFormat = 'pretty',
+                 layout: LayoutKind = 'flat',
+                 media_store: str | None = None,
+                 metrics_file: str | None = None,
+                 metrics_format: MetricsFormat = 'jsonl',
+                 metrics_interval: float = 10,
+                 no_log: bool,
+                 profile_output: str | None = None,
+                 quiet: bool,
+                 reel_concurrency: int = 1,
+                 response_cache: str | None = None,
+                 response_cache_size: int = 256,
+                 response_cache_ttl: float = 3600,
+                 max_retries: int = 5,
+                 retry_budget: int = 100,
+                 retry_cool_down: float = 30,
+                 retry_failed: bool = False,
+                 saved: bool,
+                 sleep_time: int,
+                 timeline_page_size: int | None = None,
+                 unsave: bool) -> None:
+    metrics_writer = (MetricsWriter(metrics_file, metrics_format)
+                      if metrics_file is not None else None)
+    profile_path = Path(profile_output) if profile_output is not None else None
+    cache = None
+    if response_cache is not None:
+        cache = ResponseCache(response_cache,
+                              max_bytes=response_cache_size * 1024 * 1024,
+                              ttl=response_cache_ttl)
+    retry_policy = RetryPolicy(budget=retry_budget, max_retries=max_retries)
+    retries = (DeferredRetries(attempts=deferred_retries, cool_down=retry_cool_down)
+               if deferred_retries > 0 else None)
     if saved:
         asyncio.run(
             _async_saved_main(browser,
                               profile,
                               output_dir if output_dir is not None else '.',
+                              catalogue=catalogue,
                               debug=debug,
+                              deferred_retries=retries,
+                              fsync=fsync,
                               include_child_comments=include_child_comments,
                               include_comments=include_comments,
+                              json_format=json_format,
+                              layout=layout,
+                              media_store=media_store,
+                              metrics_interval=metrics_interval,
+                              metrics_writer=metrics_writer,
                               no_log=no_log,
+                              profile_output=profile_path,
                               quiet=quiet,
+                              response_cache=cache,
+                              retry_failed=retry_failed,
+                              retry_policy=retry_policy,
                               sleep_time=sleep_time,
                               unsave=unsave))
         return
@@ -304,12 +490,26 @@ def _run_archive(browser: BrowserName, profile: str, output_dir: str | None, use
                             profile,
                             profile_username,
                             resolved_output_dir,
+                            catalogue=catalogue,
                             debug=debug,
+                            deferred_retries=retries,
+                            fsync=fsync,
                             include_child_comments=include_child_comments,
                             include_comments=include_comments,
+                            json_format=json_format,
+                            layout=layout,
+                            media_store=media_store,
+                            metrics_interval=metrics_interval,
+                            metrics_writer=metrics_writer,
                             no_log=no_log,
+                            profile_output=profile_path,
                             quiet=quiet,
-                            sleep_time=sleep_time))
+                            reel_concurrency=reel_concurrency,
+                            response_cache=cache,
+                            retry_failed=retry_failed,
+                            retry_policy=retry_policy,
+                            sleep_time=sleep_time,
+                            timeline_page_size=timeline_page_size))
 
 
 @click.command(context_settings={'help_option_names': ('-h', '--help')})
@@ -350,6 +550,95 @@ def _run_archive(browser: BrowserName, profile: str, output_dir: str | None, use
               '--unsave',
               is_flag=True,
               help='Unsave posts after successful archive (only with --saved).')
+@click.option('--reel-concurrency',
+              default=1,
+              type=click.IntRange(min=1),
+              help='Number of chunks of highlights fetched in parallel (profile mode).')
+@click.option('--timeline-page-size',
+              default=None,
+              type=click.IntRange(min=1),
+              help='Number of posts per timeline page (profile mode). Probed automatically if not '
+              'given.')
+@click.option('--media-store',
+              default=None,
+              help='Store images once per unique content in this directory and hard link them '
+              'into the output directory.',
+              type=click.Path(file_okay=False, writable=True))
+@click.option('--layout',
+              default='flat',
+              type=click.Choice(LAYOUTS),
+              help='Where per-post files are written: all in the output directory (flat), in '
+              'YYYY/MM sub-directories by post date (date), or in 256 sub-directories by ID hash '
+              '(hash). Use instagram-archiver-migrate-layout to convert an existing archive.')
+@click.option('--json-format',
+              default='pretty',
+              type=click.Choice(JSON_FORMATS),
+              help='Format of per-post JSON files: indented (pretty), without whitespace '
+              '(compact), or compact and compressed as .json.gz (gzip) or .json.zst (zstd, '
+              'Python 3.14+ or the zstd extra).')
+@click.option('--catalogue',
+              default=None,
+              help='Record the metadata of saved posts and comments in this SQLite database, '
+              'which can be shared by several output directories and queried with SQL.',
+              type=click.Path(dir_okay=False, writable=True))
+@click.option('--max-retries',
+              default=5,
+              type=click.IntRange(min=0),
+              help='Number of times a failed request is retried, with jittered exponential '
+              'backoff.')
+@click.option('--retry-budget',
+              default=100,
+              type=click.IntRange(min=0),
+              help='Maximum number of retries per endpoint over the whole run.')
+@click.option('--deferred-retries',
+              default=0,
+              type=click.IntRange(min=0),
+              help='Number of times a failed post, comment thread or video is queued again after '
+              '--retry-cool-down. Items that still fail are recorded in the log. 0 disables.')
+@click.option('--retry-cool-down',
+              default=30.0,
+              type=click.FloatRange(min=0),
+              help='Seconds before a failed post, comment thread or video is queued again.')
+@click.option('--retry-failed',
+              is_flag=True,
+              help='Only process the items recorded as failed on previous runs (in the log and '
+              'failed.txt), without fetching the profile or saved posts.')
+@click.option('--response-cache',
+              default=None,
+              help='Cache media information and comments API responses in this directory, so '
+              're-runs and retries do not request them again.',
+              type=click.Path(file_okay=False, writable=True))
+@click.option('--response-cache-ttl',
+              default=3600.0,
+              type=click.FloatRange(min=0),
+              help='Seconds a cached response stays valid.')
+@click.option('--response-cache-size',
+              default=256,
+              type=click.IntRange(min=1),
+              help='Maximum size of the response cache in MiB. The least recently used responses '
+              'are evicted first.')
+@click.option('--fsync',
+              default='batch',
+              type=click.Choice(FSYNC_POLICIES),
+              help='When written files are flushed to disk: after each file, in batches, or never '
+              '(left to the operating system). Files are always written atomically.')
+@click.option('--metrics-file',
+              default=None,
+              help='Periodically write machine-readable run metrics to this file.',
+              type=click.Path(dir_okay=False, writable=True))
+@click.option('--metrics-format',
+              default='jsonl',
+              type=click.Choice(METRICS_FORMATS),
+              help='Format of --metrics-file: appended JSON lines or a Prometheus textfile.')
+@click.option('--metrics-interval',
+              default=10.0,
+              type=click.FloatRange(min=0, min_open=True),
+              help='Seconds between --metrics-file writes.')
+@click.option('--profile-output',
+              default=None,
+              help='Profile the run with cProfile and time the hot paths. Writes a text report '
+              'if the file name ends in .txt, otherwise a pstats dump.',
+              type=click.Path(dir_okay=False, writable=True))
 @click.argument('username', required=False)
 def main(output_dir: str | None,
          username: str | None,
@@ -357,12 +646,31 @@ def main(output_dir: str | None,
          profile: str = 'Default',
          sleep_time: int = 1,
          *,
+         catalogue: str | None = None,
          debug: bool = False,
+         deferred_retries: int = 0,
+         fsync: FsyncPolicy = 'batch',
          include_child_comments: bool = False,
          include_comments: bool = False,
+         json_format: JSONFormat = 'pretty',
+         layout: LayoutKind = 'flat',
+         max_retries: int = 5,
+         media_store: str | None = None,
+         metrics_file: str | None = None,
+         metrics_format: MetricsFormat = 'jsonl',
+         metrics_interval: float = 10,
          no_log: bool = False,
+         profile_output: str | None = None,
          quiet: bool = False,
+         reel_concurrency: int = 1,
+         response_cache: str | None = None,
+         response_cache_size: int = 256,
+         response_cache_ttl: float = 3600,
+         retry_budget: int = 100,
+         retry_cool_down: float = 30,
+         retry_failed: bool = False,
          saved: bool = False,
+         timeline_page_size: int | None = None,
          unsave: bool = False) -> None:
     """
     Archive a profile (USERNAME) or your saved posts (--saved).
@@ -378,19 +686,42 @@ def main(output_dir: str | None,
     if unsave and not saved:
         msg = '--unsave only applies with --saved/-s.'
         raise click.UsageError(msg)
+    if json_format == 'zstd' and not HAS_ZSTD:
+        msg = ('--json-format zstd requires Python 3.14 or newer, or the backports.zstd package '
+               '(pip install instagram-archiver[zstd]).')
+        raise click.UsageError(msg)
     setup_logging(debug=debug, loggers=cast('Any', _build_loggers(debug=debug)))
     try:
         _run_archive(browser,
                      profile,
                      output_dir,
                      username,
+                     catalogue=catalogue,
                      debug=debug,
+                     deferred_retries=deferred_retries,
+                     fsync=fsync,
                      include_child_comments=include_child_comments,
                      include_comments=include_comments,
+                     json_format=json_format,
+                     layout=layout,
+                     media_store=media_store,
+                     metrics_file=metrics_file,
+                     metrics_format=metrics_format,
+                     metrics_interval=metrics_interval,
                      no_log=no_log,
+                     profile_output=profile_output,
                      quiet=quiet,
+                     reel_concurrency=reel_concurrency,
+                     max_retries=max_retries,
+                     retry_budget=retry_budget,
+                     retry_cool_down=retry_cool_down,
+                     retry_failed=retry_failed,
+                     response_cache=response_cache,
+                     response_cache_size=response_cache_size,
+                     response_cache_ttl=response_cache_ttl,
                      saved=saved,
                      sleep_time=sleep_time,
+                     timeline_page_size=timeline_page_size,
                      unsave=unsave)
     except UnexpectedRedirect as e:
         click.echo('Unexpected redirect. Assuming request limit has been reached.', err=True)
@@ -402,3 +733,72 @@ def main(output_dir: str | None,
             raise
         click.echo('Run with --debug for more information.', err=True)
         raise click.Abort from e
+
+
+@click.command(context_settings={'help_option_names': ('-h', '--help')})
+@click.option('-d', '--debug', is_flag=True, help='Enable debug output.')
+@click.option('-l',
+              '--layout',
+              required=True,
+              type=click.Choice(LAYOUTS),
+              help='Layout to convert the archive to.')
+@click.option('--log-file',
+              default=None,
+              help='Path of the log database. Defaults to .log.db in OUTPUT_DIR.',
+              type=click.Path(dir_okay=False))
+@click.argument('output_dir', type=click.Path(exists=True, file_okay=False, writable=True))
+def migrate_layout_main(output_dir: str,
+                        *,
+                        layout: LayoutKind,
+                        debug: bool = False,
+                        log_file: str | None = None) -> None:
+    """Move the per-post files of an existing archive (OUTPUT_DIR) into another layout."""
+    setup_logging(debug=debug, loggers=cast('Any', _build_loggers(debug=debug)))
+    moved = OutputLayout(layout, output_dir).migrate(log_file)
+    click.echo(f'Moved {moved} file(s).')
+
+
+@click.command(context_settings={'help_option_names': ('-h', '--help')})
+@click.option('-d', '--debug', is_flag=True, help='Enable debug output.')
+@click.option('-j',
+              '--jobs',
+              default=None,
+              type=click.IntRange(min=1),
+              help='Number of processes hashing files. Defaults to the number of CPUs.')
+@click.option('--log-file',
+              default=None,
+              help='Path of the log database. Defaults to .log.db in OUTPUT_DIR.',
+              type=click.Path(dir_okay=False))
+@click.option('--no-requeue',
+              is_flag=True,
+              help='Only report problems. Do not move damaged files to the quarantine directory or '
+              'queue them for --retry-failed.')
+@click.argument('output_dir', type=click.Path(exists=True, file_okay=False, writable=True))
+def verify_main(output_dir: str,
+                *,
+                debug: bool = False,
+                jobs: int | None = None,
+                log_file: str | None = None,
+                no_requeue: bool = False) -> None:
+    """
+    Check the files of an archive (OUTPUT_DIR) against the sizes and digests in its log.
+
+    Missing and damaged files are queued to be downloaded again by the next run with
+    --retry-failed. Damaged files are moved to OUTPUT_DIR/.quarantine. The exit status is 1 if
+    any problem was found.
+    """  # ruff:ignore[docstring-missing-exception]
+    setup_logging(debug=debug, loggers=cast('Any', _build_loggers(debug=debug)))
+    report = verify_archive(output_dir, jobs=jobs, log_file=log_file, requeue=not no_requeue)
+    for path, problem in report.problems.items():
+        click.echo(f'{path}: {problem}')
+    for path in report.unchecked:
+        click.echo(f'{path}: cannot be checked on this Python')
+    click.echo(f'Checked {report.checked} file(s), found {len(report.problems)} problem(s).')
+    if report.quarantined:
+        click.echo(f'Moved {len(report.quarantined)} damaged file(s) to '
+                   f'{Path(output_dir) / QUARANTINE_DIR}.')
+    if report.requeued:
+        click.echo(f'Queued {len(report.requeued)} item(s). Run with --retry-failed to download '
+                   'them again.')
+    if report.problems:
+        raise click.exceptions.Exit(1)
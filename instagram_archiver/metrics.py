@@ -0,0 +1,459 @@
+"""Request timing and transfer metrics."""
+
+from __future__ import annotations
+
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Literal, TypeAlias
+import io
+import json
+import pstats
+
+from .utils import atomic_write
+
+if TYPE_CHECKING:
+    from collections.abc import Mapping
+    import cProfile
+
+__all__ = ('LATENCY_BUCKETS', 'METRICS_FORMATS', 'GaugeSample', 'LatencyHistogram', 'MetricsFormat',
+           'MetricsWriter', 'RequestSample', 'WorkerUtilisation', 'format_bytes',
+           'format_prometheus', 'format_seconds', 'write_profile_report')
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+"""
+Upper bounds (in seconds) of the latency histogram buckets.
+
+Observations above the last bound land in an implicit overflow bucket.
+
+:meta hide-value:
+"""
+METRICS_FORMATS = ('jsonl', 'prometheus')
+"""
+Supported metrics output formats.
+
+:meta hide-value:
+"""
+MetricsFormat: TypeAlias = Literal['jsonl', 'prometheus']
+"""Metrics output format: a JSON-lines stream or a Prometheus textfile."""
+_KIB = 1024
+_PROMETHEUS_PREFIX = 'instagram_archiver'
+
+
+def format_seconds(seconds: float) -> str:
+    """
+    Format a duration compactly for the status display and summaries.
+
+    Parameters
+    ----------
+    seconds : float
+        Duration in seconds.
+
+    Returns
+    -------
+    str
+        Milliseconds below one second (``'120ms'``), otherwise seconds (``'2.5s'``).
+    """
+    if seconds < 1:
+        return f'{seconds * 1000:.0f}ms'
+    return f'{seconds:.1f}s'
+
+
+def format_bytes(size: float) -> str:
+    """
+    Format a byte count using binary units.
+
+    Parameters
+    ----------
+    size : float
+        Number of bytes.
+
+    Returns
+    -------
+    str
+        Human-readable size such as ``'12.3 MiB'``.
+    """
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if size < _KIB:
+            return f'{size:.0f} {unit}' if unit == 'B' else f'{size:.1f} {unit}'
+        size /= _KIB
+    return f'{size:.1f} TiB'
+
+
+@dataclass
+class LatencyHistogram:
+    """Fixed-bucket latency histogram for a single endpoint."""
+
+    bucket_counts: list[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+    """Observation count per bucket of :py:data:`LATENCY_BUCKETS`, plus the overflow bucket."""
+    bytes_transferred: int = 0
+    """Total response body size in bytes."""
+    count: int = 0
+    """Number of observations."""
+    errors: int = 0
+    """Number of observations that failed (error status, exception or non-zero exit)."""
+    max: float = 0.0
+    """Slowest observation in seconds."""
+    total: float = 0.0
+    """Sum of all observations in seconds."""
+    def observe(self, seconds: float, nbytes: int = 0, *, failed: bool = False) -> None:
+        """
+        Record one request.
+
+        Parameters
+        ----------
+        seconds : float
+            Wall-clock duration of the request.
+        nbytes : int
+            Size of the response body.
+        failed : bool
+            Whether the request failed.
+        """
+        self.bucket_counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.bytes_transferred += nbytes
+        self.count += 1
+        self.errors += failed
+        self.max = max(self.max, seconds)
+        self.total += seconds
+
+    @property
+    def mean(self) -> float:
+        """Mean duration in seconds, or ``0.0`` without observations."""
+        return self.total / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimate a quantile from the bucket counts.
+
+        The estimate is the upper bound of the bucket containing the quantile, capped at
+        :py:attr:`max` so the overflow bucket still reports a real duration.
+
+        Parameters
+        ----------
+        q : float
+            Quantile between ``0`` and ``1``.
+
+        Returns
+        -------
+        float
+            Estimated duration in seconds, or ``0.0`` without observations.
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, bucket_count in zip(LATENCY_BUCKETS, self.bucket_counts, strict=False):
+            seen += bucket_count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def as_dict(self) -> dict[str, Any]:
+        """
+        Serialise the histogram for machine-readable output.
+
+        Returns
+        -------
+        dict[str, Any]
+            Counts, totals, quantile estimates and cumulative bucket counts keyed by upper
+            bound (``'+Inf'`` for the overflow bucket).
+        """
+        cumulative: dict[str, int] = {}
+        running = 0
+        for bound, bucket_count in zip((*LATENCY_BUCKETS, '+Inf'), self.bucket_counts, strict=True):
+            running += bucket_count
+            cumulative[str(bound)] = running
+        return {
+            'buckets': cumulative,
+            'bytes': self.bytes_transferred,
+            'count': self.count,
+            'errors': self.errors,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'sum': self.total
+        }
+
+    def render(self) -> str:
+        """
+        Build a one-line summary of the histogram.
+
+        Returns
+        -------
+        str
+            Request count, p50/p95/max durations and bytes transferred.
+        """
+        return (f'{self.count} req, p50 {format_seconds(self.quantile(0.5))}, '
+                f'p95 {format_seconds(self.quantile(0.95))}, max {format_seconds(self.max)}, '
+                f'{format_bytes(self.bytes_transferred)}')
+
+
+@dataclass
+class GaugeSample:
+    """Running summary of a periodically sampled gauge such as a queue depth."""
+
+    count: int = 0
+    """Number of samples."""
+    last: int = 0
+    """Most recent sample."""
+    max: int = 0
+    """Largest sample."""
+    total: int = 0
+    """Sum of all samples."""
+    def observe(self, value: int) -> None:
+        """
+        Record one sample.
+
+        Parameters
+        ----------
+        value : int
+            Sampled value.
+        """
+        self.count += 1
+        self.last = value
+        self.max = max(self.max, value)
+        self.total += value
+
+    @property
+    def mean(self) -> float:
+        """Mean of all samples, or ``0.0`` without samples."""
+        return self.total / self.count if self.count else 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        """
+        Serialise the summary for machine-readable output.
+
+        Returns
+        -------
+        dict[str, Any]
+            Sample count, last, mean and maximum values.
+        """
+        return {'count': self.count, 'last': self.last, 'max': self.max, 'mean': self.mean}
+
+    def render(self) -> str:
+        """
+        Build a one-line summary.
+
+        Returns
+        -------
+        str
+            Mean and maximum sampled values.
+        """
+        return f'mean {self.mean:.1f}, max {self.max}'
+
+
+@dataclass
+class WorkerUtilisation:
+    """Busy and idle time of a single queue worker."""
+
+    busy: float = 0.0
+    """Seconds spent processing items."""
+    idle: float = 0.0
+    """Seconds spent waiting on the queue."""
+    items: int = 0
+    """Number of items processed (the shutdown sentinel is not counted)."""
+    def record(self, *, busy: float, idle: float, item: bool = True) -> None:
+        """
+        Record one iteration of the worker loop.
+
+        Parameters
+        ----------
+        busy : float
+            Seconds spent processing the item.
+        idle : float
+            Seconds spent waiting for the item.
+        item : bool
+            Whether a real item (rather than the shutdown sentinel) was processed.
+        """
+        self.busy += busy
+        self.idle += idle
+        self.items += item
+
+    @property
+    def utilisation(self) -> float:
+        """Fraction of the worker's lifetime spent busy, or ``0.0`` before any iteration."""
+        total = self.busy + self.idle
+        return self.busy / total if total else 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        """
+        Serialise the utilisation for machine-readable output.
+
+        Returns
+        -------
+        dict[str, Any]
+            Busy and idle seconds, item count and utilisation fraction.
+        """
+        return {
+            'busy': self.busy,
+            'idle': self.idle,
+            'items': self.items,
+            'utilisation': self.utilisation
+        }
+
+    def render(self) -> str:
+        """
+        Build a one-line summary.
+
+        Returns
+        -------
+        str
+            Utilisation percentage, busy and idle time and item count.
+        """
+        return (f'{self.utilisation:.0%} busy ({format_seconds(self.busy)} busy, '
+                f'{format_seconds(self.idle)} idle, {self.items} items)')
+
+
+@dataclass
+class RequestSample:
+    """Per-request accumulator filled in while a timed request is in progress."""
+
+    failed: bool = False
+    """Whether the request raised or returned an error status."""
+    nbytes: int = 0
+    """Size of the response body in bytes."""
+    def record(self, response: Any) -> None:
+        """
+        Capture the body size and outcome of ``response``.
+
+        Parameters
+        ----------
+        response : Any
+            A niquests response. Responses without a ``bytes`` body count as zero.
+        """
+        content = getattr(response, 'content', None)
+        if isinstance(content, bytes):
+            self.nbytes += len(content)
+        status_code = getattr(response, 'status_code', None)
+        if isinstance(status_code, int) and status_code >= HTTPStatus.BAD_REQUEST:
+            self.failed = True
+
+
+def _prometheus_line(name: str, value: float, labels: Mapping[str, str] | None = None) -> str:
+    label_text = ','.join(f'{key}="{label}"' for key, label in (labels or {}).items())
+    full_name = f'{_PROMETHEUS_PREFIX}_{name}'
+    return f'{full_name}{{{label_text}}} {value}' if label_text else f'{full_name} {value}'
+
+
+def format_prometheus(snapshot: Mapping[str, Any]) -> str:
+    """
+    Render a statistics snapshot in the Prometheus text exposition format.
+
+    Parameters
+    ----------
+    snapshot : Mapping[str, Any]
+        Snapshot to render.
+
+    Returns
+    -------
+    str
+        Exposition text suitable for the node exporter textfile collector.
+    """
+    lines = [
+        f'# TYPE {_PROMETHEUS_PREFIX}_run_duration_seconds gauge',
+        _prometheus_line('run_duration_seconds', snapshot['elapsed']),
+        f'# TYPE {_PROMETHEUS_PREFIX}_requests_in_flight gauge',
+        _prometheus_line('requests_in_flight', snapshot['in_flight']),
+        f'# TYPE {_PROMETHEUS_PREFIX}_request_errors_total counter',
+        _prometheus_line('request_errors_total', snapshot['errors']),
+        f'# TYPE {_PROMETHEUS_PREFIX}_request_retries_total counter',
+        _prometheus_line('request_retries_total',
+                         snapshot['retries']), f'# TYPE {_PROMETHEUS_PREFIX}_items_total counter'
+    ]
+    lines.extend(
+        _prometheus_line('items_total', value, {'kind': key})
+        for key, value in snapshot['counters'].items())
+    lines.append(f'# TYPE {_PROMETHEUS_PREFIX}_throughput_per_second gauge')
+    lines.extend(
+        _prometheus_line('throughput_per_second', value, {'kind': key})
+        for key, value in snapshot['throughput'].items())
+    lines.append(f'# TYPE {_PROMETHEUS_PREFIX}_queue_depth gauge')
+    lines.extend(
+        _prometheus_line('queue_depth', value, {'queue': key})
+        for key, value in snapshot['queues'].items())
+    lines.append(f'# TYPE {_PROMETHEUS_PREFIX}_queue_depth_max gauge')
+    lines.extend(
+        _prometheus_line('queue_depth_max', value['max'], {'queue': key})
+        for key, value in snapshot['queue_depths'].items())
+    lines.append(f'# TYPE {_PROMETHEUS_PREFIX}_worker_busy_seconds_total counter')
+    lines.extend(
+        _prometheus_line('worker_busy_seconds_total', value['busy'], {'worker': key})
+        for key, value in snapshot['workers'].items())
+    lines.append(f'# TYPE {_PROMETHEUS_PREFIX}_worker_idle_seconds_total counter')
+    lines.extend(
+        _prometheus_line('worker_idle_seconds_total', value['idle'], {'worker': key})
+        for key, value in snapshot['workers'].items())
+    lines.append(f'# TYPE {_PROMETHEUS_PREFIX}_request_duration_seconds histogram')
+    for endpoint, histogram in snapshot['latency'].items():
+        lines.extend(
+            _prometheus_line('request_duration_seconds_bucket', count, {
+                'endpoint': endpoint,
+                'le': bound
+            }) for bound, count in histogram['buckets'].items())
+        lines.extend((_prometheus_line('request_duration_seconds_sum', histogram['sum'],
+                                       {'endpoint': endpoint}),
+                      _prometheus_line('request_duration_seconds_count', histogram['count'],
+                                       {'endpoint': endpoint})))
+    lines.append(f'# TYPE {_PROMETHEUS_PREFIX}_response_bytes_total counter')
+    lines.extend(
+        _prometheus_line('response_bytes_total', histogram['bytes'], {'endpoint': endpoint})
+        for endpoint, histogram in snapshot['latency'].items())
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsWriter:
+    """Periodic machine-readable metrics sink."""
+    def __init__(self, path: str | Path, metrics_format: MetricsFormat = 'jsonl') -> None:
+        """
+        Initialise the writer.
+
+        Parameters
+        ----------
+        path : str | Path
+            Output file. JSON-lines snapshots are appended to it; a Prometheus textfile is
+            atomically replaced on every write so a collector never reads a partial file.
+        metrics_format : MetricsFormat
+            Output format.
+        """
+        self.format: MetricsFormat = metrics_format
+        """Output format."""
+        self.path = Path(path)
+        """Output file."""
+
+    def write(self, snapshot: Mapping[str, Any]) -> None:
+        """
+        Write one snapshot.
+
+        Parameters
+        ----------
+        snapshot : Mapping[str, Any]
+            Snapshot from :py:meth:`Stats.snapshot() <instagram_archiver.typing.Stats.snapshot>`.
+        """
+        if self.format == 'jsonl':
+            with self.path.open('a', encoding='utf-8') as f:
+                f.write(json.dumps(snapshot, sort_keys=True) + '\n')
+            return
+        atomic_write(self.path, format_prometheus(snapshot).encode())
+
+
+def write_profile_report(profiler: cProfile.Profile, path: str | Path) -> None:
+    """
+    Write the statistics collected by a profiler.
+
+    Parameters
+    ----------
+    profiler : cProfile.Profile
+        Profiler that has been disabled.
+    path : str | Path
+        Output file. With a ``.txt`` suffix a human-readable report sorted by cumulative time
+        is written; otherwise the raw :py:mod:`pstats` dump is written for tools such as
+        ``snakeviz`` or ``python -m pstats``.
+    """
+    path = Path(path)
+    if path.suffix != '.txt':
+        profiler.dump_stats(path)
+        return
+    report = io.StringIO()
+    pstats.Stats(profiler, stream=report).sort_stats(pstats.SortKey.CUMULATIVE).print_stats()
+    path.write_text(report.getvalue(), encoding='utf-8')
@@ -2,50 +2,105 @@
 
 from __future__ import annotations
 
+from http import HTTPStatus
 from pathlib import Path
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any
 import asyncio
+import hashlib
+import json
 import logging
+import math
 
 from niquests.exceptions import HTTPError
 from typing_extensions import Self, override
 
-from .client import InstagramClient
-from .compat import chdir
+from .catalogue import Catalogue
+from .client import LogDBClient, QueryRejected, UnexpectedRedirect
+from .compat import gather_or_cancel
+from .constants import REEL_PAGE_SIZES, TIMELINE_PAGE_SIZES
 from .dedup import LogDB
+from .layout import OutputLayout
+from .store import ContentStore
 from .typing import (
+    ENDPOINT_GRAPHQL,
     BrowserName,
     Edge,
+    HighlightItem,
     WebProfileInfo,
     XDTAPIV1FeedUserTimelineGraphQLConnectionContainer,
+    XDTStoriesV3ReelPageGalleryConnection,
 )
-from .utils import SaveCommentsCheckDisabledMixin, dump_json, write_bytes, write_failed_urls
-from .workers import WorkerAbort, comments_worker, image_worker, video_worker
+from .utils import (
+    SaveCommentsCheckDisabledMixin,
+    WriteSync,
+    dump_json,
+    read_failed_urls,
+    use_write_sync,
+    write_bytes,
+)
+from .workers import WorkerAbort, comments_worker, image_worker, queue_sampler, video_worker
 
 if TYPE_CHECKING:
-    from types import TracebackType
+    from collections.abc import Coroutine
 
     from yt_dlp_utils.aio import AsyncYoutubeDL
 
-    from .typing import OnMessage, Stats, YTDLPState
+    from .cache import ResponseCache
+    from .layout import LayoutKind
+    from .retry import RetryPolicy
+    from .typing import HTTPCacheEntry, OnMessage, PageInfo, Stats, YTDLPState
+    from .utils import FsyncPolicy, JSONFormat
+    from .workers import DeferredRetries
 
 __all__ = ('ProfileScraper',)
 
 log = logging.getLogger(__name__)
 
 
-class ProfileScraper(SaveCommentsCheckDisabledMixin, InstagramClient):
+def _highlight_watermark(item: HighlightItem) -> str | None:
+    """
+    Build a value that changes whenever items are added to a highlight.
+
+    Parameters
+    ----------
+    item : HighlightItem
+        Highlights tray item.
+
+    Returns
+    -------
+    str | None
+        The newest item timestamp and the item count, or ``None`` when the tray item carries
+        neither.
+    """
+    latest = item.get('latest_reel_media')
+    count = item.get('media_count')
+    if latest is None and count is None:
+        return None
+    return f'{latest}:{count}'
+
+
+class ProfileScraper(SaveCommentsCheckDisabledMixin, LogDBClient):
     """Scrape an Instagram profile timeline."""
     def __init__(self,
                  username: str,
                  *,
+                 catalogue: str | Path | None = None,
+                 deferred_retries: DeferredRetries | None = None,
+                 fsync: FsyncPolicy = 'batch',
+                 json_format: JSONFormat = 'pretty',
+                 layout: LayoutKind = 'flat',
                  log_file: str | Path | None = None,
+                 media_store: str | Path | None = None,
+                 response_cache: ResponseCache | None = None,
+                 retry_policy: RetryPolicy | None = None,
                  output_dir: str | Path | None = None,
                  disable_log: bool = False,
                  browser: BrowserName = 'chrome',
                  browser_profile: str = 'Default',
                  child_comments: bool = False,
-                 comments: bool = False) -> None:
+                 comments: bool = False,
+                 reel_concurrency: int = 1,
+                 timeline_page_size: int | None = None) -> None:
         """
         Initialise ``ProfileScraper``.
 
@@ -53,8 +108,32 @@ class ProfileScraper(SaveCommentsCheckDisabledMixin, InstagramClient):
         ----------
         username : str
             The username to scrape.
+        catalogue : str | Path | None
+            SQLite database that the metadata of saved posts and comments is recorded in. See
+            :py:class:`~instagram_archiver.catalogue.Catalogue`.
+        deferred_retries : DeferredRetries | None
+            Retry stage that failed media, comments and video work is handed to. Items that
+            still fail are recorded in the dedup log. When ``None``, a failed media or comments
+            save aborts processing.
+        fsync : FsyncPolicy
+            When the written files are flushed to stable storage. See
+            :py:class:`~instagram_archiver.utils.WriteSync`.
         log_file : str | Path | None
             The log file to use.
+        json_format : JSONFormat
+            Format of the per-post JSON files. See
+            :py:func:`~instagram_archiver.utils.encode_json`.
+        layout : LayoutKind
+            Output layout of the per-media files. See
+            :py:class:`~instagram_archiver.layout.OutputLayout`.
+        media_store : str | Path | None
+            Directory of a content-addressed store shared across output directories. Saved
+            images are hard-linked from it instead of written directly.
+        response_cache : ResponseCache | None
+            On-disk cache for media information and comments responses.
+        retry_policy : RetryPolicy | None
+            Policy for retrying failed requests. Defaults to :py:class:`RetryPolicy` with its
+            default settings.
         output_dir : str | Path | None
             The output directory to save the posts to.
         disable_log : bool
@@ -67,23 +146,35 @@ class ProfileScraper(SaveCommentsCheckDisabledMixin, InstagramClient):
             Whether to recursively fetch child (reply) comments. Implies ``comments=True``.
         comments : bool
             Whether to save comments or not.
+        reel_concurrency : int
+            Number of chunks the highlight IDs are split into and fetched in parallel.
+        timeline_page_size : int | None
+            Number of posts requested per timeline page. When ``None``, the largest size the
+            endpoint accepts is probed from
+            :py:data:`~instagram_archiver.constants.TIMELINE_PAGE_SIZES`.
         """
         super().__init__(browser, browser_profile)
         self._output_dir = Path(output_dir or Path.cwd() / username)
         self._output_dir.mkdir(parents=True, exist_ok=True)
         self._log_db = LogDB(Path(log_file or self._output_dir / '.log.db'), disabled=disable_log)
+        self._highlight_watermarks: dict[str, str] = {}
+        self._reel_concurrency = max(reel_concurrency, 1)
+        self._reel_page_size: int | None = None
+        self._reel_page_size_lock = asyncio.Lock()
+        self._timeline_page_size = timeline_page_size
         self._username = username
+        self.catalogue = Catalogue(catalogue) if catalogue is not None else None
+        self.json_format = json_format
+        self.layout = OutputLayout(layout, self._output_dir)
+        self.media_store = ContentStore(media_store) if media_store is not None else None
+        self.deferred_retries = deferred_retries
+        self.write_sync = WriteSync(fsync)
+        self.response_cache = response_cache
+        if retry_policy is not None:
+            self.retry_policy = retry_policy
         self.should_save_comments = comments or child_comments
         self.should_save_child_comments = child_comments
 
-    @override
-    def save_to_log(self, url: str) -> None:
-        self._log_db.save(url)
-
-    @override
-    def is_saved(self, url: str) -> bool:
-        return self._log_db.is_saved(url)
-
     @override
     async def __aenter__(self) -> Self:
         """
@@ -97,12 +188,38 @@ class ProfileScraper(SaveCommentsCheckDisabledMixin, InstagramClient):
         await super().__aenter__()
         return self
 
-    @override
-    async def __aexit__(self, _: type[BaseException] | None, __: BaseException | None,
-                        ___: TracebackType | None) -> None:
-        """Close the SQLite log and the underlying session."""
-        self._log_db.close()
-        await super().__aexit__(_, __, ___)
+    async def _reel_page(self, reel_ids: list[str], *, after: str | None,
+                         is_highlight: bool) -> XDTStoriesV3ReelPageGalleryConnection | None:
+        if self._reel_page_size is None:
+            # Highlight chunks and current stories start concurrently. Only the first of them
+            # probes, the others wait for its result.
+            async with self._reel_page_size_lock:
+                if self._reel_page_size is None:
+                    return await self._probe_reel_page(reel_ids,
+                                                       after=after,
+                                                       is_highlight=is_highlight)
+        return await self.reel_page_gallery(reel_ids,
+                                            after=after,
+                                            first=self._reel_page_size,
+                                            is_highlight=is_highlight)
+
+    async def _probe_reel_page(self, reel_ids: list[str], *, after: str | None,
+                               is_highlight: bool) -> XDTStoriesV3ReelPageGalleryConnection | None:
+        # Probe for the largest page size the endpoint accepts and keep it for the run.
+        for first in REEL_PAGE_SIZES:
+            connection = await self.reel_page_gallery(reel_ids,
+                                                      after=after,
+                                                      first=first,
+                                                      is_highlight=is_highlight)
+            if connection is not None:
+                log.debug('Using a reel gallery page size of %d.', first)
+                self._reel_page_size = first
+                return connection
+        # A failure is not necessarily a rejected size. Keep the smallest size instead of
+        # probing again on every request.
+        log.debug('No reel gallery page size accepted, using %d.', REEL_PAGE_SIZES[-1])
+        self._reel_page_size = REEL_PAGE_SIZES[-1]
+        return None
 
     async def _dispatch_reel(self,
                              reel_ids: list[str],
@@ -110,25 +227,246 @@ class ProfileScraper(SaveCommentsCheckDisabledMixin, InstagramClient):
                              is_highlight: bool,
                              username: str,
                              video_queue: asyncio.Queue[str | None],
-                             yt_dlp_state: YTDLPState | None = None) -> None:
+                             yt_dlp_state: YTDLPState | None = None) -> bool:
+        # Returns whether every page loaded and every image was saved.
+        complete = True
         after: str | None = None
         while True:
-            connection = await self.reel_page_gallery(reel_ids,
-                                                      after=after,
-                                                      is_highlight=is_highlight)
+            connection = await self._reel_page(reel_ids, after=after, is_highlight=is_highlight)
             if connection is None:
-                return
+                return False
             for edge in connection['edges']:
                 for item in edge['node']['items']:
-                    await self.save_reel_item(item,
-                                              video_queue,
-                                              username=username,
-                                              yt_dlp_state=yt_dlp_state)
+                    saved = await self.save_reel_item(item,
+                                                      video_queue,
+                                                      username=username,
+                                                      yt_dlp_state=yt_dlp_state)
+                    complete = complete and saved
             page_info = connection['page_info']
             if not page_info['has_next_page']:
-                return
+                return complete
             after = page_info['end_cursor']
 
+    async def _dispatch_highlight_chunk(self,
+                                        highlight_ids: list[str],
+                                        *,
+                                        video_queue: asyncio.Queue[str | None],
+                                        yt_dlp_state: YTDLPState | None = None) -> None:
+        if not await self._dispatch_reel(highlight_ids,
+                                         is_highlight=True,
+                                         username=self._username,
+                                         video_queue=video_queue,
+                                         yt_dlp_state=yt_dlp_state):
+            # Fetch these highlights again on the next run.
+            log.warning('Not every item of highlights %s was saved.', ', '.join(highlight_ids))
+            for highlight_id in highlight_ids:
+                self._highlight_watermarks.pop(highlight_id, None)
+
+    async def _dispatch_highlights(self,
+                                   user_id: int | str,
+                                   *,
+                                   video_queue: asyncio.Queue[str | None],
+                                   yt_dlp_state: YTDLPState | None = None) -> None:
+        try:
+            tray = (await self.highlights_tray(user_id))['tray']
+        except HTTPError:
+            log.exception('Failed to get highlights data.')
+            return
+        highlight_ids: list[str] = []
+        for item in tray:
+            highlight_id = item['id'].split(':')[-1]
+            watermark = _highlight_watermark(item)
+            if watermark is not None:
+                if self._log_db.highlight_watermark(highlight_id) == watermark:
+                    log.debug('Highlight %s is unchanged since the last run.', highlight_id)
+                    continue
+                self._highlight_watermarks[highlight_id] = watermark
+            highlight_ids.append(highlight_id)
+        if not highlight_ids:
+            return
+        chunk_size = math.ceil(len(highlight_ids) / self._reel_concurrency)
+        await gather_or_cancel(*(self._dispatch_highlight_chunk(
+            highlight_ids[i:i + chunk_size], video_queue=video_queue, yt_dlp_state=yt_dlp_state)
+                                 for i in range(0, len(highlight_ids), chunk_size)))
+
+    async def _dispatch_current_stories(self,
+                                        user_id: int | str,
+                                        *,
+                                        video_queue: asyncio.Queue[str | None],
+                                        yt_dlp_state: YTDLPState | None = None) -> None:
+        try:
+            await self._dispatch_reel([str(user_id)],
+                                      is_highlight=False,
+                                      username=self._username,
+                                      video_queue=video_queue,
+                                      yt_dlp_state=yt_dlp_state)
+        except HTTPError:
+            log.exception('Failed to get current stories.')
+
+    async def _dispatch_timeline(self,
+                                 edges: list[Edge],
+                                 image_queue: asyncio.Queue[Edge | None],
+                                 comments_queue: asyncio.Queue[Edge | None],
+                                 video_queue: asyncio.Queue[str | None],
+                                 *,
+                                 page_info: PageInfo | None = None,
+                                 stats: Stats | None = None,
+                                 yt_dlp_state: YTDLPState | None = None) -> None:
+        after = None
+        if edges:
+            await self.dispatch_edges(edges,
+                                      image_queue,
+                                      comments_queue,
+                                      video_queue,
+                                      stats=stats,
+                                      yt_dlp_state=yt_dlp_state)
+            # The profile information already holds the first posts, so continue after them.
+            if page_info is not None:
+                if not page_info['has_next_page']:
+                    return
+                after = page_info['end_cursor']
+        try:
+            first_page = await self._first_timeline_page(after)
+        except QueryRejected:
+            # The cursor from the profile information can be rejected. Start from the top
+            # instead; posts that were already dispatched are skipped as in flight.
+            log.warning('Timeline query after the profile cursor was rejected. Starting from the '
+                        'top.')
+            first_page = await self._first_timeline_page()
+        if first_page is None:
+            log.error('First GraphQL query failed.')
+            return
+        d: XDTAPIV1FeedUserTimelineGraphQLConnectionContainer | None
+        d, page_size = first_page
+        connection = d['xdt_api__v1__feed__user_timeline_graphql_connection']
+        while True:
+            # Keep the request for the next page in flight while this page is dispatched.
+            page_info = connection['page_info']
+            next_page = None
+            if page_info['has_next_page']:
+                next_page = asyncio.create_task(
+                    self.graphql_query(self._timeline_variables(page_size, page_info['end_cursor']),
+                                       cast_to=XDTAPIV1FeedUserTimelineGraphQLConnectionContainer))
+            try:
+                await self.dispatch_edges(connection['edges'],
+                                          image_queue,
+                                          comments_queue,
+                                          video_queue,
+                                          stats=stats,
+                                          yt_dlp_state=yt_dlp_state)
+            except BaseException:
+                if next_page is not None:
+                    next_page.cancel()
+                    await asyncio.gather(next_page, return_exceptions=True)
+                raise
+            if next_page is None:
+                break
+            d = await next_page
+            if not d:
+                break
+            connection = d['xdt_api__v1__feed__user_timeline_graphql_connection']
+
+    def _timeline_variables(self, page_size: int, after: str | None = None) -> dict[str, Any]:
+        variables: dict[str, Any] = {
+            'data': {
+                'count': page_size,
+                'include_reel_media_seen_timestamp': True,
+                'include_relationship_info': True,
+                'latest_besties_reel_media': True,
+                'latest_reel_media': True
+            },
+            'username': self._username,
+            '__relay_internal__pv__PolarisIsLoggedInrelayprovider': True,
+            '__relay_internal__pv__PolarisShareSheetV3relayprovider': True
+        }
+        if after is not None:
+            variables.update({'after': after, 'before': None, 'first': page_size, 'last': None})
+        return variables
+
+    async def _first_timeline_page(
+        self,
+        after: str | None = None
+    ) -> tuple[XDTAPIV1FeedUserTimelineGraphQLConnectionContainer, int] | None:
+        # Without an explicit page size, probe for the largest one the endpoint accepts. Only a
+        # rejected query moves on to a smaller size. Other failures (rate limiting once the
+        # request retries are used up, for example) say nothing about the size, so the same
+        # size is tried again.
+        page_sizes = (TIMELINE_PAGE_SIZES if self._timeline_page_size is None else
+                      (self._timeline_page_size,))
+        for page_size in page_sizes:
+            attempt = 0
+            while True:
+                try:
+                    d = await self.graphql_query(
+                        self._timeline_variables(page_size, after),
+                        cast_to=XDTAPIV1FeedUserTimelineGraphQLConnectionContainer,
+                        raise_rejected=True)
+                except QueryRejected:
+                    if after is not None:
+                        # The cursor may be what was rejected. Let the caller decide.
+                        raise
+                    log.debug('Timeline page size %d was rejected.', page_size)
+                    break
+                if d:
+                    self._timeline_page_size = page_size
+                    log.info('Using a timeline page size of %d (the first page returned %d posts).',
+                             page_size,
+                             len(d['xdt_api__v1__feed__user_timeline_graphql_connection']['edges']))
+                    return d, page_size
+                if not self._use_retry(ENDPOINT_GRAPHQL, attempt):
+                    return None
+                delay = self.retry_policy.delay(attempt)
+                attempt += 1
+                log.info('Retrying the first timeline page in %.1f seconds.', delay)
+                await asyncio.sleep(delay)
+        return None
+
+    def _cache_entry(self, target: str) -> HTTPCacheEntry | None:
+        # An entry is only useful while the file it describes is still there.
+        return self._log_db.http_cache_entry(target) if (self._output_dir /
+                                                         target).exists() else None
+
+    def _save_profile_info(self, info: WebProfileInfo) -> None:
+        digest = hashlib.sha256(json.dumps(info, sort_keys=True).encode()).hexdigest()
+        entry = self._cache_entry('web_profile_info.json')
+        if entry is not None and entry['digest'] == digest:
+            log.debug('Profile information has not changed.')
+            return
+        dump_json(self._output_dir / 'web_profile_info.json', info)
+        self._log_db.save_http_cache_entry('web_profile_info.json', {
+            'digest': digest,
+            'etag': None,
+            'last_modified': None
+        })
+
+    async def _save_profile_pic(self, url: str) -> None:
+        # The signed URL changes often, so the cache is keyed by file name and the previous
+        # validators are sent with the request.
+        entry = self._cache_entry('profile_pic.jpg')
+        headers: dict[str, str] = {}
+        if entry is not None:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+        r = await self._request('get', url, headers=headers)
+        if r.status_code == HTTPStatus.NOT_MODIFIED:
+            log.debug('Profile picture has not changed.')
+            return
+        if r.content is None:
+            return
+        digest = hashlib.sha256(r.content).hexdigest()
+        if entry is not None and entry['digest'] == digest:
+            log.debug('Profile picture content has not changed.')
+        else:
+            write_bytes(self._output_dir / 'profile_pic.jpg', r.content)
+        self._log_db.save_http_cache_entry(
+            'profile_pic.jpg', {
+                'digest': digest,
+                'etag': r.headers.get('ETag'),
+                'last_modified': r.headers.get('Last-Modified')
+            })
+
     async def _producer(self,
                         image_queue: asyncio.Queue[Edge | None],
                         comments_queue: asyncio.Queue[Edge | None],
@@ -142,95 +480,36 @@ class ProfileScraper(SaveCommentsCheckDisabledMixin, InstagramClient):
                                 params={'username': self._username},
                                 cast_to=WebProfileInfo)
         profile_data = r.get('data')
+        # Highlights, current stories and the timeline are independent, so they are fetched
+        # concurrently and all feed the shared queues.
+        streams: list[Coroutine[Any, Any, None]] = []
+        timeline_edges: list[Edge] = []
+        timeline_page_info: PageInfo | None = None
         if profile_data is not None:
-            dump_json('web_profile_info.json', r)
+            self._save_profile_info(r)
             user_info = profile_data['user']
             if not self.is_saved(user_info['profile_pic_url_hd']):
-                pic_response = await self.session.get(user_info['profile_pic_url_hd'])
-                if pic_response.content is not None:
-                    write_bytes('profile_pic.jpg', pic_response.content)
+                await self._save_profile_pic(user_info['profile_pic_url_hd'])
                 self.save_to_log(user_info['profile_pic_url_hd'])
-            try:
-                tray = (await self.highlights_tray(user_info['id']))['tray']
-            except HTTPError:
-                log.exception('Failed to get highlights data.')
-            else:
-                highlight_ids = [item['id'].split(':')[-1] for item in tray]
-                if highlight_ids:
-                    await self._dispatch_reel(highlight_ids,
-                                              is_highlight=True,
-                                              username=self._username,
-                                              video_queue=video_queue,
-                                              yt_dlp_state=yt_dlp_state)
-            try:
-                await self._dispatch_reel([str(user_info['id'])],
-                                          is_highlight=False,
-                                          username=self._username,
-                                          video_queue=video_queue,
-                                          yt_dlp_state=yt_dlp_state)
-            except HTTPError:
-                log.exception('Failed to get current stories.')
-            await self.dispatch_edges(user_info['edge_owner_to_timeline_media']['edges'],
-                                      image_queue,
-                                      comments_queue,
-                                      video_queue,
-                                      stats=stats,
-                                      yt_dlp_state=yt_dlp_state)
+            streams.extend((self._dispatch_highlights(user_info['id'],
+                                                      video_queue=video_queue,
+                                                      yt_dlp_state=yt_dlp_state),
+                            self._dispatch_current_stories(user_info['id'],
+                                                           video_queue=video_queue,
+                                                           yt_dlp_state=yt_dlp_state)))
+            timeline_edges = list(user_info['edge_owner_to_timeline_media']['edges'])
+            timeline_page_info = user_info['edge_owner_to_timeline_media'].get('page_info')
         else:
             log.warning('Failed to get user info. Profile information and image will not be saved.')
-        d = await self.graphql_query(
-            {
-                'data': {
-                    'count': 12,
-                    'include_reel_media_seen_timestamp': True,
-                    'include_relationship_info': True,
-                    'latest_besties_reel_media': True,
-                    'latest_reel_media': True
-                },
-                'username': self._username,
-                '__relay_internal__pv__PolarisIsLoggedInrelayprovider': True,
-                '__relay_internal__pv__PolarisShareSheetV3relayprovider': True
-            },
-            cast_to=XDTAPIV1FeedUserTimelineGraphQLConnectionContainer)
-        if not d:
-            log.error('First GraphQL query failed.')
-            return
-        await self.dispatch_edges(d['xdt_api__v1__feed__user_timeline_graphql_connection']['edges'],
-                                  image_queue,
-                                  comments_queue,
-                                  video_queue,
-                                  stats=stats,
-                                  yt_dlp_state=yt_dlp_state)
-        page_info = d['xdt_api__v1__feed__user_timeline_graphql_connection']['page_info']
-        while page_info['has_next_page']:
-            d = await self.graphql_query(
-                {
-                    'after': page_info['end_cursor'],
-                    'before': None,
-                    'data': {
-                        'count': 12,
-                        'include_reel_media_seen_timestamp': True,
-                        'include_relationship_info': True,
-                        'latest_besties_reel_media': True,
-                        'latest_reel_media': True
-                    },
-                    'first': 12,
-                    'last': None,
-                    'username': self._username,
-                    '__relay_internal__pv__PolarisIsLoggedInrelayprovider': True,
-                    '__relay_internal__pv__PolarisShareSheetV3relayprovider': True
-                },
-                cast_to=XDTAPIV1FeedUserTimelineGraphQLConnectionContainer)
-            if not d:
-                break
-            page_info = d['xdt_api__v1__feed__user_timeline_graphql_connection']['page_info']
-            await self.dispatch_edges(
-                d['xdt_api__v1__feed__user_timeline_graphql_connection']['edges'],
-                image_queue,
-                comments_queue,
-                video_queue,
-                stats=stats,
-                yt_dlp_state=yt_dlp_state)
+        streams.append(
+            self._dispatch_timeline(timeline_edges,
+                                    image_queue,
+                                    comments_queue,
+                                    video_queue,
+                                    page_info=timeline_page_info,
+                                    stats=stats,
+                                    yt_dlp_state=yt_dlp_state))
+        await gather_or_cancel(*streams)
 
     async def process(self,
                       ydl: AsyncYoutubeDL,
@@ -238,6 +517,7 @@ class ProfileScraper(SaveCommentsCheckDisabledMixin, InstagramClient):
                       fail: bool = False,
                       on_cleanup: OnMessage | None = None,
                       on_message: OnMessage | None = None,
+                      retry_failed: bool = False,
                       stats: Stats | None = None,
                       yt_dlp_idle_event: asyncio.Event | None = None,
                       yt_dlp_state: YTDLPState | None = None) -> None:
@@ -247,15 +527,21 @@ class ProfileScraper(SaveCommentsCheckDisabledMixin, InstagramClient):
         Parameters
         ----------
         ydl : AsyncYoutubeDL
-            Configured yt-dlp wrapper.
+            Configured yt-dlp wrapper. A relative ``paths`` option (or none) is anchored to the
+            output directory, so videos are saved there.
         fail : bool
             Whether yt-dlp failures should abort processing.
         on_cleanup : OnMessage | None
             Optional callback that receives cleanup status updates.
         on_message : OnMessage | None
             Optional callback that receives progress text updates.
+        retry_failed : bool
+            If ``True``, only the work items recorded as failed in the dedup log and the URLs
+            in ``failed.txt`` are processed, and no listing is fetched. ``failed.txt`` is
+            removed once every item succeeds.
         stats : Stats | None
-            Optional live statistics object.
+            Optional live statistics object. Also stored on :py:attr:`stats` so request timings
+            are recorded against it. While processing, worker queue depths are sampled into it.
         yt_dlp_idle_event : asyncio.Event | None
             Optional event that the video worker sets when idle.
         yt_dlp_state : YTDLPState | None
@@ -266,27 +552,40 @@ class ProfileScraper(SaveCommentsCheckDisabledMixin, InstagramClient):
         asyncio.CancelledError
             Re-raised when the producer is cancelled (typically from a termination signal).
         """
-        with chdir(self._output_dir):
+        self.stats = stats
+        ydl = self._yt_dlp_in_output_dir(ydl)
+        with use_write_sync(self.write_sync):
             stop_event = asyncio.Event()
             first_exception: list[BaseException] = []
+            failures = self._log_db.failures() if retry_failed else {}
             image_queue: asyncio.Queue[Edge | None] = asyncio.Queue()
             comments_queue: asyncio.Queue[Edge | None] = asyncio.Queue()
             video_queue: asyncio.Queue[str | None] = asyncio.Queue()
+            sampler: asyncio.Task[None] | None = None
+            if stats is not None:
+                stats.track_queue('image', image_queue)
+                stats.track_queue('comments', comments_queue)
+                stats.track_queue('video', video_queue)
+                sampler = asyncio.create_task(queue_sampler(stats))
             workers = (asyncio.create_task(
                 image_worker(image_queue,
                              first_exception,
                              self.save_media,
                              stop_event,
+                             fatal=(UnexpectedRedirect,),
                              on_cleanup=on_cleanup,
                              on_message=on_message,
+                             retry=self.deferred_retries,
                              stats=stats)),
                        asyncio.create_task(
                            comments_worker(comments_queue,
                                            first_exception,
                                            self.save_comments,
                                            stop_event,
+                                           fatal=(UnexpectedRedirect,),
                                            on_cleanup=on_cleanup,
                                            on_message=on_message,
+                                           retry=self.deferred_retries,
                                            stats=stats)),
                        asyncio.create_task(
                            video_worker(video_queue,
@@ -298,41 +597,65 @@ class ProfileScraper(SaveCommentsCheckDisabledMixin, InstagramClient):
                                         is_saved=self.is_saved,
                                         on_cleanup=on_cleanup,
                                         on_message=on_message,
+                                        retry=self.deferred_retries,
                                         save_to_log=self.save_to_log,
                                         stats=stats,
                                         ydl=ydl,
                                         yt_dlp_state=yt_dlp_state)))
             try:
-                await self._producer(image_queue,
-                                     comments_queue,
-                                     video_queue,
-                                     stats=stats,
-                                     yt_dlp_state=yt_dlp_state)
-            except asyncio.CancelledError:
-                stop_event.set()
-                if on_cleanup is not None:
-                    on_cleanup('Producer cancellation received.')
-                raise
-            except Exception as error:  # ruff:ignore[blind-except]
-                if not stop_event.is_set():
-                    first_exception.append(error)
+                try:
+                    await self._feed(
+                        self.enqueue_failures(failures,
+                                              image_queue,
+                                              comments_queue,
+                                              video_queue,
+                                              failed_urls=read_failed_urls(self._output_dir /
+                                                                           'failed.txt'),
+                                              yt_dlp_state=yt_dlp_state)
+                        if retry_failed else self._producer(image_queue,
+                                                            comments_queue,
+                                                            video_queue,
+                                                            stats=stats,
+                                                            yt_dlp_state=yt_dlp_state),
+                        (image_queue, comments_queue, video_queue), stop_event)
+                except asyncio.CancelledError:
                     stop_event.set()
+                    if on_cleanup is not None:
+                        on_cleanup('Producer cancellation received.')
+                    raise
+                except Exception as error:  # ruff:ignore[blind-except]
+                    if not stop_event.is_set():
+                        first_exception.append(error)
+                        stop_event.set()
+                finally:
+                    if self.deferred_retries is not None:
+                        self.deferred_retries.cancel()
+                    await image_queue.put(None)
+                    if on_cleanup is not None:
+                        on_cleanup('Queued image worker shutdown sentinel.')
+                    await comments_queue.put(None)
+                    if on_cleanup is not None:
+                        on_cleanup('Queued comments worker shutdown sentinel.')
+                    await video_queue.put(None)
+                    if on_cleanup is not None:
+                        on_cleanup('Queued yt-dlp worker shutdown sentinel.')
+                await asyncio.gather(*workers, return_exceptions=True)
             finally:
-                await image_queue.put(None)
-                if on_cleanup is not None:
-                    on_cleanup('Queued image worker shutdown sentinel.')
-                await comments_queue.put(None)
-                if on_cleanup is not None:
-                    on_cleanup('Queued comments worker shutdown sentinel.')
-                await video_queue.put(None)
-                if on_cleanup is not None:
-                    on_cleanup('Queued yt-dlp worker shutdown sentinel.')
-            await asyncio.gather(*workers, return_exceptions=True)
+                # Cancellation propagates out of the block above, so the written files are
+                # flushed and the sampler is stopped here.
+                self.write_sync.sync()
+                if sampler is not None:
+                    sampler.cancel()
+                    await asyncio.gather(sampler, return_exceptions=True)
             if on_cleanup is not None:
                 on_cleanup('All worker tasks cleaned up.')
-            if self.failed_urls:
-                log.warning('Some URIs failed. Check failed.txt.')
-                write_failed_urls('failed.txt', self.failed_urls)
+            self._record_failures(failures,
+                                  completed=not first_exception,
+                                  retry_failed=retry_failed)
+            if not self.failed_urls and not first_exception:
+                # Only mark highlights as archived once every one of their items was saved.
+                for highlight_id, watermark in self._highlight_watermarks.items():
+                    self._log_db.save_highlight_watermark(highlight_id, watermark)
             if first_exception:
                 if isinstance(first_exception[0], WorkerAbort):
                     return
@@ -0,0 +1,111 @@
+"""Request retry policy."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import TYPE_CHECKING
+import random
+
+if TYPE_CHECKING:
+    from collections.abc import Mapping
+
+__all__ = ('RETRY_STATUSES', 'RetryPolicy', 'parse_retry_after')
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+"""
+HTTP status codes that are retried.
+
+:meta hide-value:
+"""
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """
+    Parse a ``Retry-After`` header.
+
+    Parameters
+    ----------
+    value : str | None
+        Header value, either a number of seconds or an HTTP date.
+
+    Returns
+    -------
+    float | None
+        Seconds to wait, or ``None`` if the header is missing or invalid.
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0)
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    How often and how long to wait before a failed request is sent again.
+
+    Requests are retried on connection errors, timeouts and the status codes in
+    :py:data:`RETRY_STATUSES`. The wait before retry ``n`` (starting at 0) is drawn uniformly
+    from ``[0, min(max_delay, base_delay * 2 ** n)]`` ("full jitter"), so concurrent workers do
+    not retry in lock step. A ``Retry-After`` header takes precedence over the computed wait.
+    Besides the per-request limit, each endpoint has a budget of retries for the whole run, so
+    a persistently failing endpoint stops being retried instead of stalling the run.
+    """
+
+    base_delay: float = 1
+    """Base of the exponential backoff in seconds."""
+    budget: int = 100
+    """Retries allowed per endpoint over the whole run, unless overridden in :py:attr:`budgets`."""
+    budgets: Mapping[str, int] = field(default_factory=dict)
+    """Per-endpoint overrides of :py:attr:`budget`."""
+    max_delay: float = 60
+    """Upper bound of a single wait in seconds, including ``Retry-After`` values."""
+    max_retries: int = 5
+    """Retries allowed per request."""
+    def budget_for(self, endpoint: str) -> int:
+        """
+        Get the retry budget of an endpoint.
+
+        Parameters
+        ----------
+        endpoint : str
+            Endpoint key, typically one of the ``ENDPOINT_*`` constants.
+
+        Returns
+        -------
+        int
+            Retries allowed for the endpoint over the whole run.
+        """
+        return self.budgets.get(endpoint, self.budget)
+
+    def delay(self, attempt: int, retry_after: str | None = None) -> float:
+        """
+        Get the wait before a retry.
+
+        Parameters
+        ----------
+        attempt : int
+            Number of retries of the request so far.
+        retry_after : str | None
+            ``Retry-After`` header of the failed response, if any.
+
+        Returns
+        -------
+        float
+            Seconds to wait.
+        """
+        if (seconds := parse_retry_after(retry_after)) is not None:
+            return min(seconds, self.max_delay)
+        ceiling = min(self.max_delay, self.base_delay * 2 ** attempt)
+        return random.uniform(0, ceiling)  # ruff:ignore[suspicious-non-cryptographic-random-usage]
@@ -9,37 +9,56 @@ import logging
 
 from typing_extensions import Self, override
 
-from .client import InstagramClient
-from .compat import chdir
+from .catalogue import Catalogue
+from .client import LogDBClient, UnexpectedRedirect
 from .constants import API_HEADERS, PAGE_FETCH_HEADERS
 from .dedup import LogDB
-from .utils import SaveCommentsCheckDisabledMixin
-from .workers import WorkerAbort, comments_worker, image_worker, video_worker
+from .layout import OutputLayout
+from .store import ContentStore
+from .utils import (
+    SaveCommentsCheckDisabledMixin,
+    WriteSync,
+    read_failed_urls,
+    use_write_sync,
+)
+from .workers import WorkerAbort, comments_worker, image_worker, queue_sampler, video_worker
 
 if TYPE_CHECKING:
     from collections.abc import Iterable
-    from types import TracebackType
 
     from yt_dlp_utils.aio import AsyncYoutubeDL
 
+    from .cache import ResponseCache
+    from .layout import LayoutKind
+    from .retry import RetryPolicy
     from .typing import BrowserName, Edge, OnMessage, Stats, YTDLPState
+    from .utils import FsyncPolicy, JSONFormat
+    from .workers import DeferredRetries
 
 __all__ = ('SavedScraper',)
 
 log = logging.getLogger(__name__)
 
 
-class SavedScraper(SaveCommentsCheckDisabledMixin, InstagramClient):
+class SavedScraper(SaveCommentsCheckDisabledMixin, LogDBClient):
     """Scrape saved posts."""
     def __init__(self,
                  browser: BrowserName = 'chrome',
                  browser_profile: str = 'Default',
                  output_dir: str | Path | None = None,
                  *,
+                 catalogue: str | Path | None = None,
                  child_comments: bool = False,
                  comments: bool = False,
+                 deferred_retries: DeferredRetries | None = None,
                  disable_log: bool = False,
-                 log_file: str | Path | None = None) -> None:
+                 fsync: FsyncPolicy = 'batch',
+                 json_format: JSONFormat = 'pretty',
+                 layout: LayoutKind = 'flat',
+                 log_file: str | Path | None = None,
+                 media_store: str | Path | None = None,
+                 response_cache: ResponseCache | None = None,
+                 retry_policy: RetryPolicy | None = None) -> None:
         """
         Initialise ``SavedScraper``.
 
@@ -51,31 +70,56 @@ class SavedScraper(SaveCommentsCheckDisabledMixin, InstagramClient):
             The browser profile to use.
         output_dir : str | Path | None
             The output directory to save the posts to.
+        catalogue : str | Path | None
+            SQLite database that the metadata of saved posts and comments is recorded in. See
+            :py:class:`~instagram_archiver.catalogue.Catalogue`.
         child_comments : bool
             Whether to recursively fetch child (reply) comments. Implies ``comments=True``.
         comments : bool
             Whether to save comments or not.
+        deferred_retries : DeferredRetries | None
+            Retry stage that failed media, comments and video work is handed to. Items that
+            still fail are recorded in the dedup log. When ``None``, a failed media or comments
+            save aborts processing.
         disable_log : bool
             Whether to disable the SQLite dedup log.
+        fsync : FsyncPolicy
+            When the written files are flushed to stable storage. See
+            :py:class:`~instagram_archiver.utils.WriteSync`.
+        json_format : JSONFormat
+            Format of the per-post JSON files. See
+            :py:func:`~instagram_archiver.utils.encode_json`.
+        layout : LayoutKind
+            Output layout of the per-media files. See
+            :py:class:`~instagram_archiver.layout.OutputLayout`.
         log_file : str | Path | None
             Custom path for the dedup log database. Defaults to ``.log.db`` inside
             ``output_dir``.
+        media_store : str | Path | None
+            Directory of a content-addressed store shared across output directories. Saved
+            images are hard-linked from it instead of written directly.
+        response_cache : ResponseCache | None
+            On-disk cache for media information and comments responses.
+        retry_policy : RetryPolicy | None
+            Policy for retrying failed requests. Defaults to :py:class:`RetryPolicy` with its
+            default settings.
         """
         super().__init__(browser, browser_profile)
         self._output_dir = Path(output_dir or Path.cwd() / '@@saved-posts@@')
         Path(self._output_dir).mkdir(parents=True, exist_ok=True)
         self._log_db = LogDB(Path(log_file or self._output_dir / '.log.db'), disabled=disable_log)
+        self.catalogue = Catalogue(catalogue) if catalogue is not None else None
+        self.json_format = json_format
+        self.layout = OutputLayout(layout, self._output_dir)
+        self.media_store = ContentStore(media_store) if media_store is not None else None
+        self.deferred_retries = deferred_retries
+        self.write_sync = WriteSync(fsync)
+        self.response_cache = response_cache
+        if retry_policy is not None:
+            self.retry_policy = retry_policy
         self.should_save_comments = comments or child_comments
         self.should_save_child_comments = child_comments
 
-    @override
-    def save_to_log(self, url: str) -> None:
-        self._log_db.save(url)
-
-    @override
-    def is_saved(self, url: str) -> bool:
-        return self._log_db.is_saved(url)
-
     @override
     async def __aenter__(self) -> Self:
         """
@@ -89,13 +133,6 @@ class SavedScraper(SaveCommentsCheckDisabledMixin, InstagramClient):
         await super().__aenter__()
         return self
 
-    @override
-    async def __aexit__(self, _: type[BaseException] | None, __: BaseException | None,
-                        ___: TracebackType | None) -> None:
-        """Close the SQLite log and the underlying session."""
-        self._log_db.close()
-        await super().__aexit__(_, __, ___)
-
     async def unsave(self, items: Iterable[str]) -> None:
         """
         Unsave saved posts.
@@ -107,8 +144,9 @@ class SavedScraper(SaveCommentsCheckDisabledMixin, InstagramClient):
         """
         for item in items:
             log.debug('Unsaving %s.', item)
-            await self.session.post(f'https://www.instagram.com/web/save/{item}/unsave/',
-                                    headers=API_HEADERS)
+            await self._request('post',
+                                f'https://www.instagram.com/web/save/{item}/unsave/',
+                                headers=API_HEADERS)
 
     async def _producer(self,
                         image_queue: asyncio.Queue[Edge | None],
@@ -119,7 +157,7 @@ class SavedScraper(SaveCommentsCheckDisabledMixin, InstagramClient):
                         unsave: bool,
                         yt_dlp_state: YTDLPState | None = None) -> None:
         self.add_csrf_token_header()
-        await self.session.get('https://www.instagram.com/', headers=PAGE_FETCH_HEADERS)
+        await self._request('get', 'https://www.instagram.com/', headers=PAGE_FETCH_HEADERS)
         feed = await self.get_json('https://www.instagram.com/api/v1/feed/saved/posts/',
                                    cast_to=dict[str, Any])
         edges: Iterable[Edge] = cast('Iterable[Edge]', ({
@@ -129,6 +167,7 @@ class SavedScraper(SaveCommentsCheckDisabledMixin, InstagramClient):
                 'code': item['media']['code'],
                 'owner': item['media']['owner'],
                 'pk': item['media']['pk'],
+                'taken_at': item['media']['taken_at'],
                 'video_dash_manifest': item['media'].get('video_dash_manifest')
             }
         } for item in feed['items']))
@@ -149,6 +188,7 @@ class SavedScraper(SaveCommentsCheckDisabledMixin, InstagramClient):
                       fail: bool = False,
                       on_cleanup: OnMessage | None = None,
                       on_message: OnMessage | None = None,
+                      retry_failed: bool = False,
                       stats: Stats | None = None,
                       unsave: bool = False,
                       yt_dlp_idle_event: asyncio.Event | None = None,
@@ -159,15 +199,21 @@ class SavedScraper(SaveCommentsCheckDisabledMixin, InstagramClient):
         Parameters
         ----------
         ydl : AsyncYoutubeDL
-            Configured yt-dlp wrapper.
+            Configured yt-dlp wrapper. A relative ``paths`` option (or none) is anchored to the
+            output directory, so videos are saved there.
         fail : bool
             Whether yt-dlp failures should abort processing.
         on_cleanup : OnMessage | None
             Optional callback that receives cleanup status updates.
         on_message : OnMessage | None
             Optional callback that receives progress text updates.
+        retry_failed : bool
+            If ``True``, only the work items recorded as failed in the dedup log and the URLs
+            in ``failed.txt`` are processed, and no listing is fetched. ``failed.txt`` is
+            removed once every item succeeds.
         stats : Stats | None
-            Optional live statistics object.
+            Optional live statistics object. Also stored on :py:attr:`stats` so request timings
+            are recorded against it. While processing, worker queue depths are sampled into it.
         unsave : bool
             If ``True``, unsave each post after dispatching it.
         yt_dlp_idle_event : asyncio.Event | None
@@ -180,27 +226,40 @@ class SavedScraper(SaveCommentsCheckDisabledMixin, InstagramClient):
         asyncio.CancelledError
             Re-raised when the producer is cancelled (typically from a termination signal).
         """
-        with chdir(self._output_dir):
+        self.stats = stats
+        ydl = self._yt_dlp_in_output_dir(ydl)
+        with use_write_sync(self.write_sync):
             stop_event = asyncio.Event()
             first_exception: list[BaseException] = []
+            failures = self._log_db.failures() if retry_failed else {}
             image_queue: asyncio.Queue[Edge | None] = asyncio.Queue()
             comments_queue: asyncio.Queue[Edge | None] = asyncio.Queue()
             video_queue: asyncio.Queue[str | None] = asyncio.Queue()
+            sampler: asyncio.Task[None] | None = None
+            if stats is not None:
+                stats.track_queue('image', image_queue)
+                stats.track_queue('comments', comments_queue)
+                stats.track_queue('video', video_queue)
+                sampler = asyncio.create_task(queue_sampler(stats))
             workers = (asyncio.create_task(
                 image_worker(image_queue,
                              first_exception,
                              self.save_media,
                              stop_event,
+                             fatal=(UnexpectedRedirect,),
                              on_cleanup=on_cleanup,
                              on_message=on_message,
+                             retry=self.deferred_retries,
                              stats=stats)),
                        asyncio.create_task(
                            comments_worker(comments_queue,
                                            first_exception,
                                            self.save_comments,
                                            stop_event,
+                                           fatal=(UnexpectedRedirect,),
                                            on_cleanup=on_cleanup,
                                            on_message=on_message,
+                                           retry=self.deferred_retries,
                                            stats=stats)),
                        asyncio.create_task(
                            video_worker(video_queue,
@@ -212,39 +271,62 @@ class SavedScraper(SaveCommentsCheckDisabledMixin, InstagramClient):
                                         is_saved=self.is_saved,
                                         on_cleanup=on_cleanup,
                                         on_message=on_message,
+                                        retry=self.deferred_retries,
                                         save_to_log=self.save_to_log,
                                         stats=stats,
                                         ydl=ydl,
                                         yt_dlp_state=yt_dlp_state)))
             try:
-                await self._producer(image_queue,
-                                     comments_queue,
-                                     video_queue,
-                                     stats=stats,
-                                     unsave=unsave,
-                                     yt_dlp_state=yt_dlp_state)
-            except asyncio.CancelledError:
-                stop_event.set()
-                if on_cleanup is not None:
-                    on_cleanup('Producer cancellation received.')
-                raise
-            except Exception as error:  # ruff:ignore[blind-except]
-                if not stop_event.is_set():
-                    first_exception.append(error)
+                try:
+                    await self._feed(
+                        self.enqueue_failures(failures,
+                                              image_queue,
+                                              comments_queue,
+                                              video_queue,
+                                              failed_urls=read_failed_urls(self._output_dir /
+                                                                           'failed.txt'),
+                                              yt_dlp_state=yt_dlp_state)
+                        if retry_failed else self._producer(image_queue,
+                                                            comments_queue,
+                                                            video_queue,
+                                                            stats=stats,
+                                                            unsave=unsave,
+                                                            yt_dlp_state=yt_dlp_state),
+                        (image_queue, comments_queue, video_queue), stop_event)
+                except asyncio.CancelledError:
                     stop_event.set()
+                    if on_cleanup is not None:
+                        on_cleanup('Producer cancellation received.')
+                    raise
+                except Exception as error:  # ruff:ignore[blind-except]
+                    if not stop_event.is_set():
+                        first_exception.append(error)
+                        stop_event.set()
+                finally:
+                    if self.deferred_retries is not None:
+                        self.deferred_retries.cancel()
+                    await image_queue.put(None)
+                    if on_cleanup is not None:
+                        on_cleanup('Queued image worker shutdown sentinel.')
+                    await comments_queue.put(None)
+                    if on_cleanup is not None:
+                        on_cleanup('Queued comments worker shutdown sentinel.')
+                    await video_queue.put(None)
+                    if on_cleanup is not None:
+                        on_cleanup('Queued yt-dlp worker shutdown sentinel.')
+                await asyncio.gather(*workers, return_exceptions=True)
             finally:
-                await image_queue.put(None)
-                if on_cleanup is not None:
-                    on_cleanup('Queued image worker shutdown sentinel.')
-                await comments_queue.put(None)
-                if on_cleanup is not None:
-                    on_cleanup('Queued comments worker shutdown sentinel.')
-                await video_queue.put(None)
-                if on_cleanup is not None:
-                    on_cleanup('Queued yt-dlp worker shutdown sentinel.')
-            await asyncio.gather(*workers, return_exceptions=True)
+                # Cancellation propagates out of the block above, so the written files are
+                # flushed and the sampler is stopped here.
+                self.write_sync.sync()
+                if sampler is not None:
+                    sampler.cancel()
+                    await asyncio.gather(sampler, return_exceptions=True)
             if on_cleanup is not None:
                 on_cleanup('All worker tasks cleaned up.')
+            self._record_failures(failures,
+                                  completed=not first_exception,
+                                  retry_failed=retry_failed)
             if first_exception:
                 if isinstance(first_exception[0], WorkerAbort):
                     return
@@ -0,0 +1,94 @@
+"""Content-addressed media store shared across output directories."""
+
+from __future__ import annotations
+
+from pathlib import Path
+import hashlib
+import logging
+
+from .utils import atomic_write
+
+__all__ = ('ContentStore',)
+
+log = logging.getLogger(__name__)
+
+
+class ContentStore:
+    """
+    Store media once per unique content and link it into output directories.
+
+    Blobs are named after the SHA-256 digest of their content and fanned out into two levels of
+    sub-directories (``ab/cd/abcd….jpg``). The archived file name (for example ``{id}.jpg``) is a
+    hard link to the blob, so the same image re-posted across archived profiles occupies disk
+    space once. When a hard link cannot be created (for example when the store is on another
+    file system) the blob is copied instead.
+
+    Because hard links share an inode, they also share the modification time, so the archiver does
+    not set the post time on linked files. Copies made by the fallback get it as usual.
+    """
+    def __init__(self, root: str | Path) -> None:
+        """
+        Initialise the store.
+
+        Parameters
+        ----------
+        root : str | Path
+            Store directory. It is resolved immediately, so later changes of the working
+            directory do not affect it.
+        """
+        self.root = Path(root).resolve()
+        """Store directory."""
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def blob_path(self, digest: str, suffix: str = '') -> Path:
+        """
+        Get the location of the blob for a digest.
+
+        Parameters
+        ----------
+        digest : str
+            Hexadecimal SHA-256 digest.
+        suffix : str
+            File name suffix, including the leading dot.
+
+        Returns
+        -------
+        Path
+            Blob location inside :py:attr:`root`.
+        """
+        return self.root / digest[:2] / digest[2:4] / f'{digest}{suffix}'
+
+    def put(self, target: str | Path, content: bytes) -> bool:
+        """
+        Store ``content`` and make ``target`` refer to it.
+
+        Parameters
+        ----------
+        target : str | Path
+            Path the content is archived under. An existing file is replaced.
+        content : bytes
+            File content.
+
+        Returns
+        -------
+        bool
+            ``True`` if the content was new to the store, ``False`` if an existing blob was
+            reused.
+        """
+        target = Path(target)
+        blob = self.blob_path(hashlib.sha256(content).hexdigest(), target.suffix)
+        is_new = not blob.is_file()
+        if is_new:
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write(blob, content)
+        else:
+            log.debug('Reusing stored blob %s for %s.', blob.name, target)
+        if target.exists() and target.samefile(blob):
+            return is_new
+        target.unlink(missing_ok=True)
+        try:
+            target.hardlink_to(blob)
+        except OSError:
+            log.debug('Cannot hard link %s, copying instead.', blob)
+            atomic_write(target, content)
+        return is_new
@@ -4,18 +4,32 @@
 from __future__ import annotations
 
 from collections.abc import Callable
+from contextlib import contextmanager
 from dataclasses import dataclass
+from time import monotonic, perf_counter, time
 from typing import TYPE_CHECKING, Any, Literal, TypeAlias, TypedDict
 
 from archiver_stats import Category, Stats as _BaseStats, StatusLine
 from typing_extensions import NotRequired
 
-if TYPE_CHECKING:
-    from collections.abc import Mapping, Sequence
+from .metrics import (
+    GaugeSample,
+    LatencyHistogram,
+    WorkerUtilisation,
+    format_bytes,
+    format_seconds,
+)
 
-__all__ = ('COMMENTS_PROCESSED', 'IMAGES_PROCESSED', 'POSTS_HANDLED', 'VIDEOS_PROCESSED',
-           'YT_DLP_STATUS', 'BrowserName', 'CarouselMedia', 'ChildCommentsPage', 'Comments', 'Edge',
-           'HasID', 'HighlightsTray', 'MediaInfo', 'MediaInfoItem',
+if TYPE_CHECKING:
+    from collections.abc import Generator, Mapping, Sequence
+    import asyncio
+
+__all__ = ('COMMENTS_PROCESSED', 'ENDPOINT_CDN_GET', 'ENDPOINT_CDN_HEAD', 'ENDPOINT_CHILD_COMMENTS',
+           'ENDPOINT_COMMENTS', 'ENDPOINT_GRAPHQL', 'ENDPOINT_MEDIA_INFO', 'ENDPOINT_YT_DLP',
+           'IMAGES_PROCESSED', 'LATENCY_STATUS', 'POSTS_HANDLED', 'QUEUES_STATUS',
+           'TRANSFER_STATUS', 'VIDEOS_PROCESSED', 'YT_DLP_STATUS', 'BrowserName', 'CarouselMedia',
+           'ChildCommentsPage', 'Comments', 'Edge', 'FailedItem', 'FailureKind', 'HTTPCacheEntry',
+           'HasID', 'HighlightsTray', 'ManifestEntry', 'MediaInfo', 'MediaInfoItem',
            'MediaInfoItemImageVersions2Candidate', 'OnMessage', 'Stats', 'StoryReel',
            'StoryReelEdge', 'StoryReelItem', 'UserInfo', 'WebProfileInfo', 'WebProfileInfoData',
            'XDTAPIV1FeedUserTimelineGraphQLConnection',
@@ -49,6 +63,56 @@ VIDEOS_PROCESSED = 'videos_processed'
 YT_DLP_STATUS = 'yt_dlp_status'
 """Status-line key for the current yt-dlp URL.
 
+:meta hide-value:
+"""
+LATENCY_STATUS = 'latency_status'
+"""Status-line key for the endpoint with the slowest p95 latency.
+
+:meta hide-value:
+"""
+QUEUES_STATUS = 'queues_status'
+"""Status-line key for the most recently sampled worker queue depths.
+
+:meta hide-value:
+"""
+TRANSFER_STATUS = 'transfer_status'
+"""Status-line key for the total number of requests and bytes transferred.
+
+:meta hide-value:
+"""
+ENDPOINT_CDN_GET = 'cdn_get'
+"""Latency histogram key for image downloads from the CDN.
+
+:meta hide-value:
+"""
+ENDPOINT_CDN_HEAD = 'cdn_head'
+"""Latency histogram key for ``HEAD`` requests against the CDN.
+
+:meta hide-value:
+"""
+ENDPOINT_CHILD_COMMENTS = 'child_comments'
+"""Latency histogram key for the child (reply) comments API.
+
+:meta hide-value:
+"""
+ENDPOINT_COMMENTS = 'comments'
+"""Latency histogram key for the comments API.
+
+:meta hide-value:
+"""
+ENDPOINT_GRAPHQL = 'graphql'
+"""Latency histogram key for GraphQL queries.
+
+:meta hide-value:
+"""
+ENDPOINT_MEDIA_INFO = 'media_info'
+"""Latency histogram key for the media info API.
+
+:meta hide-value:
+"""
+ENDPOINT_YT_DLP = 'yt_dlp'
+"""Latency histogram key for yt-dlp downloads (one observation per URL).
+
 :meta hide-value:
 """
 
@@ -56,12 +120,207 @@ YT_DLP_STATUS = 'yt_dlp_status'
 class Stats(_BaseStats):
     """Live pipeline statistics shown in the progress spinner."""
     def __init__(self) -> None:
-        super().__init__((Category(
-            POSTS_HANDLED, 'Total posts fetched:'), Category(
-                IMAGES_PROCESSED, 'Image posts:'), Category(VIDEOS_PROCESSED, 'Videos handled:'),
-                          Category(COMMENTS_PROCESSED, 'Comment threads:')),
-                         status_lines=(StatusLine(YT_DLP_STATUS, 'yt-dlp processing:',
-                                                  POSTS_HANDLED),))
+        super().__init__(
+            (Category(POSTS_HANDLED,
+                      'Total posts fetched:'), Category(IMAGES_PROCESSED, 'Image posts:'),
+             Category(VIDEOS_PROCESSED,
+                      'Videos handled:'), Category(COMMENTS_PROCESSED, 'Comment threads:')),
+            status_lines=(StatusLine(YT_DLP_STATUS, 'yt-dlp processing:', POSTS_HANDLED),
+                          StatusLine(QUEUES_STATUS, 'Queue depths:', COMMENTS_PROCESSED),
+                          StatusLine(TRANSFER_STATUS, 'Transferred:', COMMENTS_PROCESSED),
+                          StatusLine(LATENCY_STATUS, 'Slowest endpoint:', COMMENTS_PROCESSED)))
+        self.errors = 0
+        """Number of failed requests across all endpoints."""
+        self.in_flight = 0
+        """Number of requests currently awaiting a response."""
+        self.latencies: dict[str, LatencyHistogram] = {}
+        """Latency histograms keyed by endpoint (one of the ``ENDPOINT_*`` keys)."""
+        self.queue_depths: dict[str, GaugeSample] = {}
+        """Queue depth samples keyed by queue name, filled by :py:meth:`sample_queues`."""
+        self.queues: dict[str, asyncio.Queue[Any]] = {}
+        """Worker queues whose depth is reported in :py:meth:`snapshot`."""
+        self.retries = 0
+        """Number of retried requests across all endpoints."""
+        self.spans: dict[str, LatencyHistogram] | None = None
+        """Timing spans keyed by name, or ``None`` until :py:meth:`enable_spans` is called."""
+        self.workers: dict[str, WorkerUtilisation] = {}
+        """Busy and idle time keyed by worker name."""
+        self._started = monotonic()
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds since this object was created."""
+        return monotonic() - self._started
+
+    @property
+    def bytes_transferred(self) -> int:
+        """Total response body size across all endpoints."""
+        return sum(histogram.bytes_transferred for histogram in self.latencies.values())
+
+    def observe_request(self,
+                        endpoint: str,
+                        seconds: float,
+                        nbytes: int = 0,
+                        *,
+                        failed: bool = False) -> None:
+        """
+        Record a finished request and refresh the latency and transfer status lines.
+
+        Parameters
+        ----------
+        endpoint : str
+            Endpoint key, typically one of the ``ENDPOINT_*`` constants.
+        seconds : float
+            Wall-clock duration of the request.
+        nbytes : int
+            Size of the response body.
+        failed : bool
+            Whether the request failed. Failed requests are also counted in :py:attr:`errors`.
+        """
+        self.errors += failed
+        self.latencies.setdefault(endpoint, LatencyHistogram()).observe(seconds,
+                                                                        nbytes,
+                                                                        failed=failed)
+        request_count = sum(histogram.count for histogram in self.latencies.values())
+        self[TRANSFER_STATUS] = (f'{format_bytes(self.bytes_transferred)} in {request_count} '
+                                 'requests')
+        slowest = max(self.latencies.items(), key=lambda item: item[1].quantile(0.95))
+        self[LATENCY_STATUS] = f'{slowest[0]} (p95 {format_seconds(slowest[1].quantile(0.95))})'
+
+    def enable_spans(self) -> None:
+        """Start recording :py:meth:`span` timings. Spans are not recorded by default."""
+        if self.spans is None:
+            self.spans = {}
+
+    @contextmanager
+    def span(self, name: str) -> Generator[None, None, None]:
+        """
+        Time the enclosed block under ``name`` when spans are enabled.
+
+        Parameters
+        ----------
+        name : str
+            Span name, typically the name of the wrapped method.
+
+        Yields
+        ------
+        None
+            Control to the timed block.
+        """
+        if self.spans is None:
+            yield
+            return
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            self.spans.setdefault(name, LatencyHistogram()).observe(perf_counter() - started)
+
+    def track_queue(self, name: str, queue: asyncio.Queue[Any]) -> None:
+        """
+        Register a worker queue so its depth is included in :py:meth:`snapshot`.
+
+        Parameters
+        ----------
+        name : str
+            Queue name used as the snapshot key.
+        queue : asyncio.Queue[Any]
+            Queue to report.
+        """
+        self.queues[name] = queue
+
+    def sample_queues(self) -> None:
+        """Sample the depth of every tracked queue and refresh the queue status line."""
+        for name, queue in self.queues.items():
+            self.queue_depths.setdefault(name, GaugeSample()).observe(queue.qsize())
+        self[QUEUES_STATUS] = ', '.join(f'{name} {sample.last}'
+                                        for name, sample in self.queue_depths.items()) or None
+
+    def worker(self, name: str) -> WorkerUtilisation:
+        """
+        Get the utilisation record for a worker, creating it on first use.
+
+        Parameters
+        ----------
+        name : str
+            Worker name.
+
+        Returns
+        -------
+        WorkerUtilisation
+            Mutable utilisation record.
+        """
+        return self.workers.setdefault(name, WorkerUtilisation())
+
+    def snapshot(self) -> dict[str, Any]:
+        """
+        Build a machine-readable snapshot of the current statistics.
+
+        Returns
+        -------
+        dict[str, Any]
+            Counters, queue depths, in-flight requests, throughput, error and retry counts and
+            per-endpoint latency histograms.
+        """
+        elapsed = self.elapsed
+        counters = {category.key: value for category, value in self.category_items()}
+        return {
+            'counters': counters,
+            'elapsed': elapsed,
+            'errors': self.errors,
+            'in_flight': self.in_flight,
+            'latency': {
+                endpoint: histogram.as_dict()
+                for endpoint, histogram in sorted(self.latencies.items())
+            },
+            'queue_depths': {
+                name: sample.as_dict()
+                for name, sample in self.queue_depths.items()
+            },
+            'queues': {
+                name: queue.qsize()
+                for name, queue in self.queues.items()
+            },
+            'retries': self.retries,
+            'spans': {
+                name: histogram.as_dict()
+                for name, histogram in sorted((self.spans or {}).items())
+            },
+            'throughput': {
+                'bytes': self.bytes_transferred / elapsed if elapsed else 0.0,
+                **{
+                    key: value / elapsed if elapsed else 0.0
+                    for key, value in counters.items()
+                }
+            },
+            'timestamp': time(),
+            'workers': {
+                name: utilisation.as_dict()
+                for name, utilisation in self.workers.items()
+            }
+        }
+
+    def summary_lines(self) -> list[str]:
+        """
+        Build the summary printed when a run finishes.
+
+        Returns
+        -------
+        list[str]
+            One line per endpoint in alphabetical order, followed by one line per sampled
+            queue, per worker and per recorded span. Empty when nothing was recorded.
+        """
+        return [
+            *(f'{endpoint}: {histogram.render()}'
+              for endpoint, histogram in sorted(self.latencies.items())),
+            *(f'{name} queue depth: {sample.render()}'
+              for name, sample in self.queue_depths.items()),
+            *(f'{name} worker: {utilisation.render()}'
+              for name, utilisation in self.workers.items()),
+            *(f'{name} span: {histogram.count} calls, {format_seconds(histogram.total)} total, '
+              f'p95 {format_seconds(histogram.quantile(0.95))}'
+              for name, histogram in sorted((self.spans or {}).items()))
+        ]
 
 
 @dataclass
@@ -103,9 +362,47 @@ class MediaInfoItemImageVersions2Candidate(TypedDict):
     """Width of the image."""
 
 
+class FailedItem(TypedDict):
+    """Work item that still failed after every deferred retry."""
+
+    error: str
+    """Message of the last error."""
+    kind: FailureKind
+    """Worker the item belongs to."""
+    payload: str
+    """Video URL, or the JSON-encoded edge for the ``comments`` and ``media`` kinds."""
+
+
+class HTTPCacheEntry(TypedDict):
+    """Cached validators and content digest of a downloaded file."""
+
+    digest: str
+    """SHA-256 digest of the content."""
+    etag: str | None
+    """``ETag`` response header, if any."""
+    last_modified: str | None
+    """``Last-Modified`` response header, if any."""
+
+
+class ManifestEntry(TypedDict):
+    """Record of an archived file in the manifest."""
+
+    digest: str | None
+    """SHA-256 digest of the content, or ``None`` for files found on disk but not written by a
+    run that kept the manifest."""
+    media_id: str | None
+    """Media ID the file belongs to, if any."""
+    size: int
+    """Size of the file in bytes."""
+
+
 class HighlightItem(TypedDict):
     id: str
     """Identifier."""
+    latest_reel_media: NotRequired[int]
+    """Timestamp of the newest item in the highlight."""
+    media_count: NotRequired[int]
+    """Number of items in the highlight."""
 
 
 class HighlightsTray(TypedDict):
@@ -218,14 +515,20 @@ class Owner(TypedDict):
 class XDTMediaDict(TypedDict):
     __typename: Literal['XDTMediaDict']
     """Type name."""
+    carousel_media: NotRequired[Sequence[CarouselMedia] | None]
+    """Carousel media items, if included in the response."""
     code: str
     """Short code."""
     id: str
     """Media ID."""
+    image_versions2: NotRequired[MediaInfoItemImageVersions2]
+    """Image versions, if included in the response."""
     owner: Owner
     """Owner information."""
     pk: str
     """Primary key. Also carousel ID."""
+    taken_at: NotRequired[int]
+    """Timestamp when the media was taken, if included in the response."""
     video_dash_manifest: NotRequired[str | None]
     """Video dash manifest URL, if available."""
 
@@ -235,6 +538,11 @@ class Edge(TypedDict):
 
     node: XDTMediaDict
     """Node at this edge."""
+    force_media_info: NotRequired[bool]
+    """
+    Request the media information even if the node carries the image data. Set on items queued
+    by :py:func:`~instagram_archiver.verify.verify_archive` for a damaged media information file.
+    """
 
 
 class XDTAPIV1FeedUserTimelineGraphQLConnection(TypedDict):
@@ -323,3 +631,5 @@ class WebProfileInfo(TypedDict):
 BrowserName = Literal['brave', 'chrome', 'chromium', 'edge', 'firefox', 'opera', 'safari',
                       'vivaldi']
 """Possible browser choices to get cookies from."""
+FailureKind = Literal['comments', 'media', 'video']
+"""Worker a failed item belongs to."""
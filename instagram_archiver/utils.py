@@ -2,24 +2,225 @@
 
 from __future__ import annotations
 
+from contextlib import contextmanager, suppress
+from contextvars import ContextVar
+from functools import cache
 from pathlib import Path
-from typing import TYPE_CHECKING, Any, Protocol, TypeVar
+from typing import TYPE_CHECKING, Any, Literal, Protocol, TypeAlias, TypeVar
+import gzip
 import json
+import logging
 import mimetypes
+import os
+import tempfile
+import zlib
 
 from typing_extensions import override
-import click
+
+from .compat import zstd_compress, zstd_decompress
 
 if TYPE_CHECKING:
-    from collections.abc import Awaitable, Iterable
+    from collections.abc import Awaitable, Generator, Iterable
 
     from .typing import Edge
 
-__all__ = ('JSONFormattedString', 'UnknownMimetypeError', 'dump_json', 'get_extension',
-           'json_dumps_formatted', 'write_bytes', 'write_failed_urls', 'write_if_new')
+__all__ = ('FSYNC_POLICIES', 'JSON_FORMATS', 'JSON_SUFFIXES', 'FsyncPolicy', 'JSONFormat',
+           'JSONFormattedString', 'UnknownMimetypeError', 'WriteSync', 'atomic_write',
+           'decode_json', 'dump_json', 'encode_json', 'get_extension', 'json_dumps_formatted',
+           'json_suffix_of', 'json_variants', 'read_failed_urls', 'use_write_sync', 'write_bytes',
+           'write_failed_urls', 'write_if_new', 'write_sync')
 
 T = TypeVar('T')
 
+FSYNC_POLICIES = ('always', 'batch', 'never')
+"""
+Supported policies for flushing written files to stable storage.
+
+:meta hide-value:
+"""
+FsyncPolicy: TypeAlias = Literal['always', 'batch', 'never']
+"""When written files are flushed to stable storage. See :py:class:`WriteSync`."""
+JSON_FORMATS = ('compact', 'gzip', 'pretty', 'zstd')
+"""
+Supported formats of the per-post JSON files. See :py:func:`encode_json`.
+
+:meta hide-value:
+"""
+JSONFormat: TypeAlias = Literal['compact', 'gzip', 'pretty', 'zstd']
+"""Format of the per-post JSON files."""
+JSON_SUFFIXES: dict[JSONFormat, str] = {
+    'compact': '.json',
+    'gzip': '.json.gz',
+    'pretty': '.json',
+    'zstd': '.json.zst'
+}
+"""
+File name suffix of each JSON format.
+
+:meta hide-value:
+"""
+
+log = logging.getLogger(__name__)
+
+
+def _fsync_path(path: Path) -> None:
+    # Opening a directory fails on Windows, and some file systems refuse to fsync read-only
+    # descriptors. Durability is best effort there.
+    with suppress(OSError):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class WriteSync:
+    """
+    Flush files written by :py:func:`atomic_write` to stable storage according to a policy.
+
+    Every write goes to a temporary file that is renamed over the target, so a crashed process
+    never leaves a truncated file behind. Surviving a power loss additionally needs the data
+    and the directory entry to be flushed, which is what the policy controls:
+
+    ``always``
+        The file is flushed before the rename and its directory after it. Slowest, but every
+        file is durable once the write returns.
+    ``batch``
+        Written files are remembered and flushed together with their directories once
+        :py:attr:`batch_size` files are pending and when :py:meth:`sync` is called at the end
+        of a run. On a power loss, the most recently written files may be lost, but none is
+        left truncated under its final name on file systems that order the rename after the data.
+    ``never``
+        Flushing is left to the operating system.
+    """
+    def __init__(self, policy: FsyncPolicy = 'batch', *, batch_size: int = 100) -> None:
+        """
+        Initialise the policy.
+
+        Parameters
+        ----------
+        policy : FsyncPolicy
+            When written files are flushed.
+        batch_size : int
+            Number of pending files that triggers a flush with the ``batch`` policy.
+        """
+        self.policy = policy
+        """When written files are flushed."""
+        self.batch_size = batch_size
+        """Number of pending files that triggers a flush with the ``batch`` policy."""
+        self._pending: dict[Path, None] = {}
+
+    def replaced(self, target: Path) -> None:
+        """
+        Record that ``target`` was just replaced by :py:func:`atomic_write`.
+
+        Parameters
+        ----------
+        target : Path
+            The file that was written.
+        """
+        if self.policy == 'always':
+            _fsync_path(target.parent)
+        elif self.policy == 'batch':
+            self._pending[target] = None
+            if len(self._pending) >= self.batch_size:
+                self.sync()
+
+    def sync(self) -> None:
+        """Flush every pending file and its directory."""
+        if not self._pending:
+            return
+        log.debug('Flushing %d written files.', len(self._pending))
+        directories = dict.fromkeys(path.parent for path in self._pending)
+        for path in self._pending:
+            _fsync_path(path)
+        for directory in directories:
+            _fsync_path(directory)
+        self._pending.clear()
+
+
+write_sync = WriteSync()
+"""
+Policy used by :py:func:`atomic_write` outside :py:func:`use_write_sync`.
+
+Set its :py:attr:`~WriteSync.policy` to change it.
+"""
+_active_write_sync: ContextVar[WriteSync | None] = ContextVar('active_write_sync', default=None)
+
+
+@contextmanager
+def use_write_sync(sync: WriteSync) -> Generator[WriteSync, None, None]:
+    """
+    Make :py:func:`atomic_write` use ``sync`` instead of :py:data:`write_sync`.
+
+    The choice is kept in a context variable, so it applies to the current task and the tasks
+    created from it. Scrapers running concurrently in one event loop each keep their own policy
+    and pending files.
+
+    Parameters
+    ----------
+    sync : WriteSync
+        Policy to use.
+
+    Yields
+    ------
+    WriteSync
+        ``sync``.
+    """
+    token = _active_write_sync.set(sync)
+    try:
+        yield sync
+    finally:
+        _active_write_sync.reset(token)
+
+
+@cache
+def _file_mode() -> int:
+    # The umask can only be read by setting it, so read it once instead of on every write,
+    # which would briefly change it for other threads.
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+def _write_fd(fd: int, content: bytes, *, flush: bool) -> None:
+    with os.fdopen(fd, 'wb') as f:
+        f.write(content)
+        if flush:
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def atomic_write(target: Path | str, content: bytes) -> None:
+    """
+    Replace ``target`` with ``content`` without ever exposing a partially written file.
+
+    The content is written to a temporary file in the same directory, which is then renamed
+    over ``target``. The file gets the permissions allowed by the process umask, as with
+    :py:func:`open`. The policy set with :py:func:`use_write_sync`, or :py:data:`write_sync`
+    outside it, decides when the data is flushed to disk.
+
+    Parameters
+    ----------
+    target : Path | str
+        File path to write to.
+    content : bytes
+        File content.
+    """
+    target = Path(target)
+    sync = _active_write_sync.get() or write_sync
+    fd, temp_name = tempfile.mkstemp(dir=target.parent, prefix=f'.{target.name}.', suffix='.tmp')
+    try:
+        _write_fd(fd, content, flush=sync.policy == 'always')
+        # mkstemp creates the file readable only by its owner. Give it the permissions a newly
+        # created file would have.
+        Path(temp_name).chmod(_file_mode())
+        Path(temp_name).replace(target)
+    except BaseException:
+        Path(temp_name).unlink(missing_ok=True)
+        raise
+    sync.replaced(target)
+
 
 class JSONFormattedString:
     """Contains a formatted version of the JSON str and the original value."""
@@ -51,11 +252,127 @@ def json_dumps_formatted(obj: Any) -> JSONFormattedString:
     return JSONFormattedString(json.dumps(obj, sort_keys=True, indent=2), obj)
 
 
+def encode_json(obj: Any, json_format: JSONFormat = 'pretty') -> bytes:
+    """
+    Serialise ``obj`` for a JSON file of the given format.
+
+    ``pretty`` is sorted JSON indented by two spaces, as written by :py:func:`dump_json`.
+    ``compact`` is sorted JSON without any whitespace, which is considerably smaller for large
+    comment threads. ``gzip`` and ``zstd`` compress the compact form. The gzip header carries no
+    timestamp, so the same object always gives the same bytes.
+
+    Parameters
+    ----------
+    obj : Any
+        Object to serialise.
+    json_format : JSONFormat
+        Output format.
+
+    Returns
+    -------
+    bytes
+        File content.
+    """
+    if json_format == 'pretty':
+        return json.dumps(obj, sort_keys=True, indent=2).encode()
+    content = json.dumps(obj, sort_keys=True, separators=(',', ':')).encode()
+    if json_format == 'gzip':
+        return gzip.compress(content, compresslevel=6, mtime=0)
+    if json_format == 'zstd':
+        return zstd_compress(content)
+    return content
+
+
+def json_suffix_of(name: str) -> str | None:
+    """
+    Get the JSON suffix of a file name.
+
+    Parameters
+    ----------
+    name : str
+        File name.
+
+    Returns
+    -------
+    str | None
+        One of the values of :py:data:`JSON_SUFFIXES`, or ``None`` if ``name`` is not a JSON
+        file name.
+    """
+    return next((suffix for suffix in ('.json.gz', '.json.zst', '.json') if name.endswith(suffix)),
+                None)
+
+
+def json_variants(path: Path) -> tuple[Path, ...]:
+    """
+    Get the locations the same JSON file has in every format.
+
+    Parameters
+    ----------
+    path : Path
+        Location of a JSON file in any format.
+
+    Returns
+    -------
+    tuple[Path, ...]
+        ``path`` followed by its locations with the other suffixes, or only ``path`` if it is
+        not a JSON file name.
+    """
+    if (suffix := json_suffix_of(path.name)) is None:
+        return (path,)
+    stem = path.name.removesuffix(suffix)
+    return (path, *(path.with_name(f'{stem}{other}')
+                    for other in dict.fromkeys(JSON_SUFFIXES.values()) if other != suffix))
+
+
+def decode_json(content: bytes, name: str) -> Any:
+    """
+    Parse the content of a JSON file written in any of the :py:data:`JSON_FORMATS`.
+
+    Parameters
+    ----------
+    content : bytes
+        File content.
+    name : str
+        File name, whose suffix tells the compression.
+
+    Returns
+    -------
+    Any
+        Parsed value.
+
+    Raises
+    ------
+    ValueError
+        If the content cannot be decompressed or is not valid JSON.
+    """
+    if name.endswith('.gz'):
+        try:
+            content = gzip.decompress(content)
+        except (EOFError, OSError, zlib.error) as e:
+            raise ValueError(str(e)) from e
+    elif name.endswith('.zst'):
+        content = zstd_decompress(content)
+    return json.loads(content)
+
+
 def write_if_new(target: Path | str, content: str | bytes, mode: str = 'w') -> None:
-    """Write a file only if it will be a new file."""
+    """
+    Write a file only if it will be a new file.
+
+    The file is written with :py:func:`atomic_write`, so an existing file is always complete.
+
+    Parameters
+    ----------
+    target : Path | str
+        File path to write to.
+    content : str | bytes
+        File content. Strings are encoded as UTF-8.
+    mode : str
+        Unused. Kept for backwards compatibility.
+    """
+    del mode
     if not Path(target).is_file():
-        with click.open_file(str(target), mode) as f:
-            f.write(content)
+        atomic_write(target, content.encode() if isinstance(content, str) else content)
 
 
 def write_bytes(target: Path | str, content: bytes) -> None:
@@ -69,7 +386,7 @@ def write_bytes(target: Path | str, content: bytes) -> None:
     content : bytes
         Bytes to write.
     """
-    Path(target).write_bytes(content)
+    atomic_write(target, content)
 
 
 def dump_json(target: Path | str, obj: Any, *, mode: str = 'w') -> None:
@@ -83,10 +400,10 @@ def dump_json(target: Path | str, obj: Any, *, mode: str = 'w') -> None:
     obj : Any
         Object to serialise.
     mode : str
-        File open mode (typically ``'w'`` or ``'w+'``).
+        Unused. Kept for backwards compatibility; the file is always replaced.
     """
-    with Path(target).open(mode, encoding='utf-8') as f:
-        json.dump(obj, f, sort_keys=True, indent=2)
+    del mode
+    atomic_write(target, json.dumps(obj, sort_keys=True, indent=2).encode())
 
 
 def write_failed_urls(target: Path | str, urls: Iterable[str]) -> None:
@@ -100,8 +417,28 @@ def write_failed_urls(target: Path | str, urls: Iterable[str]) -> None:
     urls : Iterable[str]
         URLs to write, one per line.
     """
-    with Path(target).open('w', encoding='utf-8') as f:
-        f.writelines(f'{url}\n' for url in urls)
+    atomic_write(target, ''.join(f'{url}\n' for url in urls).encode())
+
+
+def read_failed_urls(target: Path | str) -> list[str]:
+    """
+    Read a list of URLs written by :py:func:`write_failed_urls`.
+
+    Parameters
+    ----------
+    target : Path | str
+        File path to read from.
+
+    Returns
+    -------
+    list[str]
+        The URLs, without blank lines. Empty if ``target`` does not exist.
+    """
+    try:
+        with Path(target).open(encoding='utf-8') as f:
+            return [url for line in f if (url := line.strip())]
+    except FileNotFoundError:
+        return []
 
 
 class UnknownMimetypeError(Exception):
@@ -0,0 +1,330 @@
+"""Integrity check of an existing archive."""
+
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, cast
+import hashlib
+import json
+import logging
+
+from .compat import UnsupportedCompressionError
+from .dedup import LogDB
+from .layout import media_id_of
+from .utils import decode_json, json_suffix_of
+from .workers import failure_key
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Mapping
+
+    from .typing import Edge, FailedItem, FailureKind, ManifestEntry
+
+__all__ = ('QUARANTINE_DIR', 'FileCheck', 'VerifyReport', 'inspect_file', 'verify_archive')
+
+log = logging.getLogger(__name__)
+
+QUARANTINE_DIR = '.quarantine'
+"""
+Directory inside the archive that damaged files are moved to, under their path relative to the
+archive.
+"""
+_CHUNK_SIZE = 1024 * 1024
+_FILE_ENDINGS = {'.jpeg': b'\xff\xd9', '.jpg': b'\xff\xd9', '.png': b'IEND\xae\x42\x60\x82'}
+
+
+@dataclass(frozen=True)
+class FileCheck:
+    """Result of reading an archived file."""
+
+    digest: str
+    """SHA-256 digest of the content."""
+    size: int
+    """Size of the file in bytes."""
+    complete: bool | None
+    """
+    Whether the content looks complete: JSON files must decompress and parse, and JPEG and PNG
+    images must end with their end-of-image marker. Other files are always considered complete.
+    ``None`` if the JSON file is compressed in a format this Python cannot read (Zstandard without
+    :py:data:`~instagram_archiver.compat.HAS_ZSTD`).
+    """
+    image_urls: tuple[tuple[str, str], ...] = ()
+    """
+    For media JSON files, the ID and URL of the image the archiver saves for each item, in the
+    same way :py:meth:`~instagram_archiver.client.InstagramClient.save_image_versions2` picks
+    it.
+    """
+
+
+@dataclass
+class VerifyReport:
+    """Outcome of :py:func:`verify_archive`."""
+
+    checked: int = 0
+    """Number of files checked."""
+    problems: dict[str, str] = field(default_factory=dict)
+    """Description of each missing or damaged file, keyed by path relative to the archive."""
+    requeued: list[str] = field(default_factory=list)
+    """Failure keys of the work items queued to be archived again."""
+    quarantined: list[str] = field(default_factory=list)
+    """Damaged files moved to :py:data:`QUARANTINE_DIR`."""
+    unchecked: list[str] = field(default_factory=list)
+    """
+    Files without a digest in the manifest whose content cannot be read on this Python. They are
+    neither added to the manifest nor queued.
+    """
+
+
+def _image_urls(data: Any) -> tuple[tuple[str, str], ...]:
+    urls: list[tuple[str, str]] = []
+    try:
+        for item in data.get('items', [data]):
+            for sub_item in item.get('carousel_media') or [item]:
+                if candidates := sub_item.get('image_versions2', {}).get('candidates'):
+                    best = max(candidates, key=lambda x: x['width'] * x['height'])
+                    urls.append((str(sub_item['id']), best['url']))
+    except (AttributeError, KeyError, TypeError):
+        log.debug('Unexpected media JSON structure.')
+    return tuple(urls)
+
+
+def _read(path: Path, *, keep: bool) -> tuple[str, int, bytes, bytes]:
+    digest = hashlib.sha256()
+    chunks: list[bytes] = []
+    size = 0
+    tail = b''
+    with path.open('rb') as f:
+        while chunk := f.read(_CHUNK_SIZE):
+            digest.update(chunk)
+            size += len(chunk)
+            tail = (tail + chunk)[-16:]
+            if keep:
+                chunks.append(chunk)
+    return digest.hexdigest(), size, tail, b''.join(chunks)
+
+
+def inspect_file(path: str | Path) -> FileCheck | None:
+    """
+    Hash an archived file and check that it looks complete.
+
+    This runs in the worker processes of :py:func:`verify_archive`.
+
+    Parameters
+    ----------
+    path : str | Path
+        File to read.
+
+    Returns
+    -------
+    FileCheck | None
+        The result, or ``None`` if the file does not exist.
+    """
+    path = Path(path)
+    is_json = json_suffix_of(path.name) is not None
+    try:
+        digest, size, tail, content = _read(path, keep=is_json)
+    except FileNotFoundError:
+        return None
+    if not is_json:
+        ending = _FILE_ENDINGS.get(path.suffix.lower())
+        return FileCheck(digest, size, complete=ending is None or tail.endswith(ending))
+    try:
+        data = decode_json(content, path.name)
+    except UnsupportedCompressionError:
+        return FileCheck(digest, size, complete=None)
+    except ValueError:
+        return FileCheck(digest, size, complete=False)
+    return FileCheck(digest, size, complete=True, image_urls=_image_urls(data))
+
+
+def _problem(check: FileCheck | None, entry: ManifestEntry | None) -> str | None:
+    if check is None:
+        return 'missing'
+    if entry is not None and check.size != entry['size']:
+        return f'size is {check.size} bytes, expected {entry["size"]}'
+    if entry is not None and entry['digest'] is not None:
+        return None if check.digest == entry['digest'] else 'content does not match the digest'
+    return 'truncated' if check.complete is False else None
+
+
+def _recover_node(root: Path, post_id: str, sources: Iterable[str]) -> dict[str, Any]:
+    node: dict[str, Any] = {}
+    taken_at: int | None = None
+    # The node saved as {id}.json is preferred over the first media information item.
+    for path in sorted(sources, key=lambda x: not Path(x).name.startswith(f'{post_id}.')):
+        name = Path(path).name
+        try:
+            data = decode_json((root / path).read_bytes(), name)
+        except (OSError, UnsupportedCompressionError, ValueError):
+            continue
+        is_node = name.startswith(f'{post_id}.')
+        if not is_node:
+            try:
+                data = data['items'][0]
+            except (IndexError, KeyError, TypeError):
+                continue
+        if not isinstance(data, dict):
+            continue
+        if not node and data.get('id') == post_id:
+            node = data
+        if taken_at is None:
+            taken_at = data.get('taken_at')
+    node = {**node, 'id': post_id}
+    node.setdefault('pk', post_id.split('_', 1)[0])
+    if taken_at is not None:
+        node.setdefault('taken_at', taken_at)
+    return node
+
+
+def _quarantine(root: Path, path: str) -> bool:
+    source = root / path
+    if not source.is_file():
+        return False
+    target = root / QUARANTINE_DIR / path
+    target.parent.mkdir(parents=True, exist_ok=True)
+    source.replace(target)
+    return True
+
+
+def _requeue(db: LogDB, root: Path, problems: Iterable[str],
+             checks: Mapping[str, FileCheck | None]) -> tuple[list[str], list[str]]:
+    parents: dict[str, str] = {}
+    image_urls: dict[str, str] = {}
+    for path, check in checks.items():
+        if check is None or not check.image_urls:
+            continue
+        post_id = media_id_of(Path(path).name)
+        for item_id, url in check.image_urls:
+            image_urls[item_id] = url
+            if post_id is not None:
+                parents[item_id] = post_id
+    paths = tuple(problems)
+    damaged = set(paths)
+    sources: dict[str, list[str]] = {}
+    for path, check in checks.items():
+        name = Path(path).name
+        if path in damaged or check is None or not check.complete:
+            continue
+        if (json_suffix_of(name) is not None and (post_id := media_id_of(name)) is not None
+                and name.startswith((f'{post_id}.', f'{post_id}-media-info-'))):
+            sources.setdefault(post_id, []).append(path)
+    nodes: dict[str, dict[str, Any]] = {}
+    edges: dict[str, Edge] = {}
+    failures: dict[str, FailedItem] = {}
+    quarantined: list[str] = []
+    urls: list[str] = []
+    for path in paths:
+        # Damaged files are kept until the next run has archived a replacement. A legacy file
+        # may be the only copy left if the post has been deleted.
+        if _quarantine(root, path):
+            quarantined.append(path)
+        name = Path(path).name
+        media_id = media_id_of(name)
+        if media_id is None:
+            continue
+        post_id = parents.get(media_id, media_id)
+        if post_id not in nodes:
+            nodes[post_id] = _recover_node(root, post_id, sources.get(post_id, ()))
+        pk = nodes[post_id]['pk']
+        kind: FailureKind = 'comments' if name.startswith(f'{media_id}-comments.') else 'media'
+        edge = edges.setdefault(f'{kind}:{post_id}', cast('Edge', {'node': nodes[post_id]}))
+        if kind == 'media':
+            urls.append(f'https://www.instagram.com/api/v1/media/{pk}/info/')
+            if media_id in image_urls:
+                urls.append(image_urls[media_id])
+            if name.startswith(f'{media_id}-media-info-'):
+                # The images may be saved from the node alone, which would not write the media
+                # information file again.
+                edge['force_media_info'] = True
+        failures[failure_key(kind, edge)] = {
+            'error': f'Verification of {path} failed.',
+            'kind': kind,
+            'payload': json.dumps(edge)
+        }
+    db.remove_manifest_entries(paths)
+    db.forget(urls)
+    db.save_failures(failures)
+    return list(failures), quarantined
+
+
+def verify_archive(output_dir: str | Path,
+                   *,
+                   jobs: int | None = None,
+                   log_file: str | Path | None = None,
+                   requeue: bool = True) -> VerifyReport:
+    """
+    Check every per-post file of an archive against the manifest.
+
+    Files recorded with a digest are hashed and compared with it. Files without a digest (archived
+    before the manifest was kept) or missing from the manifest are checked for their size and for
+    obvious truncation, and are then recorded with the digest of their current content. Hashing
+    runs in a pool of ``jobs`` processes. Zstandard-compressed JSON files without a digest cannot
+    be checked without Zstandard support and are only listed in
+    :py:attr:`VerifyReport.unchecked`.
+
+    When ``requeue`` is ``True``, damaged files are moved to :py:data:`QUARANTINE_DIR` and removed
+    from the manifest, the log entries that would skip them are removed, and the posts they belong
+    to are recorded as failed, so the next run with ``--retry-failed`` archives them again. The
+    recorded post is read back from its surviving ``{id}.json`` or media information file, so it
+    keeps its ``taken_at`` time and is written to the same directory of a ``date`` layout. Nothing
+    is deleted: the quarantined files can be removed by hand once the run has replaced them.
+
+    Parameters
+    ----------
+    output_dir : str | Path
+        Output directory of the archive.
+    jobs : int | None
+        Number of hashing processes. Defaults to the number of CPUs. With ``1``, files are
+        hashed in the calling process.
+    log_file : str | Path | None
+        Custom path for the dedup log database. Defaults to ``.log.db`` inside ``output_dir``.
+    requeue : bool
+        Whether to queue damaged files to be archived again.
+
+    Returns
+    -------
+    VerifyReport
+        Number of files checked, problems found and items queued.
+    """
+    root = Path(output_dir)
+    db = LogDB(Path(log_file or root / '.log.db'))
+    try:
+        manifest = db.manifest()
+        paths = sorted(
+            set(manifest) | {
+                path.relative_to(root).as_posix()
+                for path in root.rglob('*')
+                if media_id_of(path.name) is not None and path.is_file() and not any(
+                    part.startswith('.') for part in path.relative_to(root).parts)
+            })
+        targets = [root / path for path in paths]
+        if jobs == 1:
+            results = list(map(inspect_file, targets))
+        else:
+            with ProcessPoolExecutor(jobs) as pool:
+                results = list(pool.map(inspect_file, targets, chunksize=64))
+        checks = dict(zip(paths, results, strict=True))
+        report = VerifyReport(checked=len(paths))
+        adopted: dict[str, ManifestEntry] = {}
+        for path, check in checks.items():
+            entry = manifest.get(path)
+            if (problem := _problem(check, entry)) is not None:
+                log.warning('%s: %s.', path, problem)
+                report.problems[path] = problem
+            elif check is not None and (entry is None or entry['digest'] is None):
+                if check.complete is None:
+                    log.warning('%s: cannot be checked on this Python.', path)
+                    report.unchecked.append(path)
+                    continue
+                adopted[path] = {
+                    'digest': check.digest,
+                    'media_id': media_id_of(Path(path).name),
+                    'size': check.size
+                }
+        db.save_manifest_entries(adopted)
+        if requeue and report.problems:
+            report.requeued, report.quarantined = _requeue(db, root, report.problems, checks)
+    finally:
+        db.close()
+    return report
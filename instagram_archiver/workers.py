@@ -2,20 +2,31 @@
 
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+from time import perf_counter
+from typing import TYPE_CHECKING, Any, TypeVar
+import asyncio
+import json
 import logging
 
-from .typing import COMMENTS_PROCESSED, IMAGES_PROCESSED, VIDEOS_PROCESSED, YT_DLP_STATUS
+from .typing import (
+    COMMENTS_PROCESSED,
+    ENDPOINT_YT_DLP,
+    IMAGES_PROCESSED,
+    VIDEOS_PROCESSED,
+    YT_DLP_STATUS,
+)
 
 if TYPE_CHECKING:
-    from collections.abc import Awaitable, Callable
-    import asyncio
+    from collections.abc import Awaitable, Callable, Iterable
 
     from yt_dlp_utils.aio import AsyncYoutubeDL
 
-    from .typing import Edge, OnMessage, Stats, YTDLPState
+    from .typing import Edge, FailedItem, FailureKind, OnMessage, Stats, YTDLPState
 
-__all__ = ('WorkerAbort', 'comments_worker', 'image_worker', 'video_worker')
+__all__ = ('DeferredRetries', 'WorkerAbort', 'comments_worker', 'failure_key', 'image_worker',
+           'queue_sampler', 'video_worker')
+
+_T = TypeVar('_T', 'Edge', str)
 
 log = logging.getLogger(__name__)
 
@@ -24,6 +35,158 @@ class WorkerAbort(Exception):
     """Worker-level abort signal for graceful CLI handling."""
 
 
+def failure_key(kind: FailureKind, item: Edge | str) -> str:
+    """
+    Build the key a failed work item is tracked under.
+
+    Parameters
+    ----------
+    kind : FailureKind
+        Worker the item belongs to.
+    item : Edge | str
+        Edge or video URL.
+
+    Returns
+    -------
+    str
+        ``{kind}:{url}`` for video URLs, ``{kind}:{id}`` for edges.
+    """
+    return f'{kind}:{item if isinstance(item, str) else item["node"]["id"]}'
+
+
+class DeferredRetries:
+    """
+    Put failed work items back on their queue after a cool-down.
+
+    An item that fails is not retried immediately, because the cause (rate limiting, a flaky
+    CDN node) usually needs time to clear. Instead it is re-enqueued after :py:attr:`cool_down`
+    seconds, at most :py:attr:`attempts` times. Items that still fail are collected in
+    :py:attr:`failures` so they can be persisted and processed again on a later run.
+    """
+    def __init__(self, *, attempts: int = 2, cool_down: float = 30) -> None:
+        """
+        Initialise the retry stage.
+
+        Parameters
+        ----------
+        attempts : int
+            Number of times a failed item is re-enqueued.
+        cool_down : float
+            Seconds to wait before a failed item is re-enqueued.
+        """
+        self.attempts = attempts
+        """Number of times a failed item is re-enqueued."""
+        self.cool_down = cool_down
+        """Seconds to wait before a failed item is re-enqueued."""
+        self.failures: dict[str, FailedItem] = {}
+        """Items that still failed after every attempt, keyed by :py:func:`failure_key`."""
+        self._attempts: dict[str, int] = {}
+        self._timers: dict[asyncio.Task[None], tuple[str, FailedItem]] = {}
+
+    def defer(self, kind: FailureKind, queue: asyncio.Queue[_T | None], item: _T,
+              error: BaseException | str) -> bool:
+        """
+        Schedule a failed item to be put back on its queue.
+
+        Parameters
+        ----------
+        kind : FailureKind
+            Worker the item belongs to.
+        queue : asyncio.Queue[_T | None]
+            Queue the item is put back on.
+        item : _T
+            Edge or video URL that failed.
+        error : BaseException | str
+            The error, recorded if the item is not retried again.
+
+        Returns
+        -------
+        bool
+            ``True`` if the item was scheduled, ``False`` if it has used every attempt and was
+            added to :py:attr:`failures` instead.
+        """
+        key = failure_key(kind, item)
+        failure: FailedItem = {
+            'error': str(error) or type(error).__name__,
+            'kind': kind,
+            'payload': item if isinstance(item, str) else json.dumps(item)
+        }
+        attempt = self._attempts.get(key, 0)
+        if attempt >= self.attempts:
+            log.error('Giving up on %s after %d retries: %s', key, attempt, failure['error'])
+            self.failures[key] = failure
+            return False
+        self._attempts[key] = attempt + 1
+        log.warning('Retrying %s in %.0f seconds: %s', key, self.cool_down, failure['error'])
+        timer = asyncio.create_task(self._requeue(queue, item))
+        self._timers[timer] = key, failure
+        timer.add_done_callback(self._timer_done)
+        return True
+
+    def retried(self, kind: FailureKind, item: Edge | str) -> bool:
+        """
+        Check whether an item was put back on its queue before.
+
+        Parameters
+        ----------
+        kind : FailureKind
+            Worker the item belongs to.
+        item : Edge | str
+            Edge or video URL.
+
+        Returns
+        -------
+        bool
+            ``True`` if the item has failed and been re-enqueued at least once.
+        """
+        return failure_key(kind, item) in self._attempts
+
+    async def _requeue(self, queue: asyncio.Queue[_T | None], item: _T) -> None:
+        await asyncio.sleep(self.cool_down)
+        queue.put_nowait(item)
+
+    def _timer_done(self, timer: asyncio.Task[None]) -> None:
+        self._timers.pop(timer, None)
+
+    async def settle(self, queues: Iterable[asyncio.Queue[Any]], stop_event: asyncio.Event) -> None:
+        """
+        Wait until the queues are drained and no item is waiting for its cool-down.
+
+        Call this after the producer has finished and before the shutdown sentinels are
+        queued, so re-enqueued items are not put behind a sentinel. If ``stop_event`` is set
+        meanwhile, pending retries are cancelled and recorded in :py:attr:`failures`.
+
+        Parameters
+        ----------
+        queues : Iterable[asyncio.Queue[Any]]
+            Worker queues.
+        stop_event : asyncio.Event
+            Event indicating that workers should stop.
+        """
+        queues = tuple(queues)
+        stopped = asyncio.create_task(stop_event.wait())
+        try:
+            while not stopped.done():
+                joined = asyncio.gather(*(queue.join() for queue in queues))
+                await asyncio.wait((joined, stopped), return_when=asyncio.FIRST_COMPLETED)
+                if not joined.done():
+                    joined.cancel()
+                    await asyncio.gather(joined, return_exceptions=True)
+                if stopped.done() or not self._timers:
+                    break
+                await asyncio.wait((*self._timers, stopped), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            stopped.cancel()
+            self.cancel()
+
+    def cancel(self) -> None:
+        """Cancel every pending retry, recording its item in :py:attr:`failures`."""
+        for timer, (key, failure) in self._timers.items():
+            timer.cancel()
+            self.failures[key] = failure
+        self._timers.clear()
+
+
 def _set_first_exception(first_exception: list[BaseException], error: BaseException,
                          stop_event: asyncio.Event) -> None:
     """
@@ -43,6 +206,46 @@ def _set_first_exception(first_exception: list[BaseException], error: BaseExcept
         stop_event.set()
 
 
+def _record_utilisation(stats: Stats | None, name: str, waited_at: float, started_at: float, *,
+                        item: bool) -> None:
+    """
+    Record one worker-loop iteration's idle and busy time.
+
+    Parameters
+    ----------
+    stats : Stats | None
+        Optional live statistics object.
+    name : str
+        Worker name.
+    waited_at : float
+        :py:func:`time.perf_counter` value taken before waiting on the queue.
+    started_at : float
+        :py:func:`time.perf_counter` value taken when the item was received.
+    item : bool
+        Whether a real item (rather than the shutdown sentinel) was received.
+    """
+    if stats is not None:
+        stats.worker(name).record(busy=perf_counter() - started_at,
+                                  idle=started_at - waited_at,
+                                  item=item)
+
+
+async def queue_sampler(stats: Stats, interval: float = 0.5) -> None:
+    """
+    Sample the depth of every queue tracked by ``stats`` until cancelled.
+
+    Parameters
+    ----------
+    stats : Stats
+        Live statistics object whose tracked queues are sampled.
+    interval : float
+        Seconds between samples.
+    """
+    while True:
+        stats.sample_queues()
+        await asyncio.sleep(interval)
+
+
 async def _process_edge(edge: Edge | None, save: Callable[[Edge], Awaitable[None]], *,
                         exit_message: str, message_prefix: str, on_cleanup: OnMessage | None,
                         on_message: OnMessage | None, stat_key: str, stats: Stats | None) -> bool:
@@ -90,8 +293,10 @@ async def image_worker(image_queue: asyncio.Queue[Edge | None],
                        save_media: Callable[[Edge], Awaitable[None]],
                        stop_event: asyncio.Event,
                        *,
+                       fatal: tuple[type[BaseException], ...] = (),
                        on_cleanup: OnMessage | None = None,
                        on_message: OnMessage | None = None,
+                       retry: DeferredRetries | None = None,
                        stats: Stats | None = None) -> None:
     """
     Save image/post media sequentially.
@@ -106,15 +311,24 @@ async def image_worker(image_queue: asyncio.Queue[Edge | None],
         Coroutine factory invoked once per edge to perform the download.
     stop_event : asyncio.Event
         Event indicating that workers should stop.
+    fatal : tuple[type[BaseException], ...]
+        Exception types that abort processing even when ``retry`` is set, because retrying
+        the item later cannot help.
     on_cleanup : OnMessage | None
         Optional callback that receives cleanup status updates.
     on_message : OnMessage | None
         Optional callback that receives progress text updates.
+    retry : DeferredRetries | None
+        Optional retry stage. When set, an edge whose save fails is re-enqueued after a
+        cool-down instead of aborting processing.
     stats : Stats | None
-        Optional live statistics object updated after each saved post.
+        Optional live statistics object updated after each saved post. Busy and idle time
+        are recorded against the ``image`` worker.
     """
     while not stop_event.is_set():
+        waited_at = perf_counter()
         edge = await image_queue.get()
+        started_at = perf_counter()
         try:
             if not await _process_edge(edge,
                                        save_media,
@@ -126,9 +340,12 @@ async def image_worker(image_queue: asyncio.Queue[Edge | None],
                                        stats=stats):
                 return
         except Exception as error:  # ruff:ignore[blind-except]
-            _set_first_exception(first_exception, error, stop_event)
-            return
+            if retry is None or edge is None or isinstance(error, fatal):
+                _set_first_exception(first_exception, error, stop_event)
+                return
+            retry.defer('media', image_queue, edge, error)
         finally:
+            _record_utilisation(stats, 'image', waited_at, started_at, item=edge is not None)
             image_queue.task_done()
 
 
@@ -137,8 +354,10 @@ async def comments_worker(comments_queue: asyncio.Queue[Edge | None],
                           save_comments: Callable[[Edge], Awaitable[None]],
                           stop_event: asyncio.Event,
                           *,
+                          fatal: tuple[type[BaseException], ...] = (),
                           on_cleanup: OnMessage | None = None,
                           on_message: OnMessage | None = None,
+                          retry: DeferredRetries | None = None,
                           stats: Stats | None = None) -> None:
     """
     Save comments for posts sequentially.
@@ -154,15 +373,24 @@ async def comments_worker(comments_queue: asyncio.Queue[Edge | None],
         Coroutine factory invoked once per edge to fetch comments.
     stop_event : asyncio.Event
         Event indicating that workers should stop.
+    fatal : tuple[type[BaseException], ...]
+        Exception types that abort processing even when ``retry`` is set, because retrying
+        the item later cannot help.
     on_cleanup : OnMessage | None
         Optional callback that receives cleanup status updates.
     on_message : OnMessage | None
         Optional callback that receives progress text updates.
+    retry : DeferredRetries | None
+        Optional retry stage. When set, an edge whose comments cannot be saved is re-enqueued
+        after a cool-down instead of aborting processing.
     stats : Stats | None
-        Optional live statistics object updated after each comment thread.
+        Optional live statistics object updated after each comment thread. Busy and idle time
+        are recorded against the ``comments`` worker.
     """
     while not stop_event.is_set():
+        waited_at = perf_counter()
         edge = await comments_queue.get()
+        started_at = perf_counter()
         try:
             if not await _process_edge(edge,
                                        save_comments,
@@ -174,33 +402,30 @@ async def comments_worker(comments_queue: asyncio.Queue[Edge | None],
                                        stats=stats):
                 return
         except Exception as error:  # ruff:ignore[blind-except]
-            _set_first_exception(first_exception, error, stop_event)
-            return
+            if retry is None or edge is None or isinstance(error, fatal):
+                _set_first_exception(first_exception, error, stop_event)
+                return
+            retry.defer('comments', comments_queue, edge, error)
         finally:
+            _record_utilisation(stats, 'comments', waited_at, started_at, item=edge is not None)
             comments_queue.task_done()
 
 
-async def _run_yt_dlp(url: str, first_exception: list[BaseException], failed_urls: set[str],
-                      stop_event: asyncio.Event, *, fail: bool, on_message: OnMessage | None,
+async def _run_yt_dlp(url: str, *, on_message: OnMessage | None, retried: bool,
                       save_to_log: Callable[[str], None], stats: Stats | None, ydl: AsyncYoutubeDL,
-                      yt_dlp_state: YTDLPState | None) -> None:
+                      yt_dlp_state: YTDLPState | None) -> int:
     """
-    Download a single URL with yt-dlp and record the outcome.
+    Download a single URL with yt-dlp and record a successful outcome.
 
     Parameters
     ----------
     url : str
         The video URL to download.
-    first_exception : list[BaseException]
-        Mutable container for the first observed fatal exception.
-    failed_urls : set[str]
-        Set updated with URLs whose download did not produce any media.
-    stop_event : asyncio.Event
-        Event indicating that workers should stop.
-    fail : bool
-        Whether a non-zero yt-dlp return code should abort processing.
     on_message : OnMessage | None
         Optional callback that receives progress text updates.
+    retried : bool
+        Whether the URL is being downloaded again after a failure. It was already counted in
+        the index of ``yt_dlp_state``, so the index is not advanced.
     save_to_log : Callable[[str], None]
         Callback used to record a successfully downloaded URL.
     stats : Stats | None
@@ -209,30 +434,39 @@ async def _run_yt_dlp(url: str, first_exception: list[BaseException], failed_url
         Configured yt-dlp wrapper instance.
     yt_dlp_state : YTDLPState | None
         Optional yt-dlp progress state updated with the current URL and index.
+
+    Returns
+    -------
+    int
+        The yt-dlp return code.
     """
     if yt_dlp_state is not None:
         yt_dlp_state.current_url = url
-        yt_dlp_state.current_index += 1
+        if not retried:
+            yt_dlp_state.current_index += 1
         if stats is not None:
             stats[YT_DLP_STATUS] = yt_dlp_state.render()
     if on_message is not None:
         on_message(f'Downloading {url} with yt-dlp...')
-    if (return_code := await ydl.download((url,))) == 0:
+    started = perf_counter()
+    return_code = await ydl.download((url,))
+    if stats is not None:
+        stats.observe_request(ENDPOINT_YT_DLP, perf_counter() - started, failed=return_code != 0)
+    if return_code == 0:
         save_to_log(url)
         if stats is not None:
             stats.increment(VIDEOS_PROCESSED)
-        return
-    failed_urls.add(url)
-    log.error('yt-dlp returned error code %d for %s.', return_code, url)
-    if fail:
-        _set_first_exception(first_exception, WorkerAbort(), stop_event)
+    else:
+        log.error('yt-dlp returned error code %d for %s.', return_code, url)
+    return return_code
 
 
 async def _process_video_url(url: str | None, first_exception: list[BaseException],
                              failed_urls: set[str], stop_event: asyncio.Event, *, fail: bool,
                              idle_event: asyncio.Event | None, is_saved: Callable[[str], bool],
                              on_cleanup: OnMessage | None, on_message: OnMessage | None,
-                             save_to_log: Callable[[str], None], stats: Stats | None,
+                             retry: DeferredRetries | None, save_to_log: Callable[[str], None],
+                             stats: Stats | None, video_queue: asyncio.Queue[str | None],
                              ydl: AsyncYoutubeDL, yt_dlp_state: YTDLPState | None) -> bool:
     """
     Handle a single queued video URL, including the yt-dlp lifecycle.
@@ -257,10 +491,14 @@ async def _process_video_url(url: str | None, first_exception: list[BaseExceptio
         Optional callback that receives cleanup status updates.
     on_message : OnMessage | None
         Optional callback that receives progress text updates.
+    retry : DeferredRetries | None
+        Optional retry stage that failed URLs are handed to unless ``fail`` is set.
     save_to_log : Callable[[str], None]
         Callback used to record a successfully downloaded URL.
     stats : Stats | None
         Optional live statistics object updated after each video URL.
+    video_queue : asyncio.Queue[str | None]
+        Queue the URL came from, used to re-enqueue it.
     ydl : AsyncYoutubeDL
         Configured yt-dlp wrapper instance.
     yt_dlp_state : YTDLPState | None
@@ -278,24 +516,22 @@ async def _process_video_url(url: str | None, first_exception: list[BaseExceptio
     if is_saved(url):
         log.debug('%s is already saved.', url)
         return True
+    error: Exception | str | None = None
     try:
         if idle_event is not None:
             idle_event.clear()
-        await _run_yt_dlp(url,
-                          first_exception,
-                          failed_urls,
-                          stop_event,
-                          fail=fail,
-                          on_message=on_message,
-                          save_to_log=save_to_log,
-                          stats=stats,
-                          ydl=ydl,
-                          yt_dlp_state=yt_dlp_state)
-    except Exception:
-        failed_urls.add(url)
+        return_code = await _run_yt_dlp(url,
+                                        on_message=on_message,
+                                        retried=retry is not None and retry.retried('video', url),
+                                        save_to_log=save_to_log,
+                                        stats=stats,
+                                        ydl=ydl,
+                                        yt_dlp_state=yt_dlp_state)
+        if return_code != 0:
+            error = f'yt-dlp returned error code {return_code}'
+    except Exception as e:
         log.exception('yt-dlp failure.')
-        if fail:
-            _set_first_exception(first_exception, WorkerAbort(), stop_event)
+        error = e
     finally:
         if yt_dlp_state is not None:
             yt_dlp_state.current_url = None
@@ -303,6 +539,11 @@ async def _process_video_url(url: str | None, first_exception: list[BaseExceptio
                 stats[YT_DLP_STATUS] = yt_dlp_state.render()
         if idle_event is not None:
             idle_event.set()
+    if error is not None and (fail or retry is None
+                              or not retry.defer('video', video_queue, url, error)):
+        failed_urls.add(url)
+        if fail:
+            _set_first_exception(first_exception, WorkerAbort(), stop_event)
     return True
 
 
@@ -316,6 +557,7 @@ async def video_worker(video_queue: asyncio.Queue[str | None],
                        is_saved: Callable[[str], bool],
                        on_cleanup: OnMessage | None = None,
                        on_message: OnMessage | None = None,
+                       retry: DeferredRetries | None = None,
                        save_to_log: Callable[[str], None],
                        stats: Stats | None = None,
                        ydl: AsyncYoutubeDL,
@@ -344,10 +586,15 @@ async def video_worker(video_queue: asyncio.Queue[str | None],
         Optional callback that receives cleanup status updates.
     on_message : OnMessage | None
         Optional callback that receives progress text updates.
+    retry : DeferredRetries | None
+        Optional retry stage. Unless ``fail`` is set, a URL whose download fails is
+        re-enqueued after a cool-down and only added to ``failed_urls`` once it has used every
+        attempt.
     save_to_log : Callable[[str], None]
         Callback used to record a successfully downloaded URL.
     stats : Stats | None
-        Optional live statistics object updated after each video URL.
+        Optional live statistics object updated after each video URL. Busy and idle time are
+        recorded against the ``video`` worker.
     ydl : AsyncYoutubeDL
         Configured yt-dlp wrapper instance.
     yt_dlp_state : YTDLPState | None
@@ -356,7 +603,9 @@ async def video_worker(video_queue: asyncio.Queue[str | None],
     if idle_event is not None:
         idle_event.set()
     while not stop_event.is_set():
+        waited_at = perf_counter()
         url = await video_queue.get()
+        started_at = perf_counter()
         try:
             if not await _process_video_url(url,
                                             first_exception,
@@ -367,10 +616,13 @@ async def video_worker(video_queue: asyncio.Queue[str | None],
                                             is_saved=is_saved,
                                             on_cleanup=on_cleanup,
                                             on_message=on_message,
+                                            retry=retry,
                                             save_to_log=save_to_log,
                                             stats=stats,
+                                            video_queue=video_queue,
                                             ydl=ydl,
                                             yt_dlp_state=yt_dlp_state):
                 return
         finally:
+            _record_utilisation(stats, 'video', waited_at, started_at, item=url is not None)
             video_queue.task_done()
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+import os
+import stat
+
+from instagram_archiver.cache import ResponseCache
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from pytest_mock import MockerFixture
+
+
+def test_response_cache_round_trip(tmp_path: Path) -> None:
+    cache = ResponseCache(tmp_path / 'cache')
+    assert cache.get('https://example.com/a') is None
+    cache.put('https://example.com/a', b'{}')
+    cache.put('https://example.com/a', b'{"a": 1}')
+    assert cache.get('https://example.com/a') == b'{"a": 1}'
+    assert ResponseCache(tmp_path / 'cache').get('https://example.com/a') == b'{"a": 1}'
+
+
+def test_response_cache_expired(tmp_path: Path, mocker: MockerFixture) -> None:
+    cache = ResponseCache(tmp_path, ttl=60)
+    cache.put('key', b'{}')
+    mocker.patch('instagram_archiver.cache.time',
+                 return_value=cache.path('key').stat().st_mtime + 61)
+    assert cache.get('key') is None
+    assert not cache.path('key').exists()
+
+
+def test_response_cache_evicts_least_recently_used(tmp_path: Path) -> None:
+    cache = ResponseCache(tmp_path, max_bytes=8)
+    cache.put('a', b'aaaa')
+    cache.put('b', b'bbbb')
+    os.utime(cache.path('b'), (1, cache.path('b').stat().st_mtime))
+    assert cache.get('a') == b'aaaa'
+    cache.put('c', b'cccc')
+    assert not cache.path('b').exists()
+    assert cache.get('a') == b'aaaa'
+    assert cache.get('c') == b'cccc'
+
+
+def test_response_cache_skips_oversized(tmp_path: Path) -> None:
+    cache = ResponseCache(tmp_path, max_bytes=2)
+    cache.put('a', b'aaa')
+    assert cache.get('a') is None
+
+
+def test_response_cache_uses_umask_permissions(tmp_path: Path) -> None:
+    reference = tmp_path / 'reference'
+    reference.write_bytes(b'')
+    cache = ResponseCache(tmp_path / 'cache')
+    cache.put('a', b'{}')
+    assert stat.S_IMODE(cache.path('a').stat().st_mode) == stat.S_IMODE(reference.stat().st_mode)
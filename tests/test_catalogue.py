@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any
+import sqlite3
+
+from instagram_archiver.catalogue import Catalogue
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+def _rows(path: Path, query: str) -> list[tuple[object, ...]]:
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute(query).fetchall()
+    finally:
+        connection.close()
+
+
+def test_catalogue_save_post_with_media_info(tmp_path: Path) -> None:
+    path = tmp_path / 'sub' / 'catalogue.db'
+    catalogue = Catalogue(path)
+    node = {'code': 'abc', 'id': '1_9', 'owner': {'id': '9', 'username': 'user'}, 'pk': '1'}
+    item = {
+        'caption': {
+            'text': 'Hello'
+        },
+        'carousel_media': [{
+            'id': '2_9',
+            'image_versions2': {
+                'candidates': [{
+                    'height': 1,
+                    'url': 'https://cdn/small.jpg',
+                    'width': 1
+                }, {
+                    'height': 2,
+                    'url': 'https://cdn/large.jpg',
+                    'width': 2
+                }]
+            },
+            'media_type': 1
+        }, {
+            'id': '3_9',
+            'media_type': 2,
+            'original_height': 1920,
+            'original_width': 1080,
+            'video_versions': [{
+                'height': 1,
+                'url': 'https://cdn/3.mp4',
+                'width': 1
+            }]
+        }],
+        'comment_count': 4,
+        'like_count': 10,
+        'media_type': 8,
+        'taken_at': 1234567890
+    }
+    catalogue.save_post(node, [item])
+    catalogue.close()
+    assert _rows(
+        path, 'SELECT id, pk, code, owner_id, owner_username, taken_at, media_type, '
+        'caption, like_count, comment_count FROM posts') == [('1_9', '1', 'abc', '9', 'user',
+                                                              1234567890, 8, 'Hello', 10, 4)]
+    assert _rows(
+        path, 'SELECT id, post_id, position, media_type, width, height, image_url, '
+        'video_url FROM media ORDER BY position') == [
+            ('2_9', '1_9', 0, 1, 2, 2, 'https://cdn/large.jpg', None),
+            ('3_9', '1_9', 1, 2, 1080, 1920, None, 'https://cdn/3.mp4')
+        ]
+
+
+def test_catalogue_save_post_keeps_known_values(tmp_path: Path) -> None:
+    path = tmp_path / 'catalogue.db'
+    catalogue = Catalogue(path)
+    catalogue.save_post({'caption': {'text': 'Hello'}, 'id': '1_9', 'like_count': 10})
+    catalogue.save_post({'id': '1_9', 'like_count': 11, 'user': {'pk': 9, 'username': 'user'}})
+    catalogue.close()
+    assert _rows(path, 'SELECT id, owner_id, owner_username, caption, like_count FROM posts') == [
+        ('1_9', '9', 'user', 'Hello', 11)
+    ]
+    assert _rows(path, 'SELECT id, post_id FROM media') == [('1_9', '1_9')]
+
+
+def test_catalogue_save_comments(tmp_path: Path) -> None:
+    path = tmp_path / 'catalogue.db'
+    catalogue = Catalogue(path)
+    comments: list[dict[str, Any]] = [{
+        'child_comments': [{
+            'created_at': 2,
+            'pk': 11,
+            'text': 'Reply',
+            'user': {
+                'id': '8',
+                'username': 'other'
+            }
+        }],
+        'comment_like_count': 3,
+        'created_at': 1,
+        'pk': 10,
+        'text': 'First',
+        'user': {
+            'pk': '9',
+            'username': 'user'
+        }
+    }, {
+        'text': 'No key'
+    }]
+    catalogue.save_comments('1_9', comments)
+    catalogue.save_comments('1_9', comments)
+    catalogue.close()
+    assert _rows(
+        path, 'SELECT pk, media_id, parent_pk, user_id, username, text, created_at, '
+        'like_count FROM comments ORDER BY pk') == [('10', '1_9', None, '9', 'user', 'First', 1, 3),
+                                                    ('11', '1_9', '10', '8', 'other', 'Reply', 2,
+                                                     None)]
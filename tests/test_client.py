@@ -1,12 +1,23 @@
 from __future__ import annotations
 
+from pathlib import Path
 from typing import TYPE_CHECKING, Any, cast
 from unittest.mock import AsyncMock, MagicMock
 import asyncio
 
-from instagram_archiver.client import CSRFTokenNotFound, InstagramClient, UnexpectedRedirect
+from instagram_archiver.cache import ResponseCache
+from instagram_archiver.client import (
+    CSRFTokenNotFound,
+    InstagramClient,
+    QueryRejected,
+    UnexpectedRedirect,
+)
+from instagram_archiver.layout import OutputLayout
+from instagram_archiver.retry import RetryPolicy
+from instagram_archiver.store import ContentStore
 from instagram_archiver.typing import POSTS_HANDLED, Comments, HighlightsTray, Stats, YTDLPState
-from niquests.exceptions import HTTPError, RetryError
+from instagram_archiver.utils import encode_json
+from niquests.exceptions import ConnectionError as RequestConnectionError, HTTPError, Timeout
 import pytest
 
 if TYPE_CHECKING:
@@ -61,6 +72,24 @@ async def test_graphql_query_failure(client: MagicMock) -> None:
     assert result is None
 
 
+async def test_graphql_query_rejected_status(client: MagicMock) -> None:
+    client.session.post.return_value = MagicMock(status_code=400, text='invalid')
+    with pytest.raises(QueryRejected, match='invalid'):
+        await client.graphql_query({'key': 'value'}, cast_to=dict, raise_rejected=True)
+
+
+async def test_graphql_query_rejected_errors(client: MagicMock) -> None:
+    client.session.post.return_value = MagicMock(
+        status_code=200,
+        json=MagicMock(return_value={
+            'status': 'ok',
+            'errors': ['Invalid cursor'],
+            'data': None
+        }))
+    with pytest.raises(QueryRejected, match='Invalid cursor'):
+        await client.graphql_query({'key': 'value'}, cast_to=dict, raise_rejected=True)
+
+
 async def test_get_text(client: MagicMock) -> None:
     mock_response = MagicMock()
     mock_response.text = 'response text'
@@ -112,12 +141,12 @@ async def test_save_image_versions2(client: MagicMock, mocker: MockerFixture) ->
             }]
         }
     }
-    await client.save_image_versions2(sub_item, 1234567890)
+    assert await client.save_image_versions2(sub_item, 1234567890) is True
 
     mock_is_saved.assert_called_once_with('https://example.com/image')
     mock_get_extension.assert_called_once_with('image/jpeg')
-    mock_write_bytes.assert_called_once_with('123.jpg', b'data')
-    mock_utime.assert_called_once_with('123.jpg', (1234567890, 1234567890))
+    mock_write_bytes.assert_called_once_with(Path('123.jpg'), b'data')
+    mock_utime.assert_called_once_with(Path('123.jpg'), (1234567890, 1234567890))
 
 
 async def test_save_image_versions2_no_content(client: MagicMock, mocker: MockerFixture) -> None:
@@ -140,7 +169,7 @@ async def test_save_image_versions2_no_content(client: MagicMock, mocker: Mocker
             }]
         }
     }
-    await client.save_image_versions2(sub_item, 1234567890)
+    assert await client.save_image_versions2(sub_item, 1234567890) is False
     mock_write_bytes.assert_not_called()
 
 
@@ -186,13 +215,13 @@ async def test_save_comments(client: MagicMock, mocker: MockerFixture) -> None:
                                             'can_view_more_preview_comments': False,
                                             'next_min_id': None
                                         }])
-    mock_dump_json = mocker.patch('instagram_archiver.client.dump_json')
+    mock_write_bytes = mocker.patch('instagram_archiver.client.write_bytes')
 
     edge = {'node': {'id': '123', 'pk': '123'}}
     await client.save_comments(edge)
 
     mock_get_json.assert_awaited()
-    mock_dump_json.assert_called_once_with('123-comments.json', mocker.ANY, mode='w+')
+    mock_write_bytes.assert_called_once_with(Path('123-comments.json'), mocker.ANY)
 
 
 async def test_graphql_query_error_status(client: MagicMock) -> None:
@@ -231,13 +260,48 @@ async def test_graphql_query_no_data(client: MagicMock) -> None:
     assert result is None
 
 
-async def test_graphql_query_http_error(client: MagicMock) -> None:
+async def test_graphql_query_http_error(client: MagicMock, mocker: MockerFixture) -> None:
+    mock_sleep = mocker.patch('instagram_archiver.client.asyncio.sleep', new_callable=AsyncMock)
     mock_response = MagicMock()
     mock_response.status_code = 500
     client.session.post.return_value = mock_response
 
     result = await client.graphql_query({'key': 'value'}, cast_to=dict)
     assert result is None
+    assert client.session.post.await_count == 6
+    assert mock_sleep.await_count == 5
+
+
+async def test_request_honours_retry_after(client: MagicMock, mocker: MockerFixture) -> None:
+    mock_sleep = mocker.patch('instagram_archiver.client.asyncio.sleep', new_callable=AsyncMock)
+    client.stats = Stats()
+    client.session.get.side_effect = [
+        MagicMock(status_code=429, headers={'Retry-After': '3'}, content=b''),
+        MagicMock(status_code=200, content=b'{}', json=MagicMock(return_value={}))
+    ]
+    assert await client.get_json('https://example.com', cast_to=dict, endpoint='comments') == {}
+    mock_sleep.assert_awaited_once_with(3)
+    assert client.stats.retries == 1
+    assert client.stats.latencies['comments'].count == 2
+
+
+async def test_request_retries_connection_errors(client: MagicMock, mocker: MockerFixture) -> None:
+    mocker.patch('instagram_archiver.client.asyncio.sleep', new_callable=AsyncMock)
+    client.retry_policy = RetryPolicy(max_retries=1)
+    client.session.get.side_effect = [RequestConnectionError, MagicMock(text='ok')]
+    assert await client.get_text('https://example.com') == 'ok'
+    client.session.get.side_effect = [RequestConnectionError, RequestConnectionError]
+    with pytest.raises(RequestConnectionError):
+        await client.get_text('https://example.com')
+
+
+async def test_request_budget_per_endpoint(client: MagicMock, mocker: MockerFixture) -> None:
+    mocker.patch('instagram_archiver.client.asyncio.sleep', new_callable=AsyncMock)
+    client.retry_policy = RetryPolicy(budget=5, budgets={'graphql': 1})
+    client.session.post.return_value = MagicMock(status_code=503, headers={})
+    assert await client.graphql_query({}, cast_to=dict) is None
+    assert await client.graphql_query({}, cast_to=dict) is None
+    assert client.session.post.await_count == 3
 
 
 async def test_graphql_query_json_not_object(client: MagicMock, mocker: MockerFixture) -> None:
@@ -264,7 +328,7 @@ async def test_save_image_versions2_already_saved(client: MagicMock, mocker: Moc
             }]
         }
     }
-    await client.save_image_versions2(sub_item, 1234567890)
+    assert await client.save_image_versions2(sub_item, 1234567890) is True
 
     mock_is_saved.assert_called_once_with('https://example.com/image')
     client.session.head.assert_not_called()
@@ -286,7 +350,7 @@ async def test_save_image_versions2_head_request_failure(client: MagicMock,
             }]
         }
     }
-    await client.save_image_versions2(sub_item, 1234567890)
+    assert await client.save_image_versions2(sub_item, 1234567890) is False
 
     mock_is_saved.assert_called_once_with('https://example.com/image')
     client.session.head.assert_awaited_once_with('https://example.com/image')
@@ -314,7 +378,7 @@ async def test_save_comments_with_child_comments(client: MagicMock, mocker: Mock
                             }],
                             'has_more_head_child_comments': False
                         }])
-    mock_dump_json = mocker.patch('instagram_archiver.client.dump_json')
+    mock_write_bytes = mocker.patch('instagram_archiver.client.write_bytes')
 
     await client.save_comments({'node': {'id': '999', 'pk': '999'}})
 
@@ -326,7 +390,7 @@ async def test_save_comments_with_child_comments(client: MagicMock, mocker: Mock
         'pk': 'r2pk'
     }]
     assert 'child_comments' not in parent_no_replies
-    mock_dump_json.assert_called_once_with('999-comments.json', mocker.ANY, mode='w+')
+    mock_write_bytes.assert_called_once_with(Path('999-comments.json'), mocker.ANY)
 
 
 async def test_save_comments_child_comments_paginated(client: MagicMock,
@@ -354,7 +418,7 @@ async def test_save_comments_child_comments_paginated(client: MagicMock,
                                             }],
                                             'has_more_head_child_comments': False
                                         }])
-    mocker.patch('instagram_archiver.client.dump_json')
+    mocker.patch('instagram_archiver.client.write_bytes')
 
     await client.save_comments({'node': {'id': 'mid', 'pk': 'mid'}})
 
@@ -376,7 +440,7 @@ async def test_save_comments_child_comments_disabled(client: MagicMock,
                             'can_view_more_preview_comments': False,
                             'next_min_id': None
                         })
-    mocker.patch('instagram_archiver.client.dump_json')
+    mocker.patch('instagram_archiver.client.write_bytes')
     await client.save_comments({'node': {'id': 'm', 'pk': 'm'}})
     assert 'child_comments' not in parent
 
@@ -393,7 +457,7 @@ async def test_save_comments_child_comments_http_error(client: MagicMock,
                             'can_view_more_preview_comments': False,
                             'next_min_id': None
                         }, HTTPError])
-    mocker.patch('instagram_archiver.client.dump_json')
+    mocker.patch('instagram_archiver.client.write_bytes')
     mock_log_exception = mocker.patch('instagram_archiver.client.log.exception')
     await client.save_comments({'node': {'id': 'mid', 'pk': 'mid'}})
     assert 'child_comments' not in parent
@@ -419,7 +483,7 @@ async def test_save_comments_child_comments_partial_then_error(client: MagicMock
                             'has_more_head_child_comments': True,
                             'next_min_id': 'cursor1'
                         }, HTTPError])
-    mocker.patch('instagram_archiver.client.dump_json')
+    mocker.patch('instagram_archiver.client.write_bytes')
     mocker.patch('instagram_archiver.client.log.exception')
     await client.save_comments({'node': {'id': 'mid', 'pk': 'mid'}})
     children = cast('list[dict[str, Any]]', parent['child_comments'])
@@ -438,7 +502,7 @@ async def test_save_comments_child_comments_no_pk(client: MagicMock, mocker: Moc
                             'can_view_more_preview_comments': False,
                             'next_min_id': None
                         })
-    mocker.patch('instagram_archiver.client.dump_json')
+    mocker.patch('instagram_archiver.client.write_bytes')
     mock_log_debug = mocker.patch('instagram_archiver.client.log.debug')
     await client.save_comments({'node': {'id': 'mid', 'pk': 'mid'}})
     assert 'child_comments' not in parent
@@ -460,6 +524,8 @@ async def test_save_comments_http_error(client: MagicMock, mocker: MockerFixture
                                                'can_support_threading': 'true',
                                                'permalink_enabled': 'false'
                                            },
+                                           cached=True,
+                                           endpoint='comments',
                                            headers=mocker.ANY,
                                            cast_to=Comments)
     mock_log_exception.assert_called_once_with('Failed to get comments.')
@@ -475,7 +541,7 @@ async def test_save_comments_http_error_page_2(client: MagicMock, mocker: Mocker
                                             'comments': []
                                         }, HTTPError])
     mock_log_exception = mocker.patch('instagram_archiver.client.log.exception')
-    mocker.patch('instagram_archiver.client.dump_json')
+    mocker.patch('instagram_archiver.client.write_bytes')
 
     edge = {'node': {'id': '123', 'pk': '123'}}
     await client.save_comments(edge)
@@ -486,6 +552,8 @@ async def test_save_comments_http_error_page_2(client: MagicMock, mocker: Mocker
                                           'min_id': 'min',
                                           'sort_order': 'popular'
                                       },
+                                      cached=True,
+                                      endpoint='comments',
                                       headers=mocker.ANY,
                                       cast_to=Comments)
     mock_log_exception.assert_called_once_with('Failed to get comments.')
@@ -502,14 +570,13 @@ async def test_save_comments_uses_pk_in_url_and_id_in_filename(client: MagicMock
                                             'can_view_more_preview_comments': False,
                                             'next_min_id': None
                                         })
-    mock_dump_json = mocker.patch('instagram_archiver.client.dump_json')
+    mock_write_bytes = mocker.patch('instagram_archiver.client.write_bytes')
     edge = {'node': {'id': '3893923910883717076_31696836669', 'pk': '3893923910883717076'}}
     await client.save_comments(edge)
     args, _kwargs = mock_get_json.call_args
     assert args[0] == 'https://www.instagram.com/api/v1/media/3893923910883717076/comments/'
-    mock_dump_json.assert_called_once_with('3893923910883717076_31696836669-comments.json',
-                                           mocker.ANY,
-                                           mode='w+')
+    mock_write_bytes.assert_called_once_with(Path('3893923910883717076_31696836669-comments.json'),
+                                             mocker.ANY)
 
 
 async def test_save_comments_includes_referer_when_shortcode_present(client: MagicMock,
@@ -522,7 +589,7 @@ async def test_save_comments_includes_referer_when_shortcode_present(client: Mag
                                             'can_view_more_preview_comments': False,
                                             'next_min_id': None
                                         })
-    mocker.patch('instagram_archiver.client.dump_json')
+    mocker.patch('instagram_archiver.client.write_bytes')
     edge = {'node': {'id': 'i', 'pk': 'p', 'code': 'DYJ_yqCn6_U'}}
     await client.save_comments(edge)
     sent_headers = mock_get_json.call_args.kwargs['headers']
@@ -537,6 +604,99 @@ async def test_save_media_already_saved(client: MagicMock, mocker: MockerFixture
     client.session.get.assert_not_called()
 
 
+async def test_save_media_from_complete_node(client: MagicMock, mocker: MockerFixture) -> None:
+    mocker.patch.object(client, 'is_saved', return_value=False)
+    mock_save_to_log = mocker.patch.object(client, 'save_to_log')
+    mock_write_bytes = mocker.patch('instagram_archiver.client.write_bytes')
+    mock_utime = mocker.patch('instagram_archiver.client.utime')
+    mock_save_image = mocker.patch.object(client, 'save_image_versions2', new_callable=AsyncMock)
+    sub_item = {'id': 's', 'image_versions2': {'candidates': [{'url': 'u'}]}}
+    node = {'code': 'c', 'id': 'i', 'pk': 'pk', 'taken_at': 5, 'carousel_media': [sub_item]}
+    await client.save_media({'node': node})
+    client.session.get.assert_not_called()
+    mock_write_bytes.assert_called_once_with(Path('i.json'), mocker.ANY)
+    mock_utime.assert_called_once_with(Path('i.json'), (5, 5))
+    mock_save_to_log.assert_called_once_with('https://www.instagram.com/api/v1/media/pk/info/')
+    mock_save_image.assert_awaited_once_with(sub_item, 5)
+
+
+async def test_save_media_retry_downloads_image_after_failure(client: MagicMock,
+                                                              mocker: MockerFixture,
+                                                              tmp_path: Path) -> None:
+    client.retry_policy = RetryPolicy(max_retries=0)
+    saved: set[str] = set()
+    mocker.patch.object(client, 'is_saved', side_effect=saved.__contains__)
+    mocker.patch.object(client, 'save_to_log', side_effect=saved.add)
+    mocker.patch('instagram_archiver.client.utime')
+    mock_write_bytes = mocker.patch('instagram_archiver.client.write_bytes')
+    client.session.head.side_effect = [
+        RequestConnectionError,
+        MagicMock(status_code=200, headers={'content-type': 'image/jpeg'}, url='https://cdn/i')
+    ]
+    client.session.get.return_value = MagicMock(content=b'image')
+    node = {
+        'code': 'c',
+        'id': 'i',
+        'image_versions2': {
+            'candidates': [{
+                'height': 1,
+                'url': 'https://cdn/i',
+                'width': 1
+            }]
+        },
+        'pk': 'pk',
+        'taken_at': 5
+    }
+    with pytest.raises(RequestConnectionError):
+        await client.save_media({'node': node})
+    assert 'https://www.instagram.com/api/v1/media/pk/info/' not in saved
+    await client.save_media({'node': node})
+    mock_write_bytes.assert_any_call(Path('i.jpg'), b'image')
+    assert saved == {'https://cdn/i', 'https://www.instagram.com/api/v1/media/pk/info/'}
+
+
+async def test_save_media_incomplete_node_uses_media_info(client: MagicMock,
+                                                          mocker: MockerFixture) -> None:
+    mocker.patch.object(client, 'is_saved', return_value=False)
+    client.session.get.return_value = MagicMock(status_code=404, text='not found')
+    mocker.patch('instagram_archiver.client.log.warning')
+    node = {
+        'code': 'c',
+        'id': 'i',
+        'pk': 'pk',
+        'taken_at': 5,
+        'carousel_media': [{
+            'id': 's'
+        }],
+        'image_versions2': {
+            'candidates': [{
+                'url': 'u'
+            }]
+        }
+    }
+    await client.save_media({'node': node})
+    client.session.get.assert_awaited_once()
+
+
+async def test_save_media_forced_media_info(client: MagicMock, mocker: MockerFixture) -> None:
+    mocker.patch.object(client, 'is_saved', return_value=False)
+    client.session.get.return_value = MagicMock(status_code=404, text='not found')
+    mocker.patch('instagram_archiver.client.log.warning')
+    node = {
+        'code': 'c',
+        'id': 'i',
+        'image_versions2': {
+            'candidates': [{
+                'url': 'u'
+            }]
+        },
+        'pk': 'pk',
+        'taken_at': 5
+    }
+    await client.save_media({'force_media_info': True, 'node': node})
+    client.session.get.assert_awaited_once()
+
+
 async def test_save_media_get_request_failure(client: MagicMock, mocker: MockerFixture) -> None:
     mock_is_saved = mocker.patch.object(client, 'is_saved', return_value=False)
     response = MagicMock(status_code=404, text='not found')
@@ -595,7 +755,7 @@ async def test_save_media_invalid_response_none_text(client: MagicMock,
 
 async def test_save_media_success(client: MagicMock, mocker: MockerFixture) -> None:
     mock_is_saved = mocker.patch.object(client, 'is_saved', return_value=False)
-    mock_write_if_new = mocker.patch('instagram_archiver.client.write_if_new')
+    mock_write_bytes = mocker.patch('instagram_archiver.client.write_bytes')
     mock_utime = mocker.patch('instagram_archiver.client.utime')
     mocker.patch.object(client, 'save_image_versions2', new_callable=AsyncMock)
     mock_save_to_log = mocker.patch.object(client, 'save_to_log')
@@ -620,13 +780,139 @@ async def test_save_media_success(client: MagicMock, mocker: MockerFixture) -> N
                                                 headers=mocker.ANY,
                                                 allow_redirects=False)
     mock_is_saved.assert_called_once_with('https://www.instagram.com/api/v1/media/pk/info/')
-    mock_write_if_new.assert_any_call('123.json', mocker.ANY)
-    mock_write_if_new.assert_any_call('123-media-info-0000.json', mocker.ANY)
-    mock_utime.assert_any_call('123.json', (1234567890, 1234567890))
-    mock_utime.assert_any_call('123-media-info-0000.json', (1234567890, 1234567890))
+    mock_write_bytes.assert_any_call(Path('123.json'), mocker.ANY)
+    mock_write_bytes.assert_any_call(Path('123-media-info-0000.json'), mocker.ANY)
+    mock_utime.assert_any_call(Path('123.json'), (1234567890, 1234567890))
+    mock_utime.assert_any_call(Path('123-media-info-0000.json'), (1234567890, 1234567890))
     mock_save_to_log.assert_called_once_with('https://www.instagram.com/api/v1/media/pk/info/')
 
 
+async def test_save_media_gzip_json_format(client: MagicMock, mocker: MockerFixture) -> None:
+    client.json_format = 'gzip'
+    mocker.patch.object(client, 'is_saved', return_value=False)
+    mocker.patch.object(client, 'save_to_log')
+    mocker.patch.object(client, 'save_image_versions2', new_callable=AsyncMock)
+    mock_write_bytes = mocker.patch('instagram_archiver.client.write_bytes')
+    mocker.patch('instagram_archiver.client.utime')
+    media_info = {'items': [{'taken_at': 1234567890, 'image_versions2': {}}]}
+    client.session.get.return_value = MagicMock(
+        status_code=200,
+        text='{"image_versions2": {}, "taken_at": 1234567890}',
+        json=MagicMock(return_value=media_info))
+    await client.save_media({'node': {'code': 'test_code', 'id': '123', 'pk': 'pk'}})
+    mock_write_bytes.assert_any_call(
+        Path('123.json.gz'), encode_json({
+            'code': 'test_code',
+            'id': '123',
+            'pk': 'pk'
+        }, 'gzip'))
+    mock_write_bytes.assert_any_call(Path('123-media-info-0000.json.gz'),
+                                     encode_json(media_info, 'gzip'))
+
+
+async def test_save_media_stub_node_does_not_write_id_json(client: MagicMock,
+                                                           mocker: MockerFixture) -> None:
+    mocker.patch.object(client, 'is_saved', return_value=False)
+    mocker.patch.object(client, 'save_to_log')
+    mocker.patch.object(client, 'save_image_versions2', new_callable=AsyncMock)
+    mock_write_bytes = mocker.patch('instagram_archiver.client.write_bytes')
+    mocker.patch('instagram_archiver.client.utime')
+    client.session.get.return_value = MagicMock(
+        status_code=200,
+        text='{"image_versions2": {}, "taken_at": 1234567890}',
+        json=MagicMock(return_value={'items': [{
+            'taken_at': 1234567890,
+            'image_versions2': {}
+        }]}))
+    await client.save_media({'node': {'id': '123', 'pk': 'pk', 'taken_at': 1234567890}})
+    mock_write_bytes.assert_called_once_with(Path('123-media-info-0000.json'), mocker.ANY)
+
+
+async def test_save_media_skips_json_archived_in_another_format(client: MagicMock,
+                                                                mocker: MockerFixture,
+                                                                tmp_path: Path) -> None:
+    client.json_format = 'gzip'
+    client.layout = OutputLayout(root=tmp_path)
+    (tmp_path / 'i.json').write_text('{}', encoding='utf-8')
+    mocker.patch.object(client, 'is_saved', return_value=False)
+    mocker.patch.object(client, 'save_to_log')
+    mocker.patch.object(client, 'save_image_versions2', new_callable=AsyncMock)
+    mock_write_bytes = mocker.patch('instagram_archiver.client.write_bytes')
+    node = {'id': 'i', 'image_versions2': {'candidates': [{'url': 'u'}]}, 'pk': 'pk', 'taken_at': 5}
+    await client.save_media({'node': node})
+    mock_write_bytes.assert_not_called()
+
+
+async def test_save_comments_compact_json_format(client: MagicMock, mocker: MockerFixture) -> None:
+    client.json_format = 'compact'
+    mocker.patch.object(client,
+                        'get_json',
+                        new_callable=AsyncMock,
+                        return_value={
+                            'comments': [],
+                            'can_view_more_preview_comments': False,
+                            'next_min_id': None
+                        })
+    mock_write_bytes = mocker.patch('instagram_archiver.client.write_bytes')
+    await client.save_comments({'node': {'id': '123', 'pk': '123'}})
+    mock_write_bytes.assert_called_once_with(
+        Path('123-comments.json'),
+        b'{"can_view_more_preview_comments":false,"comments":[],"next_min_id":null}')
+
+
+async def test_save_media_records_catalogue(client: MagicMock, mocker: MockerFixture) -> None:
+    client.catalogue = MagicMock()
+    mocker.patch.object(client, 'is_saved', return_value=False)
+    mocker.patch.object(client, 'save_to_log')
+    mocker.patch.object(client, 'save_image_versions2', new_callable=AsyncMock)
+    mocker.patch('instagram_archiver.client.write_bytes')
+    mocker.patch('instagram_archiver.client.utime')
+    items = [{'taken_at': 1234567890, 'image_versions2': {}}]
+    client.session.get.return_value = MagicMock(
+        status_code=200,
+        text='{"image_versions2": {}, "taken_at": 1234567890}',
+        json=MagicMock(return_value={'items': items}))
+    node = {'code': 'test_code', 'id': '123', 'pk': 'pk'}
+    await client.save_media({'node': node})
+    client.catalogue.save_post.assert_called_once_with(node, items)
+
+
+async def test_save_media_from_complete_node_records_catalogue(client: MagicMock,
+                                                               mocker: MockerFixture) -> None:
+    client.catalogue = MagicMock()
+    mocker.patch.object(client, 'is_saved', return_value=False)
+    mocker.patch.object(client, 'save_to_log')
+    mocker.patch.object(client, 'save_image_versions2', new_callable=AsyncMock)
+    mocker.patch('instagram_archiver.client.write_bytes')
+    mocker.patch('instagram_archiver.client.utime')
+    node = {'id': 'i', 'image_versions2': {'candidates': [{'url': 'u'}]}, 'pk': 'pk', 'taken_at': 5}
+    await client.save_media({'node': node})
+    client.catalogue.save_post.assert_called_once_with(node, ())
+
+
+async def test_save_comments_records_catalogue(client: MagicMock, mocker: MockerFixture) -> None:
+    client.catalogue = MagicMock()
+    comments = [{'pk': '1', 'text': 'comment1'}]
+    mocker.patch.object(client,
+                        'get_json',
+                        new_callable=AsyncMock,
+                        return_value={
+                            'comments': comments,
+                            'can_view_more_preview_comments': False,
+                            'next_min_id': None
+                        })
+    mocker.patch('instagram_archiver.client.write_bytes')
+    await client.save_comments({'node': {'id': '123', 'pk': '123'}})
+    client.catalogue.save_comments.assert_called_once_with('123', comments)
+
+
+async def test_aexit_closes_catalogue(client: MagicMock) -> None:
+    catalogue = client.catalogue = MagicMock()
+    await client.__aexit__(None, None, None)
+    catalogue.close.assert_called_once_with()
+    client.session.close.assert_awaited_once_with()
+
+
 async def test_save_edges_typename_xdtmediadict_video(client: MagicMock,
                                                       mocker: MockerFixture) -> None:
     mock_add_video_url = mocker.patch.object(client, 'add_video_url')
@@ -651,12 +937,14 @@ async def test_save_edges_typename_xdtmediadict_media(client: MagicMock,
     mock_save_media.assert_awaited_once_with(edge)
 
 
-async def test_save_edges_typename_xdtmediadict_retry_error(client: MagicMock,
-                                                            mocker: MockerFixture) -> None:
+@pytest.mark.parametrize('error', [RequestConnectionError, Timeout])
+async def test_save_edges_typename_xdtmediadict_retries_exhausted(client: MagicMock,
+                                                                  mocker: MockerFixture,
+                                                                  error: type[Exception]) -> None:
     mock_save_comments = mocker.patch.object(client,
                                              'save_comments',
                                              new_callable=AsyncMock,
-                                             side_effect=RetryError)
+                                             side_effect=error)
     mock_log_exception = mocker.patch('instagram_archiver.client.log.exception')
     edge = {'node': {'__typename': 'XDTMediaDict', 'code': 'test_code'}}
     await client.save_edges([edge])
@@ -774,6 +1062,38 @@ async def test_dispatch_edges_image_no_comments(client: MagicMock) -> None:
     assert comments_q.empty()
 
 
+async def test_dispatch_edges_skips_duplicate_pk(client: MagicMock) -> None:
+    client.should_save_comments = False
+    image_q: asyncio.Queue[Any] = asyncio.Queue()
+    comments_q: asyncio.Queue[Any] = asyncio.Queue()
+    video_q: asyncio.Queue[Any] = asyncio.Queue()
+    stats = Stats()
+    edge = {'node': {'__typename': 'XDTMediaDict', 'code': 'sc', 'pk': '1'}}
+    other = {'node': {'__typename': 'XDTMediaDict', 'code': 'sc2', 'pk': '2'}}
+    await client.dispatch_edges([edge, other], image_q, comments_q, video_q, stats=stats)
+    await client.dispatch_edges([dict(edge)], image_q, comments_q, video_q, stats=stats)
+    assert image_q.qsize() == 2
+    assert stats[POSTS_HANDLED] == 2
+
+
+async def test_dispatch_edges_skips_duplicate_video_permalink(client: MagicMock) -> None:
+    image_q: asyncio.Queue[Any] = asyncio.Queue()
+    comments_q: asyncio.Queue[Any] = asyncio.Queue()
+    video_q: asyncio.Queue[Any] = asyncio.Queue()
+    state = YTDLPState()
+    edges = [{
+        'node': {
+            '__typename': 'XDTMediaDict',
+            'code': 'sc',
+            'pk': pk,
+            'video_dash_manifest': 'manifest'
+        }
+    } for pk in ('1', '2')]
+    await client.dispatch_edges(edges, image_q, comments_q, video_q, yt_dlp_state=state)
+    assert video_q.qsize() == 1
+    assert state.total_urls == 1
+
+
 async def test_dispatch_edges_unknown_type(client: MagicMock) -> None:
     image_q: asyncio.Queue[Any] = asyncio.Queue()
     comments_q: asyncio.Queue[Any] = asyncio.Queue()
@@ -911,6 +1231,15 @@ async def test_save_reel_item_image(client: MagicMock, mocker: MockerFixture) ->
     mock_save_image.assert_awaited_once_with(item, 99)
 
 
+async def test_save_reel_item_duplicate_skipped(client: MagicMock, mocker: MockerFixture) -> None:
+    mock_save_image = mocker.patch.object(client, 'save_image_versions2', new_callable=AsyncMock)
+    item = {'id': 'i', 'image_versions2': {'candidates': []}, 'pk': 'pk', 'taken_at': 99}
+    await client.save_reel_item(item)
+    await client.save_reel_item(item)
+    mock_save_image.assert_awaited_once_with(item, 99)
+    assert client.in_flight == {'pk'}
+
+
 async def test_save_reel_item_video_with_queue(client: MagicMock) -> None:
     state = YTDLPState()
     queue: asyncio.Queue[str | None] = asyncio.Queue()
@@ -963,3 +1292,214 @@ async def test_aenter_aexit(mocker: MockerFixture) -> None:
     async with client:
         assert client.session is mock_setup.return_value
     client.session.close.assert_awaited_once()
+
+
+async def test_graphql_query_records_latency(client: MagicMock) -> None:
+    client.stats = Stats()
+    client.session.post.return_value = MagicMock(status_code=200,
+                                                 content=b'{}',
+                                                 json=MagicMock(return_value={
+                                                     'status': 'ok',
+                                                     'data': {}
+                                                 }))
+    await client.graphql_query({}, cast_to=dict)
+    histogram = client.stats.latencies['graphql']
+    assert histogram.count == 1
+    assert histogram.bytes_transferred == 2
+    assert client.stats.spans is None
+
+
+async def test_graphql_query_records_span_when_enabled(client: MagicMock) -> None:
+    client.stats = Stats()
+    client.stats.enable_spans()
+    client.session.post.return_value = MagicMock(status_code=400, content=b'')
+    assert await client.graphql_query({}, cast_to=dict) is None
+    assert client.stats.spans is not None
+    assert client.stats.spans['graphql_query'].count == 1
+
+
+async def test_get_json_records_latency_only_with_endpoint(client: MagicMock) -> None:
+    client.stats = Stats()
+    client.session.get.return_value = MagicMock(content=b'[]', json=MagicMock(return_value=[]))
+    await client.get_json('https://example.com', cast_to=list)
+    assert client.stats.latencies == {}
+    await client.get_json('https://example.com', cast_to=list, endpoint='comments')
+    assert client.stats.latencies['comments'].count == 1
+
+
+async def test_get_json_cached(client: MagicMock, tmp_path: Path) -> None:
+    client.response_cache = ResponseCache(tmp_path)
+    client.session.get.return_value = MagicMock(content=b'{"a": 1}',
+                                                json=MagicMock(return_value={'a': 1}))
+    for _ in range(2):
+        assert await client.get_json('https://example.com',
+                                     cached=True,
+                                     cast_to=dict,
+                                     params={'b': '2'}) == {
+                                         'a': 1
+                                     }
+    client.session.get.assert_awaited_once()
+    await client.get_json('https://example.com', cast_to=dict, params={'b': '2'})
+    assert client.session.get.await_count == 2
+
+
+async def test_save_media_uses_cached_media_info(client: MagicMock, mocker: MockerFixture,
+                                                 tmp_path: Path) -> None:
+    mocker.patch.object(client, 'is_saved', return_value=False)
+    mocker.patch('instagram_archiver.client.write_bytes')
+    mocker.patch('instagram_archiver.client.utime')
+    mock_save_image = mocker.patch.object(client, 'save_image_versions2', new_callable=AsyncMock)
+    client.response_cache = ResponseCache(tmp_path)
+    client.response_cache.put('https://www.instagram.com/api/v1/media/pk/info/',
+                              b'{"items": [{"image_versions2": {}, "taken_at": 5}]}')
+    await client.save_media({'node': {'code': 'c', 'id': 'i', 'pk': 'pk'}})
+    client.session.get.assert_not_called()
+    mock_save_image.assert_awaited_once_with({'image_versions2': {}, 'taken_at': 5}, 5)
+
+
+async def test_save_image_versions2_records_cdn_latency(client: MagicMock,
+                                                        mocker: MockerFixture) -> None:
+    client.stats = Stats()
+    mocker.patch.object(client, 'is_saved', return_value=False)
+    mocker.patch('instagram_archiver.client.write_bytes')
+    mocker.patch('instagram_archiver.client.utime')
+    client.session.head.return_value = MagicMock(status_code=200,
+                                                 headers={'content-type': 'image/jpeg'},
+                                                 url='https://example.com/image')
+    client.session.get.return_value = MagicMock(content=b'data')
+    await client.save_image_versions2(
+        {
+            'id': '1',
+            'image_versions2': {
+                'candidates': [{
+                    'url': 'https://example.com/image',
+                    'width': 1,
+                    'height': 1
+                }]
+            }
+        }, 1)
+    assert client.stats.latencies['cdn_head'].count == 1
+    assert client.stats.latencies['cdn_get'].bytes_transferred == 4
+
+
+@pytest.mark.parametrize('linked', [True, False])
+async def test_save_image_versions2_uses_media_store(client: MagicMock, mocker: MockerFixture,
+                                                     tmp_path: Path, *, linked: bool) -> None:
+    client.layout = OutputLayout('flat', tmp_path / 'out')
+    client.media_store = ContentStore(tmp_path / 'store')
+    if not linked:
+        mocker.patch('instagram_archiver.store.Path.hardlink_to', side_effect=OSError)
+    mocker.patch.object(client, 'is_saved', return_value=False)
+    mocker.patch.object(client, 'record_file')
+    mock_write_bytes = mocker.patch('instagram_archiver.client.write_bytes')
+    client.session.head.return_value = MagicMock(status_code=200,
+                                                 headers={'content-type': 'image/jpeg'},
+                                                 url='https://example.com/image')
+    client.session.get.return_value = MagicMock(content=b'data')
+    await client.save_image_versions2(
+        {
+            'id': '1',
+            'image_versions2': {
+                'candidates': [{
+                    'url': 'https://example.com/image',
+                    'width': 1,
+                    'height': 1
+                }]
+            }
+        }, 1)
+    saved = tmp_path / 'out' / '1.jpg'
+    assert saved.read_bytes() == b'data'
+    assert (saved.stat().st_mtime == 1) is not linked
+    mock_write_bytes.assert_not_called()
+
+
+async def test_save_image_versions2_uses_layout(client: MagicMock, mocker: MockerFixture,
+                                                tmp_path: Path) -> None:
+    client.layout = OutputLayout('date', tmp_path)
+    mocker.patch.object(client, 'is_saved', return_value=False)
+    mock_record_file = mocker.patch.object(client, 'record_file')
+    client.session.head.return_value = MagicMock(status_code=200,
+                                                 headers={'content-type': 'image/jpeg'},
+                                                 url='https://example.com/image')
+    client.session.get.return_value = MagicMock(content=b'data')
+    await client.save_image_versions2(
+        {
+            'id': '1',
+            'image_versions2': {
+                'candidates': [{
+                    'url': 'https://example.com/image',
+                    'width': 1,
+                    'height': 1
+                }]
+            }
+        }, 1234567890)
+    saved = tmp_path / '2009' / '02' / '1.jpg'
+    assert saved.read_bytes() == b'data'
+    assert saved.stat().st_mtime == 1234567890
+    mock_record_file.assert_called_once_with(saved, b'data')
+
+
+async def test_measure_counts_in_flight_and_failures(client: MagicMock) -> None:
+    client.stats = Stats()
+    client.session.get.side_effect = HTTPError
+    with pytest.raises(HTTPError):
+        await client.get_json('https://example.com', cast_to=list, endpoint='comments')
+    assert client.stats.in_flight == 0
+    assert client.stats.errors == 1
+
+
+async def test_enqueue_failures(client: MagicMock) -> None:
+    client.session.cookies.get.return_value = 'token'
+    image_q: asyncio.Queue[Any] = asyncio.Queue()
+    comments_q: asyncio.Queue[Any] = asyncio.Queue()
+    video_q: asyncio.Queue[Any] = asyncio.Queue()
+    state = YTDLPState()
+    await client.enqueue_failures(
+        {
+            'media:1': {
+                'error': 'boom',
+                'kind': 'media',
+                'payload': '{"node": {"id": "1"}}'
+            },
+            'comments:1': {
+                'error': 'boom',
+                'kind': 'comments',
+                'payload': '{"node": {"id": "1"}}'
+            },
+            'video:https://example.com/v': {
+                'error': 'boom',
+                'kind': 'video',
+                'payload': 'https://example.com/v'
+            }
+        },
+        image_q,
+        comments_q,
+        video_q,
+        yt_dlp_state=state)
+    assert image_q.get_nowait() == {'node': {'id': '1'}}
+    assert comments_q.get_nowait() == {'node': {'id': '1'}}
+    assert video_q.get_nowait() == 'https://example.com/v'
+    assert state.total_urls == 1
+    assert client.session.headers.update.call_args[0][0] == {'x-csrftoken': 'token'}
+
+
+async def test_enqueue_failures_merges_failed_urls(client: MagicMock) -> None:
+    client.session.cookies.get.return_value = 'token'
+    image_q: asyncio.Queue[Any] = asyncio.Queue()
+    comments_q: asyncio.Queue[Any] = asyncio.Queue()
+    video_q: asyncio.Queue[Any] = asyncio.Queue()
+    await client.enqueue_failures(
+        {
+            'video:https://example.com/a': {
+                'error': 'boom',
+                'kind': 'video',
+                'payload': 'https://example.com/a'
+            }
+        },
+        image_q,
+        comments_q,
+        video_q,
+        failed_urls=('https://example.com/a', 'https://example.com/b'))
+    assert video_q.get_nowait() == 'https://example.com/a'
+    assert video_q.get_nowait() == 'https://example.com/b'
+    assert video_q.empty()
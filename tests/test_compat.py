@@ -1,31 +1,110 @@
 from __future__ import annotations
 
 from pathlib import Path
+from typing import TYPE_CHECKING
+import asyncio
 
-from instagram_archiver.compat import chdir
+from instagram_archiver.compat import (
+    HAS_ZSTD,
+    UnsupportedCompressionError,
+    chdir,
+    gather_or_cancel,
+    zstd_compress,
+    zstd_decompress,
+)
 import pytest
 
+if TYPE_CHECKING:
+    from pytest_mock import MockerFixture
 
-def test_chdir_changes_working_directory(tmp_path: Path) -> None:
-    original = Path.cwd()
-    nested = tmp_path / 'nested'
-    nested.mkdir()
-    with chdir(nested):
-        assert Path.cwd() == nested
-    assert Path.cwd() == original
 
+async def test_gather_or_cancel_runs_concurrently() -> None:
+    first_started = asyncio.Event()
+    order: list[str] = []
 
-def test_chdir_restores_after_exception(tmp_path: Path) -> None:
-    original = Path.cwd()
-    nested = tmp_path / 'nested'
-    nested.mkdir()
+    async def first() -> None:
+        first_started.set()
+        await asyncio.sleep(0)
+        order.append('first')
 
-    def boom_in_chdir() -> None:
-        with chdir(nested):
-            assert Path.cwd() == nested
-            msg = 'boom'
-            raise RuntimeError(msg)
+    async def second() -> None:
+        await first_started.wait()
+        order.append('second')
+
+    await gather_or_cancel(first(), second())
+    await gather_or_cancel()
+    assert sorted(order) == ['first', 'second']
+
+
+async def test_gather_or_cancel_cancels_siblings_on_failure() -> None:
+    cancelled = asyncio.Event()
+
+    async def slow() -> None:
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    async def failing() -> None:
+        await asyncio.sleep(0)
+        msg = 'boom'
+        raise RuntimeError(msg)
 
     with pytest.raises(RuntimeError, match='boom'):
-        boom_in_chdir()
-    assert Path.cwd() == original
+        await gather_or_cancel(slow(), failing())
+    assert cancelled.is_set()
+
+
+async def test_gather_or_cancel_propagates_cancellation() -> None:
+    started = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def slow() -> None:
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    task = asyncio.create_task(gather_or_cancel(slow()))
+    await started.wait()
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert cancelled.is_set()
+
+
+async def test_gather_or_cancel_ignores_task_cancelled_from_outside() -> None:
+    done: list[str] = []
+
+    async def cancelled() -> None:
+        raise asyncio.CancelledError
+
+    async def other() -> None:
+        await asyncio.sleep(0)
+        done.append('other')
+
+    await gather_or_cancel(cancelled(), other())
+    assert done == ['other']
+
+
+@pytest.mark.skipif(not HAS_ZSTD, reason='Needs Zstandard support')
+def test_zstd_round_trip() -> None:
+    assert zstd_decompress(zstd_compress(b'data')) == b'data'
+
+
+def test_zstd_unavailable(mocker: MockerFixture) -> None:
+    mocker.patch('instagram_archiver.compat._ZSTD_MODULE', new=None)
+    with pytest.raises(UnsupportedCompressionError, match=r'backports\.zstd'):
+        zstd_compress(b'data')
+    with pytest.raises(UnsupportedCompressionError, match=r'backports\.zstd'):
+        zstd_decompress(b'data')
+
+
+def test_chdir_is_deprecated(tmp_path: Path) -> None:
+    cwd = Path.cwd()
+    with pytest.warns(DeprecationWarning, match='deprecated'), chdir(tmp_path):
+        assert Path.cwd() == tmp_path.resolve()
+    assert Path.cwd() == cwd
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from instagram_archiver.dedup import LogDB, clean_url
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+def test_clean_url() -> None:
+    assert clean_url('https://example.com/a/b.jpg?x=1#y') == 'https://example.com/a/b.jpg'
+
+
+def test_log_db_round_trip(tmp_path: Path) -> None:
+    db = LogDB(tmp_path / '.log.db')
+    assert db.is_saved('https://example.com/a?x=1') is False
+    db.save('https://example.com/a?x=2')
+    assert db.is_saved('https://example.com/a') is True
+    db.close()
+
+
+def test_log_db_highlight_watermarks(tmp_path: Path) -> None:
+    db = LogDB(tmp_path / '.log.db')
+    assert db.highlight_watermark('1') is None
+    db.save_highlight_watermark('1', '100:3')
+    db.save_highlight_watermark('1', '200:4')
+    db.close()
+    db = LogDB(tmp_path / '.log.db')
+    assert db.highlight_watermark('1') == '200:4'
+    db.close()
+
+
+def test_log_db_highlight_watermarks_disabled(tmp_path: Path) -> None:
+    db = LogDB(tmp_path / '.log.db', disabled=True)
+    db.save_highlight_watermark('1', '100:3')
+    assert db.highlight_watermark('1') is None
+    db.close()
+
+
+def test_log_db_http_cache(tmp_path: Path) -> None:
+    db = LogDB(tmp_path / '.log.db')
+    assert db.http_cache_entry('profile_pic.jpg') is None
+    db.save_http_cache_entry('profile_pic.jpg', {
+        'digest': 'a',
+        'etag': None,
+        'last_modified': None
+    })
+    db.save_http_cache_entry('profile_pic.jpg', {
+        'digest': 'b',
+        'etag': '"e"',
+        'last_modified': 'Mon, 01 Jan 2024 00:00:00 GMT'
+    })
+    db.close()
+    db = LogDB(tmp_path / '.log.db')
+    assert db.http_cache_entry('profile_pic.jpg') == {
+        'digest': 'b',
+        'etag': '"e"',
+        'last_modified': 'Mon, 01 Jan 2024 00:00:00 GMT'
+    }
+    db.close()
+
+
+def test_log_db_http_cache_disabled(tmp_path: Path) -> None:
+    db = LogDB(tmp_path / '.log.db', disabled=True)
+    db.save_http_cache_entry('profile_pic.jpg', {
+        'digest': 'a',
+        'etag': None,
+        'last_modified': None
+    })
+    assert db.http_cache_entry('profile_pic.jpg') is None
+    db.close()
+
+
+def test_log_db_failures(tmp_path: Path) -> None:
+    db = LogDB(tmp_path / '.log.db')
+    assert db.failures() == {}
+    db.save_failures({
+        'video:https://example.com/v': {
+            'error': 'boom',
+            'kind': 'video',
+            'payload': 'https://example.com/v'
+        },
+        'media:1': {
+            'error': 'boom',
+            'kind': 'media',
+            'payload': '{}'
+        }
+    })
+    db.close()
+    db = LogDB(tmp_path / '.log.db')
+    assert set(db.failures()) == {'video:https://example.com/v', 'media:1'}
+    db.remove_failures(('media:1',))
+    assert db.failures() == {
+        'video:https://example.com/v': {
+            'error': 'boom',
+            'kind': 'video',
+            'payload': 'https://example.com/v'
+        }
+    }
+    db.close()
+
+
+def test_log_db_failures_disabled(tmp_path: Path) -> None:
+    db = LogDB(tmp_path / '.log.db', disabled=True)
+    db.save_failures({'media:1': {'error': 'boom', 'kind': 'media', 'payload': '{}'}})
+    db.remove_failures(('media:1',))
+    assert db.failures() == {}
+    db.close()
+
+
+def test_log_db_manifest(tmp_path: Path) -> None:
+    db = LogDB(tmp_path / '.log.db')
+    assert db.manifest_entry('1.jpg') is None
+    db.save_manifest_entry('1.jpg', {'digest': 'abc', 'media_id': '1', 'size': 3})
+    db.save_manifest_entry('2009/02/2.json', {'digest': None, 'media_id': '2', 'size': 5})
+    db.close()
+    db = LogDB(tmp_path / '.log.db')
+    assert db.manifest_entry('1.jpg') == {'digest': 'abc', 'media_id': '1', 'size': 3}
+    assert list(db.manifest()) == ['1.jpg', '2009/02/2.json']
+    assert db.manifest('2') == {'2009/02/2.json': {'digest': None, 'media_id': '2', 'size': 5}}
+    db.close()
+
+
+def test_log_db_rename_manifest_entries(tmp_path: Path) -> None:
+    db = LogDB(tmp_path / '.log.db')
+    db.save_manifest_entry('1.jpg', {'digest': 'abc', 'media_id': '1', 'size': 3})
+    db.save_manifest_entry('2.jpg', {'digest': None, 'media_id': '2', 'size': 5})
+    db.rename_manifest_entries({'1.jpg': '2009/02/1.jpg'})
+    assert list(db.manifest()) == ['2.jpg', '2009/02/1.jpg']
+    assert db.manifest_entry('2009/02/1.jpg') == {'digest': 'abc', 'media_id': '1', 'size': 3}
+    db.close()
+
+
+def test_log_db_manifest_disabled(tmp_path: Path) -> None:
+    db = LogDB(tmp_path / '.log.db', disabled=True)
+    db.save_manifest_entry('1.jpg', {'digest': 'abc', 'media_id': '1', 'size': 3})
+    assert db.manifest_entry('1.jpg') is None
+    assert db.manifest() == {}
+    db.close()
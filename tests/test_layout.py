@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import TYPE_CHECKING
+import hashlib
+import os
+
+from instagram_archiver.dedup import LogDB
+from instagram_archiver.layout import OutputLayout, media_id_of
+import pytest
+
+if TYPE_CHECKING:
+    from instagram_archiver.layout import LayoutKind
+
+
+@pytest.mark.parametrize(('name', 'expected'), [('123.jpg', '123'), ('123_456.json', '123_456'),
+                                                ('123-media-info-0000.json', '123'),
+                                                ('123_456-comments.json', '123_456'),
+                                                ('123-comments.json.gz', '123'),
+                                                ('123.json.zst', '123'),
+                                                ('web_profile_info.json', None),
+                                                ('profile_pic.jpg', None), ('failed.txt', None),
+                                                ('Video title [Cabc123].mp4', None)])
+def test_media_id_of(name: str, expected: str | None) -> None:
+    assert media_id_of(name) == expected
+
+
+@pytest.mark.parametrize(('kind', 'taken_at', 'expected'),
+                         [('flat', 1234567890, Path()), ('date', 1234567890, Path('2009', '02')),
+                          ('date', None, Path('undated')),
+                          ('hash', None, Path(hashlib.sha256(b'123').hexdigest()[:2]))])
+def test_output_layout_directory(kind: LayoutKind, taken_at: int | None, expected: Path) -> None:
+    assert OutputLayout(kind).directory('123', taken_at) == expected
+
+
+def test_output_layout_path_creates_directory(tmp_path: Path) -> None:
+    layout = OutputLayout('date', tmp_path)
+    assert layout.path('123.jpg', 1234567890) == tmp_path / '2009' / '02' / '123.jpg'
+    assert (tmp_path / '2009' / '02').is_dir()
+    assert layout.path('123-comments.json',
+                       1234567890) == tmp_path / '2009' / '02' / '123-comments.json'
+
+
+def test_output_layout_path_keeps_profile_files_at_root(tmp_path: Path) -> None:
+    layout = OutputLayout('hash', tmp_path)
+    assert layout.path('web_profile_info.json') == tmp_path / 'web_profile_info.json'
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_output_layout_migrate_flat_to_date(tmp_path: Path) -> None:
+    for name in ('123.json', '123-media-info-0000.json', '123-comments.json', '123_9.jpg',
+                 'web_profile_info.json'):
+        (tmp_path / name).write_text(name)
+    LogDB(tmp_path / '.log.db').close()
+    os.utime(tmp_path / '123.json', (1234567890, 1234567890))
+    os.utime(tmp_path / '123_9.jpg', (1234567890, 1234567890))
+    assert OutputLayout('date', tmp_path).migrate() == 4
+    shard = tmp_path / '2009' / '02'
+    assert sorted(path.name for path in shard.iterdir()) == [
+        '123-comments.json', '123-media-info-0000.json', '123.json', '123_9.jpg'
+    ]
+    assert (tmp_path / 'web_profile_info.json').is_file()
+    assert (tmp_path / '.log.db').is_file()
+
+
+def test_output_layout_migrate_moves_manifest_entries(tmp_path: Path) -> None:
+    (tmp_path / 'custom').mkdir()
+    (tmp_path / '123.jpg').write_bytes(b'jpg')
+    db = LogDB(tmp_path / 'custom' / 'log.db')
+    db.save_manifest_entry('123.jpg', {'digest': None, 'media_id': '123', 'size': 3})
+    db.close()
+    assert OutputLayout('hash', tmp_path).migrate(tmp_path / 'custom' / 'log.db') == 1
+    db = LogDB(tmp_path / 'custom' / 'log.db')
+    assert set(db.manifest()) == {f'{hashlib.sha256(b"123").hexdigest()[:2]}/123.jpg'}
+    db.close()
+    assert not (tmp_path / '.log.db').exists()
+
+
+def test_output_layout_migrate_reads_time_of_compressed_json(tmp_path: Path) -> None:
+    for name in ('123.json.gz', '123-comments.json.gz'):
+        (tmp_path / name).write_bytes(b'')
+    os.utime(tmp_path / '123.json.gz', (1234567890, 1234567890))
+    assert OutputLayout('date', tmp_path).migrate() == 2
+    assert (tmp_path / '2009' / '02' / '123-comments.json.gz').is_file()
+
+
+def test_output_layout_migrate_between_layouts_removes_empty_directories(tmp_path: Path) -> None:
+    shard = tmp_path / '2009' / '02'
+    shard.mkdir(parents=True)
+    (shard / '123.jpg').write_bytes(b'image')
+    (tmp_path / 'unrelated').mkdir()
+    assert OutputLayout('hash', tmp_path).migrate() == 1
+    assert (tmp_path / hashlib.sha256(b'123').hexdigest()[:2] / '123.jpg').read_bytes() == b'image'
+    assert not (tmp_path / '2009').exists()
+    assert (tmp_path / 'unrelated').is_dir()
+    assert OutputLayout('flat', tmp_path).migrate() == 1
+    assert (tmp_path / '123.jpg').is_file()
+
+
+def test_output_layout_migrate_keeps_file_if_target_exists(tmp_path: Path) -> None:
+    (tmp_path / 'undated').mkdir()
+    (tmp_path / 'undated' / '123.jpg').write_bytes(b'new')
+    (tmp_path / '123.jpg').write_bytes(b'old')
+    assert OutputLayout('flat', tmp_path).migrate() == 0
+    assert (tmp_path / '123.jpg').read_bytes() == b'old'
+    assert (tmp_path / 'undated' / '123.jpg').read_bytes() == b'new'
@@ -5,11 +5,14 @@ from types import SimpleNamespace
 from typing import TYPE_CHECKING, Any
 from unittest.mock import AsyncMock
 import asyncio
+import json
 import os
+import pstats
 import signal
 
 from instagram_archiver.client import UnexpectedRedirect
-from instagram_archiver.main import main
+from instagram_archiver.main import main, migrate_layout_main, verify_main
+from instagram_archiver.utils import write_sync
 from typing_extensions import Self
 import click
 import pytest
@@ -644,3 +647,352 @@ def test_main_e2e_windows_signal_handler_restore_value_error(runner: CliRunner,
     mocker.patch('instagram_archiver.main.signal.signal', side_effect=_maybe_raise)
     result = runner.invoke(main, ['-q', '-o', str(tmp_path), 'tu'])
     assert result.exit_code == 0
+
+
+def test_main_e2e_prints_request_summary(runner: CliRunner, mocker: MockerFixture,
+                                         tmp_path: Path) -> None:
+    """Recorded request timings are summarised on stderr when the run finishes."""
+    mocker.patch('instagram_archiver.main.setup_logging')
+
+    async def _observe(scraper: _FakeScraper, ydl: Any, **kwargs: Any) -> None:
+        del scraper, ydl
+        kwargs['stats'].observe_request('graphql', 0.2, 100)
+
+    _install_fake_scraper(mocker, 'ProfileScraper', process_impl=_observe)
+    _patch_yt_dlp(mocker)
+    _patch_status_display(mocker)
+    result = runner.invoke(main, ['-o', str(tmp_path), 'tu'])
+    assert result.exit_code == 0
+    assert 'Request summary:' in result.output
+    assert 'graphql: 1 req, p50 200ms' in result.output
+
+
+def test_main_e2e_quiet_skips_request_summary(runner: CliRunner, mocker: MockerFixture,
+                                              tmp_path: Path) -> None:
+    mocker.patch('instagram_archiver.main.setup_logging')
+
+    async def _observe(scraper: _FakeScraper, ydl: Any, **kwargs: Any) -> None:
+        del scraper, ydl
+        kwargs['stats'].observe_request('graphql', 0.2, 100)
+
+    _install_fake_scraper(mocker, 'ProfileScraper', process_impl=_observe)
+    _patch_yt_dlp(mocker)
+    result = runner.invoke(main, ['-q', '-o', str(tmp_path), 'tu'])
+    assert result.exit_code == 0
+    assert 'Request summary:' not in result.output
+
+
+def test_main_e2e_metrics_file_jsonl(runner: CliRunner, mocker: MockerFixture,
+                                     tmp_path: Path) -> None:
+    """``--metrics-file`` writes periodic snapshots plus a final one when the run ends."""
+    mocker.patch('instagram_archiver.main.setup_logging')
+
+    async def _wait(scraper: _FakeScraper, ydl: Any, **kwargs: Any) -> None:
+        del scraper, ydl, kwargs
+        await asyncio.sleep(0.1)
+
+    _install_fake_scraper(mocker, 'ProfileScraper', process_impl=_wait)
+    _patch_yt_dlp(mocker)
+    metrics_file = tmp_path / 'metrics.jsonl'
+    result = runner.invoke(main, [
+        '-q', '-o',
+        str(tmp_path), '--metrics-file',
+        str(metrics_file), '--metrics-interval', '0.02', 'tu'
+    ])
+    assert result.exit_code == 0
+    lines = metrics_file.read_text(encoding='utf-8').splitlines()
+    assert len(lines) >= 2
+    assert 'queues' in json.loads(lines[-1])
+
+
+def test_main_e2e_metrics_file_single_final_snapshot(runner: CliRunner, mocker: MockerFixture,
+                                                     tmp_path: Path) -> None:
+    mocker.patch('instagram_archiver.main.setup_logging')
+    _install_fake_scraper(mocker, 'ProfileScraper')
+    _patch_yt_dlp(mocker)
+    metrics_file = tmp_path / 'metrics.jsonl'
+    result = runner.invoke(
+        main, ['-q', '-o', str(tmp_path), '--metrics-file',
+               str(metrics_file), 'tu'])
+    assert result.exit_code == 0
+    assert len(metrics_file.read_text(encoding='utf-8').splitlines()) == 1
+
+
+def test_main_e2e_metrics_file_written_when_cancelled(runner: CliRunner, mocker: MockerFixture,
+                                                      tmp_path: Path) -> None:
+    mocker.patch('instagram_archiver.main.setup_logging')
+
+    async def _cancelled(scraper: _FakeScraper, ydl: Any, **kwargs: Any) -> None:
+        del scraper, ydl, kwargs
+        raise asyncio.CancelledError
+
+    _install_fake_scraper(mocker, 'ProfileScraper', process_impl=_cancelled)
+    _patch_yt_dlp(mocker)
+    metrics_file = tmp_path / 'metrics.jsonl'
+    with pytest.raises(asyncio.CancelledError):
+        runner.invoke(main, ['-q', '-o', str(tmp_path), '--metrics-file', str(metrics_file), 'tu'])
+    assert len(metrics_file.read_text(encoding='utf-8').splitlines()) == 1
+
+
+def test_main_e2e_metrics_file_prometheus(runner: CliRunner, mocker: MockerFixture,
+                                          tmp_path: Path) -> None:
+    mocker.patch('instagram_archiver.main.setup_logging')
+    _install_fake_scraper(mocker, 'SavedScraper')
+    _patch_yt_dlp(mocker)
+    metrics_file = tmp_path / 'metrics.prom'
+    result = runner.invoke(main, [
+        '-q', '-s', '-o',
+        str(tmp_path), '--metrics-file',
+        str(metrics_file), '--metrics-format', 'prometheus'
+    ])
+    assert result.exit_code == 0
+    assert 'instagram_archiver_run_duration_seconds' in metrics_file.read_text(encoding='utf-8')
+
+
+def test_main_e2e_profile_output_text(runner: CliRunner, mocker: MockerFixture,
+                                      tmp_path: Path) -> None:
+    mocker.patch('instagram_archiver.main.setup_logging')
+
+    async def _record_span(scraper: _FakeScraper, ydl: Any, **kwargs: Any) -> None:
+        del scraper, ydl
+        with kwargs['stats'].span('save_media'):
+            await asyncio.sleep(0)
+
+    _install_fake_scraper(mocker, 'ProfileScraper', process_impl=_record_span)
+    _patch_yt_dlp(mocker)
+    report = tmp_path / 'profile.txt'
+    result = runner.invoke(main, ['-o', str(tmp_path), '--profile-output', str(report), 'tu'])
+    assert result.exit_code == 0
+    assert 'function calls' in report.read_text(encoding='utf-8')
+    assert 'save_media span: 1 calls' in result.output
+
+
+def test_main_e2e_profile_output_pstats(runner: CliRunner, mocker: MockerFixture,
+                                        tmp_path: Path) -> None:
+    mocker.patch('instagram_archiver.main.setup_logging')
+    _install_fake_scraper(mocker, 'SavedScraper')
+    _patch_yt_dlp(mocker)
+    report = tmp_path / 'run.prof'
+    result = runner.invoke(main, ['-q', '-s', '-o', str(tmp_path), '--profile-output', str(report)])
+    assert result.exit_code == 0
+    assert pstats.Stats(str(report)).get_stats_profile().func_profiles
+
+
+@pytest.mark.parametrize(('args', 'target'), [(('tu',), 'ProfileScraper'),
+                                              (('-s',), 'SavedScraper')])
+def test_main_e2e_media_store(runner: CliRunner, mocker: MockerFixture, tmp_path: Path,
+                              args: tuple[str, ...], target: str) -> None:
+    mocker.patch('instagram_archiver.main.setup_logging')
+    fake_cls = _install_fake_scraper(mocker, target)
+    _patch_yt_dlp(mocker)
+    store = str(tmp_path / 'store')
+    result = runner.invoke(main, ['-q', '-o', str(tmp_path), '--media-store', store, *args])
+    assert result.exit_code == 0
+    assert fake_cls.instances[0].kwargs['media_store'] == store
+
+
+@pytest.mark.parametrize(('args', 'target'), [(('tu',), 'ProfileScraper'),
+                                              (('-s',), 'SavedScraper')])
+def test_main_e2e_catalogue(runner: CliRunner, mocker: MockerFixture, tmp_path: Path,
+                            args: tuple[str, ...], target: str) -> None:
+    mocker.patch('instagram_archiver.main.setup_logging')
+    fake_cls = _install_fake_scraper(mocker, target)
+    _patch_yt_dlp(mocker)
+    catalogue = str(tmp_path / 'catalogue.db')
+    result = runner.invoke(main, ['-q', '-o', str(tmp_path), '--catalogue', catalogue, *args])
+    assert result.exit_code == 0
+    assert fake_cls.instances[0].kwargs['catalogue'] == catalogue
+
+
+@pytest.mark.parametrize(('args', 'target'), [(('tu',), 'ProfileScraper'),
+                                              (('-s',), 'SavedScraper')])
+def test_main_e2e_json_format(runner: CliRunner, mocker: MockerFixture, tmp_path: Path,
+                              args: tuple[str, ...], target: str) -> None:
+    mocker.patch('instagram_archiver.main.setup_logging')
+    fake_cls = _install_fake_scraper(mocker, target)
+    _patch_yt_dlp(mocker)
+    result = runner.invoke(main, ['-q', '-o', str(tmp_path), '--json-format', 'gzip', *args])
+    assert result.exit_code == 0
+    assert fake_cls.instances[0].kwargs['json_format'] == 'gzip'
+
+
+def test_main_json_format_zstd_unavailable(runner: CliRunner, mocker: MockerFixture) -> None:
+    mocker.patch('instagram_archiver.main.HAS_ZSTD', new=False)
+    result = runner.invoke(main, ['--json-format', 'zstd', 'tu'])
+    assert result.exit_code != 0
+    assert '--json-format zstd requires Python 3.14 or newer' in result.output
+
+
+@pytest.mark.parametrize(('args', 'target'), [(('tu',), 'ProfileScraper'),
+                                              (('-s',), 'SavedScraper')])
+def test_main_e2e_layout(runner: CliRunner, mocker: MockerFixture, tmp_path: Path,
+                         args: tuple[str, ...], target: str) -> None:
+    mocker.patch('instagram_archiver.main.setup_logging')
+    fake_cls = _install_fake_scraper(mocker, target)
+    _patch_yt_dlp(mocker)
+    result = runner.invoke(main, ['-q', '-o', str(tmp_path), '--layout', 'hash', *args])
+    assert result.exit_code == 0
+    assert fake_cls.instances[0].kwargs['layout'] == 'hash'
+
+
+def test_migrate_layout_main(runner: CliRunner, mocker: MockerFixture, tmp_path: Path) -> None:
+    mocker.patch('instagram_archiver.main.setup_logging')
+    (tmp_path / '123.json').write_text('{}')
+    os.utime(tmp_path / '123.json', (1234567890, 1234567890))
+    result = runner.invoke(migrate_layout_main, ['--layout', 'date', str(tmp_path)])
+    assert result.exit_code == 0
+    assert result.output == 'Moved 1 file(s).\n'
+    assert (tmp_path / '2009' / '02' / '123.json').is_file()
+
+
+def test_verify_main(runner: CliRunner, mocker: MockerFixture, tmp_path: Path) -> None:
+    mocker.patch('instagram_archiver.main.setup_logging')
+    mock_verify = mocker.patch('instagram_archiver.main.verify_archive')
+    mock_verify.return_value.checked = 3
+    mock_verify.return_value.problems = {'1.jpg': 'missing'}
+    mock_verify.return_value.requeued = ['media:1']
+    mock_verify.return_value.unchecked = ['2.json.zst']
+    mock_verify.return_value.quarantined = ['1.jpg']
+    result = runner.invoke(verify_main, ['-j', '2', '--no-requeue', str(tmp_path)])
+    assert result.exit_code == 1
+    assert result.output == ('1.jpg: missing\n'
+                             '2.json.zst: cannot be checked on this Python\n'
+                             'Checked 3 file(s), found 1 problem(s).\n'
+                             f'Moved 1 damaged file(s) to {tmp_path / ".quarantine"}.\n'
+                             'Queued 1 item(s). Run with --retry-failed to download them again.\n')
+    mock_verify.assert_called_once_with(str(tmp_path), jobs=2, log_file=None, requeue=False)
+
+
+def test_verify_main_clean(runner: CliRunner, mocker: MockerFixture, tmp_path: Path) -> None:
+    mocker.patch('instagram_archiver.main.setup_logging')
+    result = runner.invoke(verify_main, ['-j', '1', str(tmp_path)])
+    assert result.exit_code == 0
+    assert result.output == 'Checked 0 file(s), found 0 problem(s).\n'
+
+
+@pytest.mark.parametrize(('args', 'target'), [(('tu',), 'ProfileScraper'),
+                                              (('-s',), 'SavedScraper')])
+def test_main_e2e_response_cache(runner: CliRunner, mocker: MockerFixture, tmp_path: Path,
+                                 args: tuple[str, ...], target: str) -> None:
+    mocker.patch('instagram_archiver.main.setup_logging')
+    fake_cls = _install_fake_scraper(mocker, target)
+    _patch_yt_dlp(mocker)
+    result = runner.invoke(main, [
+        '-q', '-o',
+        str(tmp_path), '--response-cache',
+        str(tmp_path / 'cache'), '--response-cache-ttl', '60', '--response-cache-size', '2', *args
+    ])
+    assert result.exit_code == 0
+    cache = fake_cls.instances[0].kwargs['response_cache']
+    assert cache.root == tmp_path / 'cache'
+    assert cache.ttl == 60
+    assert cache.max_bytes == 2 * 1024 * 1024
+
+
+def test_main_e2e_no_response_cache(runner: CliRunner, mocker: MockerFixture,
+                                    tmp_path: Path) -> None:
+    mocker.patch('instagram_archiver.main.setup_logging')
+    fake_cls = _install_fake_scraper(mocker, 'ProfileScraper')
+    _patch_yt_dlp(mocker)
+    result = runner.invoke(main, ['-q', '-o', str(tmp_path), 'tu'])
+    assert result.exit_code == 0
+    assert fake_cls.instances[0].kwargs['response_cache'] is None
+
+
+@pytest.mark.parametrize(('args', 'target'), [(('tu',), 'ProfileScraper'),
+                                              (('-s',), 'SavedScraper')])
+def test_main_e2e_retry_policy(runner: CliRunner, mocker: MockerFixture, tmp_path: Path,
+                               args: tuple[str, ...], target: str) -> None:
+    mocker.patch('instagram_archiver.main.setup_logging')
+    fake_cls = _install_fake_scraper(mocker, target)
+    _patch_yt_dlp(mocker)
+    result = runner.invoke(
+        main,
+        ['-q', '-o', str(tmp_path), '--max-retries', '2', '--retry-budget', '7', *args])
+    assert result.exit_code == 0
+    policy = fake_cls.instances[0].kwargs['retry_policy']
+    assert policy.max_retries == 2
+    assert policy.budget == 7
+
+
+@pytest.mark.parametrize(('args', 'target'), [(('tu',), 'ProfileScraper'),
+                                              (('-s',), 'SavedScraper')])
+def test_main_e2e_deferred_retries(runner: CliRunner, mocker: MockerFixture, tmp_path: Path,
+                                   args: tuple[str, ...], target: str) -> None:
+    mocker.patch('instagram_archiver.main.setup_logging')
+    process_kwargs: list[dict[str, Any]] = []
+
+    async def _record_kwargs(scraper: _FakeScraper, ydl: Any, **kwargs: Any) -> None:
+        del scraper, ydl
+        process_kwargs.append(kwargs)
+
+    fake_cls = _install_fake_scraper(mocker, target, process_impl=_record_kwargs)
+    _patch_yt_dlp(mocker)
+    result = runner.invoke(main, [
+        '-q', '-o',
+        str(tmp_path), '--deferred-retries', '3', '--retry-cool-down', '5', '--retry-failed', *args
+    ])
+    assert result.exit_code == 0
+    retries = fake_cls.instances[0].kwargs['deferred_retries']
+    assert retries.attempts == 3
+    assert retries.cool_down == 5
+    assert process_kwargs[0]['retry_failed'] is True
+
+
+@pytest.mark.parametrize('args', [(), ('--deferred-retries', '0')])
+def test_main_e2e_deferred_retries_disabled(runner: CliRunner, mocker: MockerFixture,
+                                            tmp_path: Path, args: tuple[str, ...]) -> None:
+    mocker.patch('instagram_archiver.main.setup_logging')
+    fake_cls = _install_fake_scraper(mocker, 'ProfileScraper')
+    _patch_yt_dlp(mocker)
+    result = runner.invoke(main, ['-q', '-o', str(tmp_path), *args, 'tu'])
+    assert result.exit_code == 0
+    assert fake_cls.instances[0].kwargs['deferred_retries'] is None
+
+
+def test_main_e2e_retry_failed_without_log(runner: CliRunner, mocker: MockerFixture,
+                                           tmp_path: Path) -> None:
+    mocker.patch('instagram_archiver.main.setup_logging')
+    process_kwargs: list[dict[str, Any]] = []
+
+    async def _record_kwargs(scraper: _FakeScraper, ydl: Any, **kwargs: Any) -> None:
+        del scraper, ydl
+        process_kwargs.append(kwargs)
+
+    fake_cls = _install_fake_scraper(mocker, 'ProfileScraper', process_impl=_record_kwargs)
+    _patch_yt_dlp(mocker)
+    result = runner.invoke(main, ['-q', '-o', str(tmp_path), '--retry-failed', '--no-log', 'tu'])
+    assert result.exit_code == 0
+    assert fake_cls.instances[0].kwargs['disable_log'] is True
+    assert process_kwargs[0]['retry_failed'] is True
+
+
+def test_main_e2e_fsync(runner: CliRunner, mocker: MockerFixture, tmp_path: Path) -> None:
+    mocker.patch('instagram_archiver.main.setup_logging')
+    fake_cls = _install_fake_scraper(mocker, 'ProfileScraper')
+    _patch_yt_dlp(mocker)
+    result = runner.invoke(main, ['-q', '-o', str(tmp_path), '--fsync', 'always', 'tu'])
+    assert result.exit_code == 0
+    assert fake_cls.instances[0].kwargs['fsync'] == 'always'
+    assert write_sync.policy == 'batch'
+
+
+def test_main_e2e_reel_concurrency(runner: CliRunner, mocker: MockerFixture,
+                                   tmp_path: Path) -> None:
+    mocker.patch('instagram_archiver.main.setup_logging')
+    fake_cls = _install_fake_scraper(mocker, 'ProfileScraper')
+    _patch_yt_dlp(mocker)
+    result = runner.invoke(main, ['-q', '-o', str(tmp_path), '--reel-concurrency', '4', 'tu'])
+    assert result.exit_code == 0
+    assert fake_cls.instances[0].kwargs['reel_concurrency'] == 4
+    assert fake_cls.instances[0].kwargs['timeline_page_size'] is None
+
+
+def test_main_e2e_timeline_page_size(runner: CliRunner, mocker: MockerFixture,
+                                     tmp_path: Path) -> None:
+    mocker.patch('instagram_archiver.main.setup_logging')
+    fake_cls = _install_fake_scraper(mocker, 'ProfileScraper')
+    _patch_yt_dlp(mocker)
+    result = runner.invoke(main, ['-q', '-o', str(tmp_path), '--timeline-page-size', '30', 'tu'])
+    assert result.exit_code == 0
+    assert fake_cls.instances[0].kwargs['timeline_page_size'] == 30
@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+import asyncio
+import cProfile
+import json
+import stat
+
+from instagram_archiver.metrics import (
+    GaugeSample,
+    LatencyHistogram,
+    MetricsWriter,
+    RequestSample,
+    WorkerUtilisation,
+    format_bytes,
+    format_prometheus,
+    format_seconds,
+    write_profile_report,
+)
+from instagram_archiver.typing import (
+    LATENCY_STATUS,
+    POSTS_HANDLED,
+    QUEUES_STATUS,
+    TRANSFER_STATUS,
+    Stats,
+)
+import pytest
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from pytest_mock import MockerFixture
+
+
+def test_format_seconds() -> None:
+    assert format_seconds(0.1234) == '123ms'
+    assert format_seconds(2.54) == '2.5s'
+
+
+def test_format_bytes() -> None:
+    assert format_bytes(512) == '512 B'
+    assert format_bytes(1536) == '1.5 KiB'
+    assert format_bytes(3 * 1024 ** 2) == '3.0 MiB'
+    assert format_bytes(2 * 1024 ** 4) == '2.0 TiB'
+
+
+def test_latency_histogram_empty() -> None:
+    histogram = LatencyHistogram()
+    assert histogram.mean == pytest.approx(0.0)
+    assert histogram.quantile(0.5) == pytest.approx(0.0)
+
+
+def test_latency_histogram_quantiles() -> None:
+    histogram = LatencyHistogram()
+    for seconds in (0.01, 0.02, 0.03, 0.2, 3.0):
+        histogram.observe(seconds, 10)
+    assert histogram.count == 5
+    assert histogram.bytes_transferred == 50
+    assert histogram.quantile(0.5) == pytest.approx(0.05)
+    assert histogram.quantile(0.95) == pytest.approx(3.0)
+    assert histogram.max == pytest.approx(3.0)
+    assert histogram.mean == pytest.approx(0.652)
+
+
+def test_latency_histogram_overflow_bucket() -> None:
+    histogram = LatencyHistogram()
+    histogram.observe(1000.0)
+    assert histogram.quantile(0.5) == pytest.approx(1000.0)
+    assert histogram.as_dict()['buckets']['+Inf'] == 1
+    assert histogram.as_dict()['buckets']['300.0'] == 0
+
+
+def test_latency_histogram_render() -> None:
+    histogram = LatencyHistogram()
+    histogram.observe(0.2, 2048)
+    assert histogram.render() == '1 req, p50 200ms, p95 200ms, max 200ms, 2.0 KiB'
+
+
+def test_request_sample_ignores_non_bytes() -> None:
+    sample = RequestSample()
+    sample.record(object())
+    sample.record(type('R', (), {'content': b'abc'})())
+    assert sample.nbytes == 3
+
+
+def test_stats_observe_request_updates_status_lines() -> None:
+    stats = Stats()
+    assert stats.summary_lines() == []
+    stats.observe_request('graphql', 0.4, 1024)
+    stats.observe_request('cdn_get', 2.0, 1024)
+    assert stats.bytes_transferred == 2048
+    assert stats[TRANSFER_STATUS] == '2.0 KiB in 2 requests'
+    assert stats[LATENCY_STATUS] == 'cdn_get (p95 2.0s)'
+    assert stats.summary_lines() == [
+        'cdn_get: 1 req, p50 2.0s, p95 2.0s, max 2.0s, 1.0 KiB',
+        'graphql: 1 req, p50 400ms, p95 400ms, max 400ms, 1.0 KiB'
+    ]
+
+
+def test_request_sample_marks_error_status() -> None:
+    sample = RequestSample()
+    sample.record(type('R', (), {'content': b'', 'status_code': 429})())
+    assert sample.failed
+
+
+def test_stats_observe_request_counts_errors() -> None:
+    stats = Stats()
+    stats.observe_request('media_info', 0.1, failed=True)
+    assert stats.errors == 1
+    assert stats.latencies['media_info'].errors == 1
+
+
+async def test_stats_snapshot(mocker: MockerFixture) -> None:
+    mocker.patch('instagram_archiver.typing.monotonic', side_effect=[100.0, 110.0])
+    stats = Stats()
+    queue: asyncio.Queue[int] = asyncio.Queue()
+    await queue.put(1)
+    stats.track_queue('image', queue)
+    stats.increment(POSTS_HANDLED, 20)
+    stats.observe_request('graphql', 0.2, 50)
+    snapshot = stats.snapshot()
+    assert snapshot['elapsed'] == pytest.approx(10.0)
+    assert snapshot['queues'] == {'image': 1}
+    assert snapshot['counters'][POSTS_HANDLED] == 20
+    assert snapshot['throughput'][POSTS_HANDLED] == pytest.approx(2.0)
+    assert snapshot['throughput']['bytes'] == pytest.approx(5.0)
+    assert snapshot['latency']['graphql']['count'] == 1
+    assert snapshot['in_flight'] == 0
+    assert snapshot['retries'] == 0
+
+
+def test_stats_snapshot_zero_elapsed(mocker: MockerFixture) -> None:
+    mocker.patch('instagram_archiver.typing.monotonic', return_value=5.0)
+    stats = Stats()
+    assert stats.snapshot()['throughput']['bytes'] == pytest.approx(0.0)
+
+
+def test_gauge_sample() -> None:
+    sample = GaugeSample()
+    assert sample.mean == pytest.approx(0.0)
+    sample.observe(2)
+    sample.observe(4)
+    assert sample.last == 4
+    assert sample.as_dict() == {'count': 2, 'last': 4, 'max': 4, 'mean': pytest.approx(3.0)}
+    assert sample.render() == 'mean 3.0, max 4'
+
+
+def test_worker_utilisation() -> None:
+    utilisation = WorkerUtilisation()
+    assert utilisation.utilisation == pytest.approx(0.0)
+    utilisation.record(busy=3.0, idle=1.0)
+    utilisation.record(busy=0.0, idle=0.0, item=False)
+    assert utilisation.items == 1
+    assert utilisation.as_dict()['utilisation'] == pytest.approx(0.75)
+    assert utilisation.render() == '75% busy (3.0s busy, 1.0s idle, 1 items)'
+
+
+async def test_stats_sample_queues() -> None:
+    stats = Stats()
+    stats.sample_queues()
+    assert stats[QUEUES_STATUS] is None
+    image_queue: asyncio.Queue[int] = asyncio.Queue()
+    await image_queue.put(1)
+    await image_queue.put(2)
+    stats.track_queue('image', image_queue)
+    stats.track_queue('video', asyncio.Queue())
+    stats.sample_queues()
+    image_queue.get_nowait()
+    stats.sample_queues()
+    assert stats[QUEUES_STATUS] == 'image 1, video 0'
+    assert stats.queue_depths['image'].max == 2
+    stats.worker('image').record(busy=1.0, idle=1.0)
+    snapshot = stats.snapshot()
+    assert snapshot['queue_depths']['image']['mean'] == pytest.approx(1.5)
+    assert snapshot['workers']['image']['utilisation'] == pytest.approx(0.5)
+    assert stats.summary_lines() == [
+        'image queue depth: mean 1.5, max 2', 'video queue depth: mean 0.0, max 0',
+        'image worker: 50% busy (1.0s busy, 1.0s idle, 1 items)'
+    ]
+    text = format_prometheus(snapshot)
+    assert 'instagram_archiver_queue_depth_max{queue="image"} 2' in text
+    assert 'instagram_archiver_worker_busy_seconds_total{worker="image"} 1.0' in text
+    assert 'instagram_archiver_worker_idle_seconds_total{worker="image"} 1.0' in text
+
+
+def test_format_prometheus() -> None:
+    stats = Stats()
+    stats.observe_request('graphql', 0.2, 50)
+    text = format_prometheus(stats.snapshot())
+    assert 'instagram_archiver_items_total{kind="posts_handled"} 0' in text
+    assert ('instagram_archiver_request_duration_seconds_bucket{endpoint="graphql",le="0.25"} 1'
+            in text)
+    assert 'instagram_archiver_request_duration_seconds_count{endpoint="graphql"} 1' in text
+    assert 'instagram_archiver_response_bytes_total{endpoint="graphql"} 50' in text
+    assert 'instagram_archiver_request_errors_total 0' in text
+    assert text.endswith('\n')
+
+
+def test_metrics_writer_jsonl_appends(tmp_path: Path) -> None:
+    target = tmp_path / 'metrics.jsonl'
+    writer = MetricsWriter(target)
+    writer.write({'a': 1})
+    writer.write({'a': 2})
+    lines = target.read_text(encoding='utf-8').splitlines()
+    assert [json.loads(line)['a'] for line in lines] == [1, 2]
+
+
+def test_metrics_writer_prometheus_replaces(tmp_path: Path) -> None:
+    target = tmp_path / 'metrics.prom'
+    writer = MetricsWriter(target, 'prometheus')
+    writer.write(Stats().snapshot())
+    writer.write(Stats().snapshot())
+    text = target.read_text(encoding='utf-8')
+    assert text.count('\ninstagram_archiver_run_duration_seconds ') == 1
+    assert [p.name for p in tmp_path.iterdir()] == ['metrics.prom']
+
+
+def test_metrics_writer_prometheus_uses_umask_permissions(tmp_path: Path) -> None:
+    reference = tmp_path / 'reference'
+    reference.write_bytes(b'')
+    target = tmp_path / 'metrics.prom'
+    MetricsWriter(target, 'prometheus').write(Stats().snapshot())
+    assert stat.S_IMODE(target.stat().st_mode) == stat.S_IMODE(reference.stat().st_mode)
+
+
+def test_metrics_writer_prometheus_cleans_up_on_error(tmp_path: Path,
+                                                      mocker: MockerFixture) -> None:
+    mocker.patch('instagram_archiver.metrics.format_prometheus', side_effect=RuntimeError)
+    writer = MetricsWriter(tmp_path / 'metrics.prom', 'prometheus')
+    with pytest.raises(RuntimeError):
+        writer.write({})
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_stats_spans_disabled_by_default() -> None:
+    stats = Stats()
+    with stats.span('save_media'):
+        pass
+    assert stats.spans is None
+    assert stats.snapshot()['spans'] == {}
+
+
+def test_stats_spans(mocker: MockerFixture) -> None:
+    mocker.patch('instagram_archiver.typing.perf_counter', side_effect=[1.0, 1.5])
+    stats = Stats()
+    stats.enable_spans()
+    stats.enable_spans()
+    with pytest.raises(RuntimeError), stats.span('save_media'):
+        raise RuntimeError
+    assert stats.spans is not None
+    assert stats.spans['save_media'].count == 1
+    assert stats.snapshot()['spans']['save_media']['sum'] == pytest.approx(0.5)
+    assert stats.summary_lines() == ['save_media span: 1 calls, 500ms total, p95 500ms']
+
+
+def test_write_profile_report_text(tmp_path: Path) -> None:
+    profiler = cProfile.Profile()
+    profiler.runcall(sum, (1, 2))
+    write_profile_report(profiler, tmp_path / 'report.txt')
+    assert 'cumulative' in (tmp_path / 'report.txt').read_text(encoding='utf-8')
+
+
+def test_write_profile_report_dump(tmp_path: Path) -> None:
+    profiler = cProfile.Profile()
+    profiler.runcall(sum, (1, 2))
+    write_profile_report(profiler, str(tmp_path / 'report.prof'))
+    assert (tmp_path / 'report.prof').stat().st_size > 0
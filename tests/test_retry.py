@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+from instagram_archiver.retry import RetryPolicy, parse_retry_after
+import pytest
+
+
+def test_parse_retry_after_seconds() -> None:
+    assert parse_retry_after('7') == 7
+    assert parse_retry_after('-1') == 0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('soon') is None
+
+
+def test_parse_retry_after_http_date() -> None:
+    when = datetime.now(timezone.utc) + timedelta(seconds=30)
+    seconds = parse_retry_after(format_datetime(when, usegmt=True))
+    assert seconds is not None
+    assert 25 < seconds <= 30
+
+
+def test_retry_policy_delay_is_jittered_and_capped() -> None:
+    policy = RetryPolicy(base_delay=1, max_delay=4)
+    for attempt in range(6):
+        assert 0 <= policy.delay(attempt) <= min(4, 2 ** attempt)
+    assert policy.delay(0, '120') == 4
+
+
+def test_retry_policy_budgets() -> None:
+    policy = RetryPolicy(budget=3, budgets={'graphql': 10})
+    assert policy.budget_for('graphql') == 10
+    assert policy.budget_for('comments') == 3
+
+
+def test_retry_policy_is_frozen() -> None:
+    with pytest.raises(AttributeError):
+        RetryPolicy().budget = 1  # type: ignore[misc]
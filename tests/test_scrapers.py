@@ -1,26 +1,41 @@
 from __future__ import annotations
 
+from pathlib import Path
 from typing import TYPE_CHECKING, Any
 from unittest.mock import AsyncMock
 import asyncio
+import hashlib
+import json
 
+from instagram_archiver.client import QueryRejected, UnexpectedRedirect
+from instagram_archiver.dedup import LogDB
 from instagram_archiver.profile_scraper import ProfileScraper
 from instagram_archiver.saved_scraper import SavedScraper
-from instagram_archiver.typing import YTDLPState
-from instagram_archiver.workers import WorkerAbort
+from instagram_archiver.typing import Stats, YTDLPState
+from instagram_archiver.workers import DeferredRetries, WorkerAbort
 from niquests.exceptions import HTTPError
+from yt_dlp import YoutubeDL  # type: ignore[import-untyped]
+from yt_dlp_utils.aio import AsyncYoutubeDL
 import pytest
 
 if TYPE_CHECKING:
     from pytest_mock import MockerFixture
 
+pytestmark = pytest.mark.usefixtures('no_retry_delay')
+
+
+@pytest.fixture
+def no_retry_delay(mocker: MockerFixture) -> None:
+    """Retry failed requests without waiting."""
+    mocker.patch('instagram_archiver.retry.RetryPolicy.delay', return_value=0)
+
 
 def _patch_db(mocker: MockerFixture,
               *,
               scraper_module: str = 'profile_scraper',
               exists: bool = True,
               size: int = 1,
-              fetchone_value: tuple[int, ...] = (0,)) -> Any:
+              fetchone_value: tuple[Any, ...] | None = (0,)) -> Any:
     mock_path = mocker.patch(f'instagram_archiver.{scraper_module}.Path')
     mock_path.return_value.exists.return_value = exists
     mock_path.return_value.stat.return_value.st_size = size
@@ -61,7 +76,7 @@ def test_profile_scraper_with_log_existing(mocker: MockerFixture,
 async def test_save_comments_does_nothing_when_disabled(mocker: MockerFixture,
                                                         mock_setup_session: AsyncMock) -> None:
     _patch_db(mocker)
-    mock_super = mocker.patch('instagram_archiver.profile_scraper.InstagramClient.save_comments',
+    mock_super = mocker.patch('instagram_archiver.client.InstagramClient.save_comments',
                               new_callable=AsyncMock)
 
     scraper = ProfileScraper('test_user')
@@ -84,7 +99,7 @@ async def test_save_comments_does_nothing_when_disabled(mocker: MockerFixture,
 async def test_save_comments_runs_when_enabled(mocker: MockerFixture,
                                                mock_setup_session: AsyncMock) -> None:
     _patch_db(mocker)
-    mock_super = mocker.patch('instagram_archiver.profile_scraper.InstagramClient.save_comments',
+    mock_super = mocker.patch('instagram_archiver.client.InstagramClient.save_comments',
                               new_callable=AsyncMock)
 
     scraper = ProfileScraper('test_user', comments=True)
@@ -146,13 +161,18 @@ async def test_aexit_cleans_up(mocker: MockerFixture, mock_setup_session: AsyncM
 def _build_profile_scraper(mocker: MockerFixture,
                            *,
                            comments: bool = False,
+                           output_dir: Path | None = None,
+                           reel_concurrency: int = 1,
                            video_urls: list[str] | None = None) -> ProfileScraper:
-    _patch_db(mocker)
-    mocker.patch('instagram_archiver.profile_scraper.chdir')
+    if output_dir is None:
+        _patch_db(mocker)
     mocker.patch('instagram_archiver.profile_scraper.dump_json')
     mocker.patch('instagram_archiver.profile_scraper.write_bytes')
-    mocker.patch('instagram_archiver.profile_scraper.write_failed_urls')
-    scraper = ProfileScraper('test_user', comments=comments)
+    mocker.patch('instagram_archiver.client.write_failed_urls')
+    scraper = ProfileScraper('test_user',
+                             comments=comments,
+                             output_dir=output_dir,
+                             reel_concurrency=reel_concurrency)
     scraper.session = mocker.MagicMock()
     scraper.session.get = AsyncMock(  # type: ignore[method-assign]
         return_value=mocker.MagicMock(content=b'pic'))
@@ -306,12 +326,335 @@ async def test_process_highlights_dispatches_reel_items(mocker: MockerFixture,
                         }, None])
     mock_save_image = mocker.patch.object(scraper, 'save_image_versions2', new_callable=AsyncMock)
     ydl = mocker.MagicMock()
+    ydl.ydl.params = {'paths': {'home': str(Path.cwd().resolve())}}
     ydl.download = AsyncMock(return_value=0)
     await scraper.process(ydl)
     mock_save_image.assert_awaited_once_with(image_item, 1)
     ydl.download.assert_awaited_with(('https://www.instagram.com/stories/test_user/video1/',))
 
 
+async def test_process_streams_run_concurrently(mocker: MockerFixture,
+                                                mock_setup_session: AsyncMock) -> None:
+    scraper = _build_profile_scraper(mocker)
+    mocker.patch.object(scraper,
+                        'get_json',
+                        new_callable=AsyncMock,
+                        return_value={
+                            'data': {
+                                'user': {
+                                    'edge_owner_to_timeline_media': {
+                                        'edges': []
+                                    },
+                                    'id': '12345',
+                                    'profile_pic_url_hd': 'https://test_url'
+                                }
+                            }
+                        })
+    mocker.patch.object(scraper, 'get_text', new_callable=AsyncMock)
+    mocker.patch.object(scraper, 'is_saved', return_value=True)
+    mocker.patch.object(scraper,
+                        'highlights_tray',
+                        new_callable=AsyncMock,
+                        return_value={'tray': [{
+                            'id': 'highlight:1'
+                        }]})
+    timeline_started = asyncio.Event()
+    calls: list[str] = []
+
+    async def reel_page_gallery(reel_ids: list[str], **kwargs: Any) -> None:
+        del kwargs
+        if reel_ids == ['1']:
+            # The highlights stream only finishes once the timeline stream has started.
+            await asyncio.wait_for(timeline_started.wait(), 1)
+        calls.append(reel_ids[0])
+
+    async def graphql_query(*args: Any, **kwargs: Any) -> None:
+        del args, kwargs
+        timeline_started.set()
+        calls.append('timeline')
+
+    mocker.patch.object(scraper, 'reel_page_gallery', side_effect=reel_page_gallery)
+    mocker.patch.object(scraper, 'graphql_query', side_effect=graphql_query)
+    mocker.patch('instagram_archiver.profile_scraper.log.error')
+    await scraper.process(mocker.MagicMock())
+    assert calls.index('timeline') < calls.index('1')
+    assert '12345' in calls
+
+
+def _mock_profile_info(mocker: MockerFixture,
+                       scraper: ProfileScraper,
+                       highlight_count: int,
+                       *,
+                       latest_reel_media: int | None = None,
+                       timeline_media: dict[str, Any] | None = None) -> None:
+    mocker.patch.object(scraper,
+                        'get_json',
+                        new_callable=AsyncMock,
+                        return_value={
+                            'data': {
+                                'user': {
+                                    'edge_owner_to_timeline_media': timeline_media or {
+                                        'edges': []
+                                    },
+                                    'id': '12345',
+                                    'profile_pic_url_hd': 'https://test_url'
+                                }
+                            }
+                        })
+    mocker.patch.object(scraper, 'get_text', new_callable=AsyncMock)
+    mocker.patch.object(scraper, 'is_saved', return_value=True)
+    mocker.patch.object(scraper, 'graphql_query', new_callable=AsyncMock, return_value=None)
+    mocker.patch.object(scraper,
+                        'highlights_tray',
+                        new_callable=AsyncMock,
+                        return_value={
+                            'tray': [{
+                                'id':
+                                    f'highlight:{i}',
+                                **({} if latest_reel_media is None else {
+                                       'latest_reel_media': latest_reel_media + i,
+                                       'media_count': 2
+                                   })
+                            } for i in range(highlight_count)]
+                        })
+    mocker.patch('instagram_archiver.profile_scraper.log.error')
+
+
+async def test_process_reel_page_size_probed_and_cached(mocker: MockerFixture,
+                                                        mock_setup_session: AsyncMock) -> None:
+    scraper = _build_profile_scraper(mocker)
+    _mock_profile_info(mocker, scraper, 1)
+    calls: list[tuple[str, str | None, int]] = []
+
+    async def reel_page_gallery(reel_ids: list[str], *, after: str | None, first: int,
+                                is_highlight: bool) -> dict[str, Any] | None:
+        calls.append((reel_ids[0], after, first))
+        if first > 20:
+            return None
+        return {
+            'edges': [],
+            'page_info': {
+                'end_cursor': 'next',
+                'has_next_page': is_highlight and after is None
+            }
+        }
+
+    mocker.patch.object(scraper, 'reel_page_gallery', side_effect=reel_page_gallery)
+    await scraper.process(mocker.MagicMock())
+    assert [first for _, _, first in calls].count(50) == 1
+    assert {first for _, _, first in calls} == {50, 20}
+    assert ('0', 'next', 20) in calls
+    assert ('12345', None, 20) in calls
+
+
+async def test_process_reel_page_size_probe_exhausted(mocker: MockerFixture,
+                                                      mock_setup_session: AsyncMock) -> None:
+    scraper = _build_profile_scraper(mocker)
+    _mock_profile_info(mocker, scraper, 1)
+    await scraper.process(mocker.MagicMock())
+    firsts = [call.kwargs['first']
+              for call in scraper.reel_page_gallery.await_args_list]  # type: ignore[attr-defined]
+    assert firsts == [50, 20, 10, 5, 5]
+
+
+async def test_process_reel_page_size_probed_once_across_chunks(
+        mocker: MockerFixture, mock_setup_session: AsyncMock) -> None:
+    scraper = _build_profile_scraper(mocker, reel_concurrency=2)
+    _mock_profile_info(mocker, scraper, 4)
+    await scraper.process(mocker.MagicMock())
+    firsts = [call.kwargs['first']
+              for call in scraper.reel_page_gallery.await_args_list]  # type: ignore[attr-defined]
+    assert firsts == [50, 20, 10, 5, 5, 5]
+
+
+async def test_process_highlights_in_parallel_chunks(mocker: MockerFixture,
+                                                     mock_setup_session: AsyncMock) -> None:
+    scraper = _build_profile_scraper(mocker, reel_concurrency=2)
+    _mock_profile_info(mocker, scraper, 5)
+    await scraper.process(mocker.MagicMock())
+    chunks = {tuple(call.args[0])
+              for call in scraper.reel_page_gallery.await_args_list}  # type: ignore[attr-defined]
+    assert chunks == {('0', '1', '2'), ('3', '4'), ('12345',)}
+
+
+async def test_process_highlights_empty_tray(mocker: MockerFixture,
+                                             mock_setup_session: AsyncMock) -> None:
+    scraper = _build_profile_scraper(mocker)
+    _mock_profile_info(mocker, scraper, 0)
+    await scraper.process(mocker.MagicMock())
+    chunks = {tuple(call.args[0])
+              for call in scraper.reel_page_gallery.await_args_list}  # type: ignore[attr-defined]
+    assert chunks == {('12345',)}
+
+
+async def test_process_skips_unchanged_highlights(mocker: MockerFixture,
+                                                  mock_setup_session: AsyncMock) -> None:
+    _patch_db(mocker, fetchone_value=('100:2',))
+    mocker.patch('instagram_archiver.profile_scraper.dump_json')
+    mocker.patch('instagram_archiver.client.write_failed_urls')
+    scraper = ProfileScraper('test_user')
+    scraper.session = mocker.MagicMock()
+    gallery = mocker.patch.object(scraper,
+                                  'reel_page_gallery',
+                                  new_callable=AsyncMock,
+                                  return_value=None)
+    _mock_profile_info(mocker, scraper, 2, latest_reel_media=100)
+    await scraper.process(mocker.MagicMock())
+    chunks = {tuple(call.args[0]) for call in gallery.await_args_list}
+    assert chunks == {('1',), ('12345',)}
+
+
+async def test_process_saves_highlight_watermarks(mocker: MockerFixture,
+                                                  mock_setup_session: AsyncMock) -> None:
+    mock_cursor = _patch_db(mocker, fetchone_value=None)
+    mocker.patch('instagram_archiver.profile_scraper.dump_json')
+    mocker.patch('instagram_archiver.client.write_failed_urls')
+    scraper = ProfileScraper('test_user')
+    scraper.session = mocker.MagicMock()
+    mocker.patch.object(scraper,
+                        'reel_page_gallery',
+                        new_callable=AsyncMock,
+                        return_value={
+                            'edges': [],
+                            'page_info': {
+                                'end_cursor': '',
+                                'has_next_page': False
+                            }
+                        })
+    _mock_profile_info(mocker, scraper, 1, latest_reel_media=100)
+    await scraper.process(mocker.MagicMock())
+    mock_cursor.execute.assert_any_call(
+        'INSERT OR REPLACE INTO highlights (id, watermark) VALUES (?, ?)', ('0', '100:2'))
+
+
+async def test_process_failed_reel_page_keeps_highlight_watermarks_unsaved(
+        mocker: MockerFixture, mock_setup_session: AsyncMock) -> None:
+    mock_cursor = _patch_db(mocker, fetchone_value=None)
+    mocker.patch('instagram_archiver.profile_scraper.dump_json')
+    mocker.patch('instagram_archiver.client.write_failed_urls')
+    scraper = ProfileScraper('test_user')
+    scraper.session = mocker.MagicMock()
+    mocker.patch.object(scraper, 'reel_page_gallery', new_callable=AsyncMock, return_value=None)
+    _mock_profile_info(mocker, scraper, 1, latest_reel_media=100)
+    await scraper.process(mocker.MagicMock())
+    assert all('INTO highlights' not in call.args[0] for call in mock_cursor.execute.call_args_list)
+
+
+async def test_process_failed_highlight_image_keeps_watermarks_unsaved(
+        mocker: MockerFixture, mock_setup_session: AsyncMock) -> None:
+    mock_cursor = _patch_db(mocker, fetchone_value=None)
+    mocker.patch('instagram_archiver.profile_scraper.dump_json')
+    mocker.patch('instagram_archiver.client.write_failed_urls')
+    scraper = ProfileScraper('test_user')
+    scraper.session = mocker.MagicMock()
+
+    async def reel_page_gallery(reel_ids: list[str], *, after: str | None, first: int,
+                                is_highlight: bool) -> dict[str, Any]:
+        del after, first
+        items = [{
+            'id': f'{reel_ids[0]}_1',
+            'image_versions2': {
+                'candidates': []
+            },
+            'pk': reel_ids[0],
+            'taken_at': 1
+        }] if is_highlight else []
+        return {
+            'edges': [{
+                'node': {
+                    'id': reel_ids[0],
+                    'items': items
+                }
+            }],
+            'page_info': {
+                'end_cursor': '',
+                'has_next_page': False
+            }
+        }
+
+    mocker.patch.object(scraper, 'reel_page_gallery', side_effect=reel_page_gallery)
+    mocker.patch.object(scraper, 'save_image_versions2', new_callable=AsyncMock, return_value=False)
+    _mock_profile_info(mocker, scraper, 1, latest_reel_media=100)
+    await scraper.process(mocker.MagicMock())
+    scraper.save_image_versions2.assert_awaited_once()  # type: ignore[attr-defined]
+    assert all('INTO highlights' not in call.args[0] for call in mock_cursor.execute.call_args_list)
+
+
+async def test_process_unchanged_profile_info_not_rewritten(mocker: MockerFixture,
+                                                            mock_setup_session: AsyncMock) -> None:
+    mock_cursor = _patch_db(mocker)
+    mock_dump_json = mocker.patch('instagram_archiver.profile_scraper.dump_json')
+    mocker.patch('instagram_archiver.client.write_failed_urls')
+    scraper = ProfileScraper('test_user')
+    scraper.session = mocker.MagicMock()
+    mocker.patch.object(scraper, 'reel_page_gallery', new_callable=AsyncMock, return_value=None)
+    _mock_profile_info(mocker, scraper, 0)
+    info = scraper.get_json.return_value  # type: ignore[attr-defined]
+    digest = hashlib.sha256(json.dumps(info, sort_keys=True).encode()).hexdigest()
+    mock_cursor.__iter__.side_effect = lambda: iter([(digest, None, None)])
+    await scraper.process(mocker.MagicMock())
+    mock_dump_json.assert_not_called()
+
+
+async def test_process_profile_pic_not_modified(mocker: MockerFixture,
+                                                mock_setup_session: AsyncMock) -> None:
+    mock_cursor = _patch_db(mocker)
+    mock_cursor.__iter__.side_effect = lambda: iter([('digest', '"etag"', 'yesterday')])
+    mocker.patch('instagram_archiver.profile_scraper.dump_json')
+    mock_write_bytes = mocker.patch('instagram_archiver.profile_scraper.write_bytes')
+    mocker.patch('instagram_archiver.client.write_failed_urls')
+    scraper = ProfileScraper('test_user')
+    scraper.session = mocker.MagicMock()
+    scraper.session.get = AsyncMock(  # type: ignore[method-assign]
+        return_value=mocker.MagicMock(status_code=304, content=b''))
+    mocker.patch.object(scraper, 'reel_page_gallery', new_callable=AsyncMock, return_value=None)
+    _mock_profile_info(mocker, scraper, 0)
+    mocker.patch.object(scraper, 'is_saved', return_value=False)
+    mocker.patch.object(scraper, 'save_to_log')
+    await scraper.process(mocker.MagicMock())
+    scraper.session.get.assert_awaited_once_with('https://test_url',
+                                                 headers={
+                                                     'If-None-Match': '"etag"',
+                                                     'If-Modified-Since': 'yesterday'
+                                                 })
+    mock_write_bytes.assert_not_called()
+
+
+async def test_process_profile_pic_same_content_not_rewritten(
+        mocker: MockerFixture, mock_setup_session: AsyncMock) -> None:
+    mock_cursor = _patch_db(mocker)
+    digest = hashlib.sha256(b'pic').hexdigest()
+    mock_cursor.__iter__.side_effect = lambda: iter([(digest, None, None)])
+    mocker.patch('instagram_archiver.profile_scraper.dump_json')
+    mock_write_bytes = mocker.patch('instagram_archiver.profile_scraper.write_bytes')
+    mocker.patch('instagram_archiver.client.write_failed_urls')
+    scraper = ProfileScraper('test_user')
+    scraper.session = mocker.MagicMock()
+    scraper.session.get = AsyncMock(  # type: ignore[method-assign]
+        return_value=mocker.MagicMock(status_code=200, content=b'pic'))
+    mocker.patch.object(scraper, 'reel_page_gallery', new_callable=AsyncMock, return_value=None)
+    _mock_profile_info(mocker, scraper, 0)
+    mocker.patch.object(scraper, 'is_saved', return_value=False)
+    mocker.patch.object(scraper, 'save_to_log')
+    await scraper.process(mocker.MagicMock())
+    scraper.session.get.assert_awaited_once_with('https://test_url', headers={})
+    mock_write_bytes.assert_not_called()
+
+
+async def test_process_failed_urls_keep_highlight_watermarks_unsaved(
+        mocker: MockerFixture, mock_setup_session: AsyncMock) -> None:
+    mock_cursor = _patch_db(mocker, fetchone_value=None)
+    mocker.patch('instagram_archiver.profile_scraper.dump_json')
+    mocker.patch('instagram_archiver.client.write_failed_urls')
+    scraper = ProfileScraper('test_user')
+    scraper.session = mocker.MagicMock()
+    scraper.failed_urls.add('https://example.com/failed')
+    mocker.patch.object(scraper, 'reel_page_gallery', new_callable=AsyncMock, return_value=None)
+    _mock_profile_info(mocker, scraper, 1, latest_reel_media=100)
+    await scraper.process(mocker.MagicMock())
+    assert all('INTO highlights' not in call.args[0] for call in mock_cursor.execute.call_args_list)
+
+
 async def test_process_highlights_error(mocker: MockerFixture,
                                         mock_setup_session: AsyncMock) -> None:
     mock_log_exception = mocker.patch('instagram_archiver.profile_scraper.log.exception')
@@ -463,16 +806,278 @@ async def test_process_with_pagination(mocker: MockerFixture,
     assert mock_graphql_query.call_count == 3
 
 
-async def test_process_failed_urls_written(mocker: MockerFixture,
-                                           mock_setup_session: AsyncMock) -> None:
+def _timeline_page(end_cursor: str | None) -> dict[str, Any]:
+    return {
+        'xdt_api__v1__feed__user_timeline_graphql_connection': {
+            'edges': [],
+            'page_info': {
+                'has_next_page': end_cursor is not None,
+                'end_cursor': end_cursor
+            }
+        }
+    }
+
+
+async def test_process_timeline_page_size_probed(mocker: MockerFixture,
+                                                 mock_setup_session: AsyncMock) -> None:
+    scraper = _build_profile_scraper(mocker)
+    _mock_profile_info(mocker, scraper, 0)
+    mock_log_info = mocker.patch('instagram_archiver.profile_scraper.log.info')
+    mock_graphql_query = mocker.patch.object(
+        scraper,
+        'graphql_query',
+        new_callable=AsyncMock,
+        side_effect=[QueryRejected('invalid'),
+                     _timeline_page('cur'),
+                     _timeline_page(None)])
+    await scraper.process(mocker.MagicMock())
+    variables = [call.args[0] for call in mock_graphql_query.await_args_list]
+    assert [v['data']['count'] for v in variables] == [50, 36, 36]
+    assert 'first' not in variables[1]
+    assert variables[2]['first'] == 36
+    assert variables[2]['after'] == 'cur'
+    mock_log_info.assert_called_once_with(
+        'Using a timeline page size of %d (the first page returned %d posts).', 36, 0)
+
+
+async def test_process_timeline_page_size_explicit(mocker: MockerFixture,
+                                                   mock_setup_session: AsyncMock) -> None:
+    _patch_db(mocker)
+    mocker.patch('instagram_archiver.profile_scraper.dump_json')
+    mocker.patch('instagram_archiver.client.write_failed_urls')
+    scraper = ProfileScraper('test_user', timeline_page_size=7)
+    scraper.session = mocker.MagicMock()
+    mocker.patch.object(scraper, 'reel_page_gallery', new_callable=AsyncMock, return_value=None)
+    _mock_profile_info(mocker, scraper, 0)
+    await scraper.process(mocker.MagicMock())
+    variables = [call.args[0]
+                 for call in scraper.graphql_query.await_args_list]  # type: ignore[attr-defined]
+    assert {v['data']['count'] for v in variables} == {7}
+
+
+async def test_process_timeline_failure_retried_at_same_size(mocker: MockerFixture,
+                                                             mock_setup_session: AsyncMock) -> None:
     scraper = _build_profile_scraper(mocker)
-    mock_write = mocker.patch('instagram_archiver.profile_scraper.write_failed_urls')
+    _mock_profile_info(mocker, scraper, 0)
+    mock_graphql_query = mocker.patch.object(scraper,
+                                             'graphql_query',
+                                             new_callable=AsyncMock,
+                                             side_effect=[None, _timeline_page(None)])
+    await scraper.process(mocker.MagicMock())
+    variables = [call.args[0] for call in mock_graphql_query.await_args_list]
+    assert [v['data']['count'] for v in variables] == [50, 50]
+
+
+async def test_process_timeline_prefetches_next_page(mocker: MockerFixture,
+                                                     mock_setup_session: AsyncMock) -> None:
+    scraper = _build_profile_scraper(mocker)
+    _mock_profile_info(mocker, scraper, 0)
+    events: list[str] = []
+    pages = [_timeline_page('cur'), _timeline_page(None)]
+
+    async def fake_graphql_query(variables: dict[str, Any], **kwargs: Any) -> dict[str, Any]:
+        events.append(f'query {variables.get("after")}')
+        return pages.pop(0)
+
+    async def fake_dispatch_edges(edges: Any, *args: Any, **kwargs: Any) -> None:
+        events.append('dispatch start')
+        await asyncio.sleep(0)
+        events.append('dispatch end')
+
+    mocker.patch.object(scraper, 'graphql_query', side_effect=fake_graphql_query)
+    mocker.patch.object(scraper, 'dispatch_edges', side_effect=fake_dispatch_edges)
+    await scraper.process(mocker.MagicMock())
+    assert events == [
+        'query None', 'dispatch start', 'query cur', 'dispatch end', 'dispatch start',
+        'dispatch end'
+    ]
+
+
+async def test_process_timeline_prefetch_cancelled_on_dispatch_error(
+        mocker: MockerFixture, mock_setup_session: AsyncMock) -> None:
+    scraper = _build_profile_scraper(mocker)
+    _mock_profile_info(mocker, scraper, 0)
+    next_page_started = asyncio.Event()
+
+    async def fake_graphql_query(variables: dict[str, Any], **kwargs: Any) -> dict[str, Any]:
+        if 'after' not in variables:
+            return _timeline_page('cur')
+        next_page_started.set()
+        await asyncio.Event().wait()
+        return _timeline_page(None)
+
+    async def fake_dispatch_edges(edges: Any, *args: Any, **kwargs: Any) -> None:
+        await next_page_started.wait()
+        raise RuntimeError
+
+    mocker.patch.object(scraper, 'graphql_query', side_effect=fake_graphql_query)
+    mocker.patch.object(scraper, 'dispatch_edges', side_effect=fake_dispatch_edges)
+    with pytest.raises(RuntimeError):
+        await scraper.process(mocker.MagicMock())
+    assert not [
+        task
+        for task in asyncio.all_tasks() if task is not asyncio.current_task() and not task.done()
+    ]
+
+
+async def test_process_timeline_continues_from_profile_cursor(
+        mocker: MockerFixture, mock_setup_session: AsyncMock) -> None:
+    scraper = _build_profile_scraper(mocker)
+    edge = {'node': {'__typename': 'XDTMediaDict', 'code': 'sc', 'pk': '1'}}
+    _mock_profile_info(mocker,
+                       scraper,
+                       0,
+                       timeline_media={
+                           'edges': [edge],
+                           'page_info': {
+                               'has_next_page': True,
+                               'end_cursor': 'profile-cursor'
+                           }
+                       })
+    await scraper.process(mocker.MagicMock())
+    variables = scraper.graphql_query.await_args_list[0].args[0]  # type: ignore[attr-defined]
+    assert variables['after'] == 'profile-cursor'
+
+
+async def test_process_timeline_restarts_when_profile_cursor_rejected(
+        mocker: MockerFixture, mock_setup_session: AsyncMock) -> None:
+    scraper = _build_profile_scraper(mocker)
+    edge = {'node': {'__typename': 'XDTMediaDict', 'code': 'sc', 'pk': '1'}}
+    _mock_profile_info(mocker,
+                       scraper,
+                       0,
+                       timeline_media={
+                           'edges': [edge],
+                           'page_info': {
+                               'has_next_page': True,
+                               'end_cursor': 'profile-cursor'
+                           }
+                       })
+    mock_log_error = mocker.patch('instagram_archiver.profile_scraper.log.error')
+
+    async def fake_graphql_query(variables: dict[str, Any], **kwargs: Any) -> dict[str, Any]:
+        if 'after' in variables:
+            msg = 'invalid cursor'
+            raise QueryRejected(msg)
+        return _timeline_page(None)
+
+    mock_graphql_query = mocker.patch.object(scraper,
+                                             'graphql_query',
+                                             side_effect=fake_graphql_query)
+    mock_dispatch_edges = mocker.patch.object(scraper, 'dispatch_edges', new_callable=AsyncMock)
+    await scraper.process(mocker.MagicMock())
+    assert 'after' not in mock_graphql_query.await_args_list[-1].args[0]
+    assert mock_dispatch_edges.await_count == 2
+    mock_log_error.assert_not_called()
+
+
+async def test_process_timeline_skipped_when_profile_has_all_posts(
+        mocker: MockerFixture, mock_setup_session: AsyncMock) -> None:
+    scraper = _build_profile_scraper(mocker)
+    edge = {'node': {'__typename': 'XDTMediaDict', 'code': 'sc', 'pk': '1'}}
+    _mock_profile_info(mocker,
+                       scraper,
+                       0,
+                       timeline_media={
+                           'edges': [edge],
+                           'page_info': {
+                               'has_next_page': False,
+                               'end_cursor': None
+                           }
+                       })
+    await scraper.process(mocker.MagicMock())
+    scraper.graphql_query.assert_not_awaited()  # type: ignore[attr-defined]
+
+
+async def test_process_failed_urls_written(mocker: MockerFixture, mock_setup_session: AsyncMock,
+                                           tmp_path: Path) -> None:
+    scraper = _build_profile_scraper(mocker, output_dir=tmp_path)
+    mock_write = mocker.patch('instagram_archiver.client.write_failed_urls')
     scraper.failed_urls.add('https://example.com/p/x/')
     mocker.patch.object(scraper, 'get_json', new_callable=AsyncMock, return_value={})
     mocker.patch.object(scraper, 'get_text', new_callable=AsyncMock)
     mocker.patch.object(scraper, 'graphql_query', new_callable=AsyncMock, return_value=None)
     await scraper.process(mocker.MagicMock())
-    mock_write.assert_called_once_with('failed.txt', scraper.failed_urls)
+    mock_write.assert_called_once_with(tmp_path / 'failed.txt', scraper.failed_urls)
+
+
+async def test_process_records_failures(mocker: MockerFixture,
+                                        mock_setup_session: AsyncMock) -> None:
+    mock_cursor = _patch_db(mocker)
+    mocker.patch('instagram_archiver.profile_scraper.dump_json')
+    mocker.patch('instagram_archiver.client.write_failed_urls')
+    scraper = ProfileScraper('test_user', deferred_retries=DeferredRetries(attempts=1, cool_down=0))
+    scraper.session = mocker.MagicMock()
+    mocker.patch.object(scraper, 'reel_page_gallery', new_callable=AsyncMock, return_value=None)
+    edge = {'node': {'__typename': 'XDTMediaDict', 'code': 'sc', 'id': '1_2', 'pk': '1'}}
+    _mock_profile_info(mocker,
+                       scraper,
+                       0,
+                       timeline_media={
+                           'edges': [edge],
+                           'page_info': {
+                               'has_next_page': False,
+                               'end_cursor': None
+                           }
+                       })
+    save_media = mocker.patch.object(scraper,
+                                     'save_media',
+                                     new_callable=AsyncMock,
+                                     side_effect=RuntimeError('boom'))
+    await scraper.process(mocker.MagicMock())
+    assert save_media.await_count == 2
+    query, rows = mock_cursor.executemany.call_args.args
+    assert query.startswith('INSERT OR REPLACE INTO failures')
+    assert list(rows) == [('media:1_2', 'media', json.dumps(edge), 'boom')]
+
+
+async def test_process_unexpected_redirect_not_deferred(mocker: MockerFixture,
+                                                        mock_setup_session: AsyncMock) -> None:
+    _patch_db(mocker)
+    mocker.patch('instagram_archiver.profile_scraper.dump_json')
+    mocker.patch('instagram_archiver.client.write_failed_urls')
+    scraper = ProfileScraper('test_user', deferred_retries=DeferredRetries(attempts=1, cool_down=0))
+    scraper.session = mocker.MagicMock()
+    mocker.patch.object(scraper, 'reel_page_gallery', new_callable=AsyncMock, return_value=None)
+    edge = {'node': {'__typename': 'XDTMediaDict', 'code': 'sc', 'id': '1_2', 'pk': '1'}}
+    _mock_profile_info(mocker,
+                       scraper,
+                       0,
+                       timeline_media={
+                           'edges': [edge],
+                           'page_info': {
+                               'has_next_page': False,
+                               'end_cursor': None
+                           }
+                       })
+    save_media = mocker.patch.object(scraper,
+                                     'save_media',
+                                     new_callable=AsyncMock,
+                                     side_effect=UnexpectedRedirect)
+    with pytest.raises(UnexpectedRedirect):
+        await scraper.process(mocker.MagicMock())
+    save_media.assert_awaited_once()
+
+
+async def test_process_retry_failed_skips_producer(mocker: MockerFixture,
+                                                   mock_setup_session: AsyncMock) -> None:
+    mock_cursor = _patch_db(mocker)
+    url = 'https://www.instagram.com/p/sc/'
+    mock_cursor.__iter__.side_effect = lambda: iter([(f'video:{url}', 'video', url, 'boom')])
+    mocker.patch('instagram_archiver.client.write_failed_urls')
+    scraper = ProfileScraper('test_user')
+    scraper.session = mocker.MagicMock()
+    scraper.session.cookies.get.return_value = 'token'  # type: ignore[attr-defined]
+    mocker.patch.object(scraper, 'get_text', new_callable=AsyncMock)
+    ydl = mocker.MagicMock()
+    ydl.ydl.params = {'paths': {'home': str(Path.cwd().resolve())}}
+    ydl.download = AsyncMock(return_value=0)
+    await scraper.process(ydl, retry_failed=True)
+    scraper.get_text.assert_not_awaited()  # type: ignore[attr-defined]
+    ydl.download.assert_awaited_once_with((url,))
+    query, keys = mock_cursor.executemany.call_args.args
+    assert query == 'DELETE FROM failures WHERE key = ?'
+    assert list(keys) == [(f'video:{url}',)]
 
 
 async def test_process_producer_exception_propagates(mocker: MockerFixture,
@@ -514,8 +1119,10 @@ async def test_process_producer_cancelled_calls_on_cleanup(mocker: MockerFixture
 
 
 async def test_process_writes_pic_when_content_present(mocker: MockerFixture,
-                                                       mock_setup_session: AsyncMock) -> None:
-    scraper = _build_profile_scraper(mocker)
+                                                       mock_setup_session: AsyncMock,
+                                                       tmp_path: Path) -> None:
+    scraper = _build_profile_scraper(mocker, output_dir=tmp_path)
+    scraper.session.get.return_value.headers = {}  # type: ignore[attr-defined]
     mock_write_bytes = mocker.patch('instagram_archiver.profile_scraper.write_bytes')
     mocker.patch.object(scraper,
                         'get_json',
@@ -540,7 +1147,7 @@ async def test_process_writes_pic_when_content_present(mocker: MockerFixture,
     mocker.patch.object(scraper, 'is_saved', return_value=False)
     mocker.patch.object(scraper, 'save_to_log')
     await scraper.process(mocker.MagicMock())
-    mock_write_bytes.assert_called_with('profile_pic.jpg', b'pic')
+    mock_write_bytes.assert_called_with(tmp_path / 'profile_pic.jpg', b'pic')
 
 
 async def test_process_skips_pic_when_content_none(mocker: MockerFixture,
@@ -713,7 +1320,9 @@ async def test_process_highlights_increments_yt_dlp_state(mocker: MockerFixture,
                             'edges': [{
                                 'node': {
                                     'id': '1',
-                                    'items': [video_item, video_item]
+                                    'items': [video_item, {
+                                        **video_item, 'pk': 'video2'
+                                    }]
                                 }
                             }],
                             'page_info': {
@@ -725,6 +1334,65 @@ async def test_process_highlights_increments_yt_dlp_state(mocker: MockerFixture,
     assert state.total_urls == 2
 
 
+async def test_process_highlights_duplicate_items_queued_once(
+        mocker: MockerFixture, mock_setup_session: AsyncMock) -> None:
+    state = YTDLPState()
+    scraper = _build_profile_scraper(mocker)
+    mocker.patch.object(scraper, 'is_saved', return_value=True)
+    mocker.patch.object(scraper,
+                        'get_json',
+                        new_callable=AsyncMock,
+                        return_value={
+                            'data': {
+                                'user': {
+                                    'edge_owner_to_timeline_media': {
+                                        'edges': []
+                                    },
+                                    'id': '12345',
+                                    'profile_pic_url_hd': 'https://pic'
+                                }
+                            }
+                        })
+    mocker.patch.object(scraper, 'get_text', new_callable=AsyncMock)
+    mocker.patch.object(scraper,
+                        'highlights_tray',
+                        new_callable=AsyncMock,
+                        return_value={'tray': [{
+                            'id': 'f:1'
+                        }]})
+    mocker.patch.object(scraper, 'graphql_query', new_callable=AsyncMock, return_value=None)
+    video_item = {
+        'id': 'vid',
+        'image_versions2': {
+            'candidates': []
+        },
+        'pk': 'video',
+        'taken_at': 0,
+        'video_versions': [{
+            'url': 'https://example.com/v.mp4',
+            'width': 1,
+            'height': 1
+        }]
+    }
+    mocker.patch.object(scraper,
+                        'reel_page_gallery',
+                        new_callable=AsyncMock,
+                        side_effect=[{
+                            'edges': [{
+                                'node': {
+                                    'id': '1',
+                                    'items': [video_item, video_item]
+                                }
+                            }],
+                            'page_info': {
+                                'end_cursor': None,
+                                'has_next_page': False
+                            }
+                        }, None])
+    await scraper.process(mocker.MagicMock(), yt_dlp_state=state)
+    assert state.total_urls == 1
+
+
 async def test_process_worker_abort_swallowed(mocker: MockerFixture,
                                               mock_setup_session: AsyncMock) -> None:
     scraper = _build_profile_scraper(mocker)
@@ -732,10 +1400,64 @@ async def test_process_worker_abort_swallowed(mocker: MockerFixture,
     await scraper.process(mocker.MagicMock())
 
 
+async def test_process_samples_queues_into_stats(mocker: MockerFixture,
+                                                 mock_setup_session: AsyncMock) -> None:
+    scraper = _build_profile_scraper(mocker)
+    mocker.patch.object(scraper, 'get_json', new_callable=AsyncMock, return_value={})
+    mocker.patch.object(scraper, 'get_text', new_callable=AsyncMock)
+    mocker.patch.object(scraper, 'graphql_query', new_callable=AsyncMock, return_value=None)
+    stats = Stats()
+    await scraper.process(mocker.MagicMock(), stats=stats)
+    assert set(stats.queues) == {'comments', 'image', 'video'}
+    assert stats.queue_depths['image'].count >= 1
+    assert set(stats.workers) == {'comments', 'image', 'video'}
+
+
+def test_scrapers_media_store(mocker: MockerFixture, mock_setup_session: AsyncMock) -> None:
+    mock_store = mocker.patch('instagram_archiver.profile_scraper.ContentStore')
+    _patch_db(mocker)
+    assert ProfileScraper('test_user').media_store is None
+    assert ProfileScraper('test_user', media_store='store').media_store is mock_store.return_value
+    mock_saved_store = mocker.patch('instagram_archiver.saved_scraper.ContentStore')
+    _patch_db(mocker, scraper_module='saved_scraper')
+    assert SavedScraper().media_store is None
+    assert SavedScraper(media_store='store').media_store is mock_saved_store.return_value
+
+
+def test_scrapers_catalogue(mocker: MockerFixture, mock_setup_session: AsyncMock) -> None:
+    mock_catalogue = mocker.patch('instagram_archiver.profile_scraper.Catalogue')
+    _patch_db(mocker)
+    assert ProfileScraper('test_user').catalogue is None
+    assert ProfileScraper('test_user', catalogue='c.db').catalogue is mock_catalogue.return_value
+    mock_catalogue.assert_called_once_with('c.db')
+    mock_saved_catalogue = mocker.patch('instagram_archiver.saved_scraper.Catalogue')
+    _patch_db(mocker, scraper_module='saved_scraper')
+    assert SavedScraper().catalogue is None
+    assert SavedScraper(catalogue='c.db').catalogue is mock_saved_catalogue.return_value
+
+
+def test_scrapers_json_format(mocker: MockerFixture, mock_setup_session: AsyncMock) -> None:
+    _patch_db(mocker)
+    assert ProfileScraper('test_user').json_format == 'pretty'
+    assert ProfileScraper('test_user', json_format='gzip').json_format == 'gzip'
+    _patch_db(mocker, scraper_module='saved_scraper')
+    assert SavedScraper(json_format='compact').json_format == 'compact'
+
+
+def test_profile_scraper_log_db_spans(mocker: MockerFixture, mock_setup_session: AsyncMock) -> None:
+    _patch_db(mocker)
+    scraper = ProfileScraper('test_user')
+    scraper.stats = Stats()
+    scraper.stats.enable_spans()
+    scraper.is_saved('https://example.com/a')
+    scraper.save_to_log('https://example.com/a')
+    assert scraper.stats.spans is not None
+    assert set(scraper.stats.spans) == {'log_db.is_saved', 'log_db.save'}
+
+
 async def test_process_saved_with_unsaving(mocker: MockerFixture,
                                            mock_setup_session: AsyncMock) -> None:
     _patch_db(mocker, scraper_module='saved_scraper')
-    mocker.patch('instagram_archiver.saved_scraper.chdir')
     mock_setup_session.return_value = mocker.MagicMock(headers=mocker.MagicMock(),
                                                        cookies=mocker.MagicMock())
     scraper = SavedScraper()
@@ -755,21 +1477,25 @@ async def test_process_saved_with_unsaving(mocker: MockerFixture,
                                         'username': 'username'
                                     },
                                     'pk': 'pk',
+                                    'taken_at': 1700000000,
                                     'video_dash_manifest': None
                                 }
                             }]
                         })
     mock_unsave = mocker.patch.object(scraper, 'unsave', new_callable=AsyncMock)
     mock_dispatch = mocker.patch.object(scraper, 'dispatch_edges', new_callable=AsyncMock)
-    await scraper.process(mocker.MagicMock(), unsave=True)
+    stats = Stats()
+    await scraper.process(mocker.MagicMock(), stats=stats, unsave=True)
     mock_dispatch.assert_awaited_once()
+    edges = list(mock_dispatch.await_args_list[0].args[0])
+    assert edges[0]['node']['taken_at'] == 1700000000
     mock_unsave.assert_awaited_once()
+    assert stats.queue_depths['video'].count >= 1
 
 
 async def test_process_saved(mocker: MockerFixture, mock_setup_session: AsyncMock) -> None:
     mock_log_warning = mocker.patch('instagram_archiver.saved_scraper.log.warning')
     _patch_db(mocker, scraper_module='saved_scraper')
-    mocker.patch('instagram_archiver.saved_scraper.chdir')
     scraper = SavedScraper()
     scraper.session = mocker.MagicMock()
     scraper.session.get = AsyncMock()  # type: ignore[method-assign]
@@ -787,6 +1513,7 @@ async def test_process_saved(mocker: MockerFixture, mock_setup_session: AsyncMoc
                                         'username': 'username'
                                     },
                                     'pk': 'pk',
+                                    'taken_at': 1700000000,
                                     'video_dash_manifest': None
                                 }
                             }],
@@ -808,9 +1535,23 @@ async def test_saved_unsave_iterates(mocker: MockerFixture, mock_setup_session:
     assert scraper.session.post.await_count == 2
 
 
+async def test_saved_unsave_retries(mocker: MockerFixture, mock_setup_session: AsyncMock) -> None:
+    _patch_db(mocker, scraper_module='saved_scraper')
+    mock_sleep = mocker.patch('instagram_archiver.client.asyncio.sleep', new_callable=AsyncMock)
+    scraper = SavedScraper()
+    scraper.session = mocker.MagicMock()
+    scraper.session.post = AsyncMock(  # type: ignore[method-assign]
+        side_effect=[
+            mocker.MagicMock(status_code=503, headers={}),
+            mocker.MagicMock(status_code=200)
+        ])
+    await scraper.unsave(['a'])
+    assert scraper.session.post.await_count == 2
+    mock_sleep.assert_awaited_once()
+
+
 async def test_saved_worker_abort(mocker: MockerFixture, mock_setup_session: AsyncMock) -> None:
     _patch_db(mocker, scraper_module='saved_scraper')
-    mocker.patch('instagram_archiver.saved_scraper.chdir')
     scraper = SavedScraper()
     scraper.session = mocker.MagicMock()
     scraper.session.get = AsyncMock()  # type: ignore[method-assign]
@@ -822,7 +1563,6 @@ async def test_saved_worker_abort(mocker: MockerFixture, mock_setup_session: Asy
 async def test_saved_producer_exception_propagates(mocker: MockerFixture,
                                                    mock_setup_session: AsyncMock) -> None:
     _patch_db(mocker, scraper_module='saved_scraper')
-    mocker.patch('instagram_archiver.saved_scraper.chdir')
     scraper = SavedScraper()
     scraper.session = mocker.MagicMock()
     scraper.session.get = AsyncMock()  # type: ignore[method-assign]
@@ -861,7 +1601,6 @@ def test_saved_scraper_disable_log_short_circuits(mocker: MockerFixture,
 async def test_saved_cancelled_without_on_cleanup(mocker: MockerFixture,
                                                   mock_setup_session: AsyncMock) -> None:
     _patch_db(mocker, scraper_module='saved_scraper')
-    mocker.patch('instagram_archiver.saved_scraper.chdir')
     scraper = SavedScraper()
     scraper.session = mocker.MagicMock()
     scraper.session.get = AsyncMock()  # type: ignore[method-assign]
@@ -874,10 +1613,39 @@ async def test_saved_cancelled_without_on_cleanup(mocker: MockerFixture,
         await scraper.process(mocker.MagicMock())
 
 
+async def test_saved_cancelled_stops_sampler_and_syncs(mocker: MockerFixture,
+                                                       mock_setup_session: AsyncMock) -> None:
+    _patch_db(mocker, scraper_module='saved_scraper')
+    started = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def sampler(_: Stats) -> None:
+        started.set()
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    async def get_json(*args: Any, **kwargs: Any) -> None:
+        await started.wait()
+        raise asyncio.CancelledError
+
+    mocker.patch('instagram_archiver.saved_scraper.queue_sampler', sampler)
+    mock_write_sync = mocker.patch('instagram_archiver.saved_scraper.WriteSync').return_value
+    scraper = SavedScraper()
+    scraper.session = mocker.MagicMock()
+    scraper.session.get = AsyncMock()  # type: ignore[method-assign]
+    mocker.patch.object(scraper, 'get_json', get_json)
+    with pytest.raises(asyncio.CancelledError):
+        await scraper.process(mocker.MagicMock(), stats=Stats())
+    assert cancelled.is_set()
+    mock_write_sync.sync.assert_called_once_with()
+
+
 async def test_saved_exception_after_stop_event_set(mocker: MockerFixture,
                                                     mock_setup_session: AsyncMock) -> None:
     _patch_db(mocker, scraper_module='saved_scraper')
-    mocker.patch('instagram_archiver.saved_scraper.chdir')
     scraper = SavedScraper()
     scraper.session = mocker.MagicMock()
     scraper.session.get = AsyncMock()  # type: ignore[method-assign]
@@ -903,7 +1671,6 @@ async def test_saved_exception_after_stop_event_set(mocker: MockerFixture,
 async def test_saved_invokes_on_cleanup_callbacks(mocker: MockerFixture,
                                                   mock_setup_session: AsyncMock) -> None:
     _patch_db(mocker, scraper_module='saved_scraper')
-    mocker.patch('instagram_archiver.saved_scraper.chdir')
     scraper = SavedScraper()
     scraper.session = mocker.MagicMock()
     scraper.session.get = AsyncMock()  # type: ignore[method-assign]
@@ -921,7 +1688,6 @@ async def test_saved_invokes_on_cleanup_callbacks(mocker: MockerFixture,
 async def test_saved_producer_cancelled_calls_on_cleanup(mocker: MockerFixture,
                                                          mock_setup_session: AsyncMock) -> None:
     _patch_db(mocker, scraper_module='saved_scraper')
-    mocker.patch('instagram_archiver.saved_scraper.chdir')
     scraper = SavedScraper()
     scraper.session = mocker.MagicMock()
     scraper.session.get = AsyncMock()  # type: ignore[method-assign]
@@ -945,3 +1711,116 @@ async def test_saved_aexit_closes_log(mocker: MockerFixture, mock_setup_session:
     async with scraper:
         pass
     mock_cursor.close.assert_called_once()
+
+
+async def test_saved_process_retry_failed_from_failed_list(tmp_path: Path, mocker: MockerFixture,
+                                                           mock_setup_session: AsyncMock) -> None:
+    (tmp_path / 'failed.txt').write_text(
+        'https://www.instagram.com/p/a/\n'
+        'https://www.instagram.com/p/b/\n', encoding='utf-8')
+    scraper = SavedScraper(output_dir=tmp_path)
+    scraper.session = mocker.MagicMock()
+    scraper.session.cookies.get.return_value = 'token'  # type: ignore[attr-defined]
+    scraper.session.get = AsyncMock()  # type: ignore[method-assign]
+    ydl = mocker.MagicMock()
+    ydl.ydl.params = {'paths': {'home': str(Path.cwd().resolve())}}
+    ydl.download = AsyncMock(side_effect=[0, 1])
+    await scraper.process(ydl, retry_failed=True)
+    scraper.session.get.assert_not_awaited()
+    assert ydl.download.await_count == 2
+    assert (tmp_path /
+            'failed.txt').read_text(encoding='utf-8') == ('https://www.instagram.com/p/b/\n')
+    scraper = SavedScraper(output_dir=tmp_path)
+    scraper.session = mocker.MagicMock()
+    scraper.session.cookies.get.return_value = 'token'  # type: ignore[attr-defined]
+    ydl.download = AsyncMock(return_value=0)
+    await scraper.process(ydl, retry_failed=True)
+    ydl.download.assert_awaited_once_with(('https://www.instagram.com/p/b/',))
+    assert not (tmp_path / 'failed.txt').exists()
+
+
+async def test_saved_process_concurrent_scrapers_keep_own_output_dir(
+        tmp_path: Path, mocker: MockerFixture, mock_setup_session: AsyncMock) -> None:
+    cwd = Path.cwd()
+    homes: dict[str, str] = {}
+    instances: dict[str, YoutubeDL] = {}
+
+    def fake_download(self: YoutubeDL, urls: list[str]) -> int:
+        homes[urls[0]] = self.params['paths']['home']
+        instances[urls[0]] = self
+        return 1 if urls[0].endswith('/a/') else 0
+
+    mocker.patch.object(YoutubeDL, 'download', autospec=True, side_effect=fake_download)
+    # One yt-dlp instance shared by both scrapers.
+    ydl = AsyncYoutubeDL(YoutubeDL({'paths': {'home': 'videos'}, 'quiet': True}))
+    scrapers = []
+    for name in ('a', 'b'):
+        output_dir = tmp_path / name
+        output_dir.mkdir()
+        (output_dir / 'failed.txt').write_text(f'https://www.instagram.com/p/{name}/\n',
+                                               encoding='utf-8')
+        scraper = SavedScraper(output_dir=output_dir)
+        scraper.session = mocker.MagicMock()
+        scraper.session.cookies.get.return_value = 'token'  # type: ignore[attr-defined]
+        scrapers.append(scraper)
+    await asyncio.gather(*(scraper.process(ydl, retry_failed=True) for scraper in scrapers))
+    assert Path.cwd() == cwd
+    assert (tmp_path / 'a' /
+            'failed.txt').read_text(encoding='utf-8') == 'https://www.instagram.com/p/a/\n'
+    assert not (tmp_path / 'b' / 'failed.txt').exists()
+    assert homes == {
+        f'https://www.instagram.com/p/{name}/': str(tmp_path / name / 'videos')
+        for name in ('a', 'b')
+    }
+    assert ydl.ydl.params['paths'] == {'home': 'videos'}
+    assert len({id(instance) for instance in instances.values()} | {id(ydl.ydl)}) == 3
+
+
+def test_saved_scraper_manifest(tmp_path: Path) -> None:
+    scraper = SavedScraper(output_dir=tmp_path, layout='date')
+    path = scraper.layout.path('1.json', 1234567890)
+    assert scraper.is_archived(path) is False
+    scraper.record_file(path, b'{}')
+    assert scraper.is_archived(path) is True
+    legacy = scraper.layout.path('2.json')
+    legacy.write_text('{}\n', encoding='utf-8')
+    assert scraper.is_archived(legacy) is True
+    db = LogDB(tmp_path / '.log.db')
+    assert db.manifest() == {
+        '2009/02/1.json': {
+            'digest': hashlib.sha256(b'{}').hexdigest(),
+            'media_id': '1',
+            'size': 2
+        },
+        'undated/2.json': {
+            'digest': None,
+            'media_id': '2',
+            'size': 3
+        }
+    }
+    db.close()
+
+
+def test_saved_scraper_is_archived_uses_one_manifest_lookup(tmp_path: Path,
+                                                            mocker: MockerFixture) -> None:
+    scraper = SavedScraper(output_dir=tmp_path)
+    scraper.record_file(tmp_path / '1.json.gz', b'{}')
+    manifest = mocker.spy(LogDB, 'manifest')
+    manifest_entry = mocker.spy(LogDB, 'manifest_entry')
+    stat = mocker.spy(Path, 'stat')
+    # Recorded in another JSON format.
+    assert scraper.is_archived(tmp_path / '1.json') is True
+    manifest.assert_called_once()
+    manifest_entry.assert_not_called()
+    stat.assert_not_called()
+
+
+def test_saved_scraper_is_archived_finds_legacy_file_of_recorded_media(tmp_path: Path) -> None:
+    scraper = SavedScraper(output_dir=tmp_path, json_format='gzip')
+    scraper.record_file(tmp_path / '1-comments.json.gz', b'{}')
+    (tmp_path / '1.json').write_text('{}\n', encoding='utf-8')
+    assert scraper.is_archived(tmp_path / '1.json.gz') is True
+    assert scraper.is_archived(tmp_path / '1-media-info-0000.json.gz') is False
+    db = LogDB(tmp_path / '.log.db')
+    assert set(db.manifest('1')) == {'1-comments.json.gz', '1.json'}
+    db.close()
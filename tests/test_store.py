@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+import hashlib
+
+from instagram_archiver.store import ContentStore
+import pytest
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from pytest_mock import MockerFixture
+
+
+def test_content_store_links_duplicate_content(tmp_path: Path) -> None:
+    store = ContentStore(tmp_path / 'store')
+    first = tmp_path / 'alice' / '1.jpg'
+    second = tmp_path / 'bob' / '2.jpg'
+    first.parent.mkdir()
+    second.parent.mkdir()
+    assert store.put(first, b'image') is True
+    assert store.put(second, b'image') is False
+    digest = hashlib.sha256(b'image').hexdigest()
+    blob = store.blob_path(digest, '.jpg')
+    assert blob == tmp_path / 'store' / digest[:2] / digest[2:4] / f'{digest}.jpg'
+    assert first.samefile(blob)
+    assert second.samefile(blob)
+    assert second.read_bytes() == b'image'
+
+
+def test_content_store_same_target_is_no_op(tmp_path: Path) -> None:
+    store = ContentStore(tmp_path / 'store')
+    target = tmp_path / '1.jpg'
+    store.put(target, b'image')
+    assert store.put(target, b'image') is False
+    assert target.read_bytes() == b'image'
+
+
+def test_content_store_replaces_changed_target(tmp_path: Path) -> None:
+    store = ContentStore(tmp_path / 'store')
+    target = tmp_path / '1.jpg'
+    target.write_bytes(b'old')
+    assert store.put(target, b'new') is True
+    assert target.read_bytes() == b'new'
+
+
+def test_content_store_copies_when_link_fails(tmp_path: Path, mocker: MockerFixture) -> None:
+    mocker.patch('instagram_archiver.store.Path.hardlink_to', side_effect=OSError)
+    store = ContentStore(tmp_path / 'store')
+    target = tmp_path / '1.jpg'
+    store.put(target, b'image')
+    assert target.read_bytes() == b'image'
+    assert target.stat().st_nlink == 1
+
+
+def test_content_store_cleans_up_on_write_error(tmp_path: Path, mocker: MockerFixture) -> None:
+    mocker.patch('instagram_archiver.store.Path.replace', side_effect=OSError('disk full'))
+    store = ContentStore(tmp_path / 'store')
+    with pytest.raises(OSError, match='disk full'):
+        store.put(tmp_path / '1.jpg', b'image')
+    assert not [path for path in (tmp_path / 'store').rglob('*') if path.is_file()]
@@ -1,14 +1,27 @@
 from __future__ import annotations
 
+from pathlib import Path
 from typing import TYPE_CHECKING
+import asyncio
+import gzip
 import json
+import os
+import stat
 
+from instagram_archiver.compat import HAS_ZSTD
 from instagram_archiver.utils import (
     JSONFormattedString,
     UnknownMimetypeError,
+    WriteSync,
+    decode_json,
     dump_json,
+    encode_json,
     get_extension,
     json_dumps_formatted,
+    json_suffix_of,
+    json_variants,
+    read_failed_urls,
+    use_write_sync,
     write_bytes,
     write_failed_urls,
     write_if_new,
@@ -16,8 +29,7 @@ from instagram_archiver.utils import (
 import pytest
 
 if TYPE_CHECKING:
-    from pathlib import Path
-
+    from instagram_archiver.utils import JSONFormat
     from pytest_mock import MockerFixture
 
 
@@ -34,29 +46,17 @@ def test_json_dumps_formatted(mocker: MockerFixture) -> None:
     assert str(result) == formatted_json
 
 
-def test_write_if_new_file_does_not_exist(mocker: MockerFixture) -> None:
-    mock_is_file = mocker.patch('pathlib.Path.is_file', return_value=False)
-    mock_open_file = mocker.patch('click.open_file', mocker.mock_open())
-
-    target = 'test_file.txt'
-    content = 'Test content'
-    write_if_new(target, content)
-
-    mock_is_file.assert_called_once_with()
-    mock_open_file.assert_called_once_with(target, 'w')
-    mock_open_file().write.assert_called_once_with(content)
-
-
-def test_write_if_new_file_exists(mocker: MockerFixture) -> None:
-    mock_is_file = mocker.patch('pathlib.Path.is_file', return_value=True)
-    mock_open_file = mocker.patch('click.open_file', mocker.mock_open())
+def test_write_if_new_file_does_not_exist(tmp_path: Path) -> None:
+    target = tmp_path / 'test_file.txt'
+    write_if_new(target, 'Test content')
+    assert target.read_text(encoding='utf-8') == 'Test content'
 
-    target = 'test_file.txt'
-    content = 'Test content'
-    write_if_new(target, content)
 
-    mock_is_file.assert_called_once_with()
-    mock_open_file.assert_not_called()
+def test_write_if_new_file_exists(tmp_path: Path) -> None:
+    target = tmp_path / 'test_file.txt'
+    target.write_text('Old content', encoding='utf-8')
+    write_if_new(target, b'Test content', 'wb')
+    assert target.read_text(encoding='utf-8') == 'Old content'
 
 
 def test_write_bytes(tmp_path: Path) -> None:
@@ -103,3 +103,121 @@ def test_get_extension_unknown_mimetype() -> None:
     with pytest.raises(UnknownMimetypeError) as exc_info:
         get_extension(mimetype)
     assert str(exc_info.value) == mimetype
+
+
+def test_read_failed_urls(tmp_path: Path) -> None:
+    target = tmp_path / 'failed.txt'
+    target.write_text('https://a/\n\nhttps://b/\n', encoding='utf-8')
+    assert read_failed_urls(target) == ['https://a/', 'https://b/']
+
+
+def test_read_failed_urls_missing(tmp_path: Path) -> None:
+    assert read_failed_urls(tmp_path / 'failed.txt') == []
+
+
+def test_atomic_write_leaves_no_partial_file(tmp_path: Path, mocker: MockerFixture) -> None:
+    target = tmp_path / 'out.jpg'
+    target.write_bytes(b'old')
+    mocker.patch('instagram_archiver.utils.Path.replace', side_effect=OSError('rename failed'))
+    with pytest.raises(OSError, match='rename failed'):
+        write_bytes(target, b'new')
+    assert target.read_bytes() == b'old'
+    assert [path.name for path in tmp_path.iterdir()] == ['out.jpg']
+
+
+@pytest.mark.skipif(os.name == 'nt', reason='POSIX permissions')
+def test_atomic_write_uses_umask_permissions(tmp_path: Path) -> None:
+    reference = tmp_path / 'reference'
+    reference.write_bytes(b'')
+    target = tmp_path / 'out.jpg'
+    write_bytes(target, b'new')
+    assert stat.S_IMODE(target.stat().st_mode) == stat.S_IMODE(reference.stat().st_mode)
+
+
+def test_write_sync_batch(tmp_path: Path, mocker: MockerFixture) -> None:
+    mocker.patch('instagram_archiver.utils.write_sync', WriteSync('batch', batch_size=2))
+    mock_fsync = mocker.patch('instagram_archiver.utils.os.fsync')
+    write_bytes(tmp_path / 'a', b'a')
+    mock_fsync.assert_not_called()
+    write_bytes(tmp_path / 'b', b'b')
+    # Two files and their shared directory.
+    assert mock_fsync.call_count == 3
+
+
+def test_write_sync_always(tmp_path: Path, mocker: MockerFixture) -> None:
+    mocker.patch('instagram_archiver.utils.write_sync', WriteSync('always'))
+    mock_fsync = mocker.patch('instagram_archiver.utils.os.fsync')
+    write_bytes(tmp_path / 'a', b'a')
+    # The temporary file before the rename, then the directory.
+    assert mock_fsync.call_count == 2
+
+
+async def test_use_write_sync_applies_to_tasks_of_context(tmp_path: Path,
+                                                          mocker: MockerFixture) -> None:
+    mocker.patch('instagram_archiver.utils.write_sync', WriteSync('never'))
+    mock_fsync = mocker.patch('instagram_archiver.utils.os.fsync')
+
+    async def write(name: str) -> None:
+        write_bytes(tmp_path / name, b'a')
+
+    with use_write_sync(WriteSync('always')):
+        await asyncio.create_task(write('a'))
+    assert mock_fsync.call_count == 2
+    await asyncio.create_task(write('b'))
+    assert mock_fsync.call_count == 2
+
+
+def test_write_sync_never(tmp_path: Path, mocker: MockerFixture) -> None:
+    sync = WriteSync('never')
+    mocker.patch('instagram_archiver.utils.write_sync', sync)
+    mock_fsync = mocker.patch('instagram_archiver.utils.os.fsync')
+    write_bytes(tmp_path / 'a', b'a')
+    sync.sync()
+    mock_fsync.assert_not_called()
+
+
+def test_encode_json_pretty_matches_dump_json(tmp_path: Path) -> None:
+    dump_json(tmp_path / 'a.json', {'b': 1, 'a': [1, 2]})
+    assert encode_json({'b': 1, 'a': [1, 2]}) == (tmp_path / 'a.json').read_bytes()
+
+
+def test_encode_json_compact() -> None:
+    assert encode_json({'b': 1, 'a': [1, 2]}, 'compact') == b'{"a":[1,2],"b":1}'
+
+
+def test_encode_json_gzip_is_deterministic() -> None:
+    content = encode_json({'a': 1}, 'gzip')
+    assert gzip.decompress(content) == b'{"a":1}'
+    assert encode_json({'a': 1}, 'gzip') == content
+
+
+@pytest.mark.parametrize(
+    ('json_format', 'name'),
+    [('compact', 'a.json'), ('gzip', 'a.json.gz'), ('pretty', 'a.json'),
+     pytest.param(
+         'zstd', 'a.json.zst', marks=pytest.mark.skipif(not HAS_ZSTD, reason='Needs Python 3.14'))])
+def test_decode_json_round_trip(json_format: JSONFormat, name: str) -> None:
+    assert decode_json(encode_json({'a': [1, 2]}, json_format), name) == {'a': [1, 2]}
+
+
+@pytest.mark.parametrize(('content', 'name', 'match'),
+                         [(b'{"a":', 'a.json', 'Expecting value'),
+                          (encode_json({'a': 1}, 'gzip')[:-4], 'a.json.gz', 'ended before'),
+                          (b'not gzip', 'a.json.gz', 'Not a gzipped file')])
+def test_decode_json_invalid(content: bytes, name: str, match: str) -> None:
+    with pytest.raises(ValueError, match=match):
+        decode_json(content, name)
+
+
+@pytest.mark.parametrize(('name', 'expected'), [('1.json', '.json'),
+                                                ('1-comments.json.gz', '.json.gz'),
+                                                ('1.json.zst', '.json.zst'), ('1.jpg', None),
+                                                ('1.gz', None)])
+def test_json_suffix_of(name: str, expected: str | None) -> None:
+    assert json_suffix_of(name) == expected
+
+
+def test_json_variants() -> None:
+    assert json_variants(Path('a', '1.json.gz')) == (Path('a', '1.json.gz'), Path(
+        'a', '1.json'), Path('a', '1.json.zst'))
+    assert json_variants(Path('1.jpg')) == (Path('1.jpg'),)
@@ -0,0 +1,277 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+import hashlib
+import json
+import os
+
+from instagram_archiver.compat import UnsupportedCompressionError
+from instagram_archiver.dedup import LogDB
+from instagram_archiver.layout import OutputLayout
+from instagram_archiver.utils import encode_json
+from instagram_archiver.verify import FileCheck, inspect_file, verify_archive
+import pytest
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from pytest_mock import MockerFixture
+
+JPEG = b'\xff\xd8image\xff\xd9'
+
+
+def _sha256(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def test_inspect_file_missing(tmp_path: Path) -> None:
+    assert inspect_file(tmp_path / '1.jpg') is None
+
+
+@pytest.mark.parametrize(('name', 'content', 'complete'),
+                         [('1.jpg', JPEG, True), ('1.jpg', JPEG[:-2], False),
+                          ('1.webp', b'RIFF', True), ('1.json', b'{}', True),
+                          ('1.json', b'{"a":', False), ('1.json.gz', encode_json({}, 'gzip'), True),
+                          ('1.json.gz', encode_json({}, 'gzip')[:-4], False)])
+def test_inspect_file_complete(tmp_path: Path, name: str, content: bytes, *,
+                               complete: bool) -> None:
+    (tmp_path / name).write_bytes(content)
+    assert inspect_file(tmp_path / name) == FileCheck(_sha256(content),
+                                                      len(content),
+                                                      complete=complete)
+
+
+def test_inspect_file_unreadable_compression(tmp_path: Path, mocker: MockerFixture) -> None:
+    mocker.patch('instagram_archiver.verify.decode_json', side_effect=UnsupportedCompressionError)
+    (tmp_path / '1.json.zst').write_bytes(b'zstd')
+    assert inspect_file(tmp_path / '1.json.zst') == FileCheck(_sha256(b'zstd'), 4, complete=None)
+
+
+def test_inspect_file_image_urls(tmp_path: Path) -> None:
+    media_info = {
+        'items': [{
+            'id':
+                '1_9',
+            'carousel_media': [{
+                'id': '2_9',
+                'image_versions2': {
+                    'candidates': [{
+                        'url': 'https://cdn/small.jpg',
+                        'width': 1,
+                        'height': 1
+                    }, {
+                        'url': 'https://cdn/large.jpg',
+                        'width': 2,
+                        'height': 2
+                    }]
+                }
+            }, {
+                'id': '3_9'
+            }]
+        }]
+    }
+    path = tmp_path / '1_9-media-info-0000.json'
+    path.write_text(json.dumps(media_info), encoding='utf-8')
+    check = inspect_file(path)
+    assert check is not None
+    assert check.image_urls == (('2_9', 'https://cdn/large.jpg'),)
+
+
+def _make_archive(root: Path) -> None:
+    (root / '1_9.json').write_text('{}', encoding='utf-8')
+    media_info = {
+        'items': [{
+            'carousel_media': [{
+                'id': '2_9',
+                'image_versions2': {
+                    'candidates': [{
+                        'url': 'https://cdn/2.jpg',
+                        'width': 1,
+                        'height': 1
+                    }]
+                }
+            }],
+            'id': '1_9'
+        }]
+    }
+    (root / '1_9-media-info-0000.json').write_text(json.dumps(media_info), encoding='utf-8')
+    (root / '2_9.jpg').write_bytes(b'\xff\xd8broken\xff\xd9')
+    (root / '4_9.jpg').write_bytes(JPEG)
+    db = LogDB(root / '.log.db')
+    db.save('https://www.instagram.com/api/v1/media/1/info/')
+    db.save('https://cdn/2.jpg')
+    db.save_manifest_entries({
+        '1_9.json': {
+            'digest': _sha256(b'{}'),
+            'media_id': '1_9',
+            'size': 2
+        },
+        '2_9.jpg': {
+            'digest': _sha256(JPEG),
+            'media_id': '2_9',
+            'size': len(b'\xff\xd8broken\xff\xd9')
+        },
+        '5_9-comments.json': {
+            'digest': None,
+            'media_id': '5_9',
+            'size': 2
+        }
+    })
+    db.close()
+
+
+def test_verify_archive(tmp_path: Path) -> None:
+    _make_archive(tmp_path)
+    report = verify_archive(tmp_path, jobs=1)
+    assert report.checked == 5
+    assert report.problems == {
+        '2_9.jpg': 'content does not match the digest',
+        '5_9-comments.json': 'missing'
+    }
+    assert sorted(report.requeued) == ['comments:5_9', 'media:1_9']
+    assert not (tmp_path / '2_9.jpg').exists()
+    assert (tmp_path / '.quarantine' / '2_9.jpg').read_bytes() == b'\xff\xd8broken\xff\xd9'
+    assert report.quarantined == ['2_9.jpg']
+    db = LogDB(tmp_path / '.log.db')
+    assert set(db.manifest()) == {'1_9.json', '1_9-media-info-0000.json', '4_9.jpg'}
+    assert db.manifest('4_9')['4_9.jpg']['digest'] == _sha256(JPEG)
+    assert db.is_saved('https://www.instagram.com/api/v1/media/1/info/') is False
+    assert db.is_saved('https://cdn/2.jpg') is False
+    assert json.loads(db.failures()['media:1_9']['payload']) == {
+        'node': {
+            'carousel_media': [{
+                'id': '2_9',
+                'image_versions2': {
+                    'candidates': [{
+                        'url': 'https://cdn/2.jpg',
+                        'width': 1,
+                        'height': 1
+                    }]
+                }
+            }],
+            'id': '1_9',
+            'pk': '1'
+        }
+    }
+    assert json.loads(db.failures()['comments:5_9']['payload']) == {
+        'node': {
+            'id': '5_9',
+            'pk': '5'
+        }
+    }
+    db.close()
+
+
+def test_verify_archive_requeues_node_from_media_info(tmp_path: Path) -> None:
+    (tmp_path / '2009' / '02').mkdir(parents=True)
+    (tmp_path / '2009/02/1_9.json').write_text('{"id": "1_9", "pk"', encoding='utf-8')
+    item = {'code': 'abc', 'id': '1_9', 'pk': '1', 'taken_at': 1234567890}
+    (tmp_path / '2009/02/1_9-media-info-0000.json').write_text(json.dumps({'items': [item]}),
+                                                               encoding='utf-8')
+    report = verify_archive(tmp_path, jobs=1)
+    assert report.problems == {'2009/02/1_9.json': 'truncated'}
+    db = LogDB(tmp_path / '.log.db')
+    assert json.loads(db.failures()['media:1_9']['payload']) == {'node': item}
+    db.close()
+
+
+def test_verify_archive_forces_media_info_for_damaged_media_info(tmp_path: Path) -> None:
+    node = {'id': '1_9', 'image_versions2': {'candidates': []}, 'pk': '1', 'taken_at': 1234567890}
+    (tmp_path / '1_9.json').write_text(json.dumps(node), encoding='utf-8')
+    (tmp_path / '1_9-media-info-0000.json').write_text('{"items": [', encoding='utf-8')
+    report = verify_archive(tmp_path, jobs=1)
+    assert report.problems == {'1_9-media-info-0000.json': 'truncated'}
+    assert report.quarantined == ['1_9-media-info-0000.json']
+    db = LogDB(tmp_path / '.log.db')
+    assert json.loads(db.failures()['media:1_9']['payload']) == {
+        'force_media_info': True,
+        'node': node
+    }
+    db.close()
+    report = verify_archive(tmp_path, jobs=1)
+    assert report.problems == {}
+    assert report.checked == 1
+
+
+def test_verify_archive_requeues_comments_with_saved_node(tmp_path: Path) -> None:
+    node = {'code': 'abc', 'id': '1_9', 'pk': '1', 'taken_at': 1234567890}
+    (tmp_path / '1_9.json.gz').write_bytes(encode_json(node, 'gzip'))
+    (tmp_path / '1_9-comments.json').write_text('{"comments": [', encoding='utf-8')
+    report = verify_archive(tmp_path, jobs=1)
+    assert report.requeued == ['comments:1_9']
+    db = LogDB(tmp_path / '.log.db')
+    assert json.loads(db.failures()['comments:1_9']['payload']) == {'node': node}
+    db.close()
+
+
+def test_verify_archive_requeues_compressed_comments(tmp_path: Path) -> None:
+    (tmp_path / '1_9-comments.json.gz').write_bytes(encode_json({'comments': []}, 'gzip')[:-4])
+    report = verify_archive(tmp_path, jobs=1)
+    assert report.problems == {'1_9-comments.json.gz': 'truncated'}
+    assert report.requeued == ['comments:1_9']
+
+
+def test_verify_archive_lists_unreadable_compressed_json(tmp_path: Path,
+                                                         mocker: MockerFixture) -> None:
+    mocker.patch('instagram_archiver.verify.decode_json', side_effect=UnsupportedCompressionError)
+    (tmp_path / '1_9.json.zst').write_bytes(b'zstd')
+    (tmp_path / '2_9.json.zst').write_bytes(b'zstd')
+    db = LogDB(tmp_path / '.log.db')
+    db.save_manifest_entries(
+        {'2_9.json.zst': {
+            'digest': _sha256(b'zstd'),
+            'media_id': '2_9',
+            'size': 4
+        }})
+    db.close()
+    report = verify_archive(tmp_path, jobs=1)
+    assert report.checked == 2
+    assert report.problems == {}
+    assert report.unchecked == ['1_9.json.zst']
+    assert report.requeued == []
+    assert (tmp_path / '1_9.json.zst').exists()
+    db = LogDB(tmp_path / '.log.db')
+    assert set(db.manifest()) == {'2_9.json.zst'}
+    db.close()
+
+
+def test_verify_archive_without_requeue_in_process_pool(tmp_path: Path) -> None:
+    _make_archive(tmp_path)
+    report = verify_archive(tmp_path, jobs=2, requeue=False)
+    assert set(report.problems) == {'2_9.jpg', '5_9-comments.json'}
+    assert report.requeued == []
+    assert (tmp_path / '2_9.jpg').exists()
+    db = LogDB(tmp_path / '.log.db')
+    assert db.failures() == {}
+    assert db.is_saved('https://cdn/2.jpg') is True
+    db.close()
+
+
+def test_verify_archive_after_migrate(tmp_path: Path) -> None:
+    (tmp_path / '1_9.json').write_text('{}', encoding='utf-8')
+    (tmp_path / '1_9.jpg').write_bytes(JPEG)
+    os.utime(tmp_path / '1_9.json', (1234567890, 1234567890))
+    db = LogDB(tmp_path / '.log.db')
+    db.save('https://cdn/1.jpg')
+    db.save_manifest_entries({
+        '1_9.json': {
+            'digest': _sha256(b'{}'),
+            'media_id': '1_9',
+            'size': 2
+        },
+        '1_9.jpg': {
+            'digest': _sha256(JPEG),
+            'media_id': '1_9',
+            'size': len(JPEG)
+        }
+    })
+    db.close()
+    assert OutputLayout('date', tmp_path).migrate() == 2
+    report = verify_archive(tmp_path, jobs=1)
+    assert report.checked == 2
+    assert report.problems == {}
+    assert report.requeued == []
+    db = LogDB(tmp_path / '.log.db')
+    assert set(db.manifest()) == {'2009/02/1_9.json', '2009/02/1_9.jpg'}
+    assert db.is_saved('https://cdn/1.jpg') is True
+    db.close()
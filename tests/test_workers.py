@@ -4,6 +4,7 @@ from typing import TYPE_CHECKING, Any
 from unittest.mock import AsyncMock
 import asyncio
 
+from instagram_archiver.client import UnexpectedRedirect
 from instagram_archiver.typing import (
     COMMENTS_PROCESSED,
     IMAGES_PROCESSED,
@@ -12,7 +13,15 @@ from instagram_archiver.typing import (
     Stats,
     YTDLPState,
 )
-from instagram_archiver.workers import WorkerAbort, comments_worker, image_worker, video_worker
+from instagram_archiver.workers import (
+    DeferredRetries,
+    WorkerAbort,
+    comments_worker,
+    failure_key,
+    image_worker,
+    queue_sampler,
+    video_worker,
+)
 import pytest
 
 if TYPE_CHECKING:
@@ -41,6 +50,7 @@ async def test_image_worker_processes_then_exits(mocker: MockerFixture) -> None:
     on_message.assert_called_once()
     on_cleanup.assert_called_once()
     assert stats[IMAGES_PROCESSED] == 1
+    assert stats.workers['image'].items == 1
 
 
 async def test_image_worker_stops_on_event() -> None:
@@ -119,6 +129,7 @@ async def test_comments_worker_processes_then_exits(mocker: MockerFixture) -> No
     on_message.assert_called_once()
     on_cleanup.assert_called_once()
     assert stats[COMMENTS_PROCESSED] == 1
+    assert stats.workers['comments'].items == 1
 
 
 async def test_comments_worker_records_first_exception() -> None:
@@ -175,6 +186,8 @@ async def test_video_worker_success(mocker: MockerFixture) -> None:
                        yt_dlp_state=state)
     save_to_log.assert_called_once_with('https://example.com/v')
     assert stats[VIDEOS_PROCESSED] == 1
+    assert stats.latencies['yt_dlp'].count == 1
+    assert stats.workers['video'].items == 1
     assert state.current_url is None
     assert idle.is_set()
 
@@ -360,3 +373,155 @@ async def test_worker_immediate_sentinel(worker: Any, queue_kind: str,
     first: list[BaseException] = []
     await worker(queue, first, save, stop)
     save.assert_not_called()
+
+
+async def test_queue_sampler_samples_until_cancelled(mocker: MockerFixture) -> None:
+    stats = Stats()
+    queue: asyncio.Queue[Any] = asyncio.Queue()
+    await queue.put(1)
+    stats.track_queue('image', queue)
+    mocker.patch('instagram_archiver.workers.asyncio.sleep',
+                 side_effect=[None, asyncio.CancelledError])
+    with pytest.raises(asyncio.CancelledError):
+        await queue_sampler(stats, 0.1)
+    assert stats.queue_depths['image'].count == 2
+
+
+def test_failure_key() -> None:
+    assert failure_key('video', 'https://example.com/v') == 'video:https://example.com/v'
+    edge: Any = {'node': {'id': 'eid'}}
+    assert failure_key('media', edge) == 'media:eid'
+
+
+async def test_image_worker_deferred_retry_succeeds() -> None:
+    queue: asyncio.Queue[Any] = asyncio.Queue()
+    await queue.put({'node': {'id': 'x'}})
+    save = AsyncMock(side_effect=[RuntimeError('boom'), None])
+    stop = asyncio.Event()
+    first: list[BaseException] = []
+    retry = DeferredRetries(cool_down=0)
+    worker = asyncio.create_task(image_worker(queue, first, save, stop, retry=retry))
+    await retry.settle((queue,), stop)
+    await queue.put(None)
+    await worker
+    assert save.await_count == 2
+    assert not first
+    assert not retry.failures
+
+
+async def test_comments_worker_deferred_retry_exhausted() -> None:
+    queue: asyncio.Queue[Any] = asyncio.Queue()
+    await queue.put({'node': {'id': 'x'}})
+    save = AsyncMock(side_effect=RuntimeError('boom'))
+    stop = asyncio.Event()
+    first: list[BaseException] = []
+    retry = DeferredRetries(attempts=1, cool_down=0)
+    worker = asyncio.create_task(comments_worker(queue, first, save, stop, retry=retry))
+    await retry.settle((queue,), stop)
+    await queue.put(None)
+    await worker
+    assert save.await_count == 2
+    assert not first
+    assert retry.failures == {
+        'comments:x': {
+            'error': 'boom',
+            'kind': 'comments',
+            'payload': '{"node": {"id": "x"}}'
+        }
+    }
+
+
+async def test_image_worker_fatal_error_not_deferred() -> None:
+    queue: asyncio.Queue[Any] = asyncio.Queue()
+    await queue.put({'node': {'id': 'x'}})
+    save = AsyncMock(side_effect=UnexpectedRedirect)
+    stop = asyncio.Event()
+    first: list[BaseException] = []
+    retry = DeferredRetries(cool_down=0)
+    await image_worker(queue, first, save, stop, fatal=(UnexpectedRedirect,), retry=retry)
+    assert isinstance(first[0], UnexpectedRedirect)
+    assert stop.is_set()
+    assert not retry.failures
+    save.assert_awaited_once()
+
+
+async def test_comments_worker_fatal_error_not_deferred() -> None:
+    queue: asyncio.Queue[Any] = asyncio.Queue()
+    await queue.put({'node': {'id': 'x'}})
+    save = AsyncMock(side_effect=UnexpectedRedirect)
+    stop = asyncio.Event()
+    first: list[BaseException] = []
+    retry = DeferredRetries(cool_down=0)
+    await comments_worker(queue, first, save, stop, fatal=(UnexpectedRedirect,), retry=retry)
+    assert isinstance(first[0], UnexpectedRedirect)
+    assert stop.is_set()
+    assert not retry.failures
+    save.assert_awaited_once()
+
+
+async def test_video_worker_deferred_retry(mocker: MockerFixture) -> None:
+    queue: asyncio.Queue[Any] = asyncio.Queue()
+    await queue.put('https://example.com/v')
+    ydl = mocker.MagicMock()
+    ydl.download = AsyncMock(side_effect=[1, 1, 1])
+    stop = asyncio.Event()
+    first: list[BaseException] = []
+    failed: set[str] = set()
+    retry = DeferredRetries(cool_down=0)
+    state = YTDLPState(total_urls=1)
+    worker = asyncio.create_task(
+        video_worker(queue,
+                     first,
+                     failed,
+                     stop,
+                     fail=False,
+                     is_saved=mocker.MagicMock(return_value=False),
+                     retry=retry,
+                     save_to_log=mocker.MagicMock(),
+                     ydl=ydl,
+                     yt_dlp_state=state))
+    await retry.settle((queue,), stop)
+    await queue.put(None)
+    await worker
+    assert ydl.download.await_count == 3
+    assert failed == {'https://example.com/v'}
+    assert state.current_index == 1
+    assert retry.failures['video:https://example.com/v'] == {
+        'error': 'yt-dlp returned error code 1',
+        'kind': 'video',
+        'payload': 'https://example.com/v'
+    }
+
+
+async def test_video_worker_fail_skips_deferred_retry(mocker: MockerFixture) -> None:
+    queue: asyncio.Queue[Any] = asyncio.Queue()
+    await queue.put('https://example.com/v')
+    ydl = mocker.MagicMock()
+    ydl.download = AsyncMock(side_effect=RuntimeError('boom'))
+    stop = asyncio.Event()
+    first: list[BaseException] = []
+    failed: set[str] = set()
+    retry = DeferredRetries(cool_down=0)
+    await video_worker(queue,
+                       first,
+                       failed,
+                       stop,
+                       fail=True,
+                       is_saved=mocker.MagicMock(return_value=False),
+                       retry=retry,
+                       save_to_log=mocker.MagicMock(),
+                       ydl=ydl)
+    assert isinstance(first[0], WorkerAbort)
+    assert failed == {'https://example.com/v'}
+    assert not retry.failures
+
+
+async def test_deferred_retries_settle_records_pending_on_stop() -> None:
+    queue: asyncio.Queue[Any] = asyncio.Queue()
+    stop = asyncio.Event()
+    retry = DeferredRetries(cool_down=3600)
+    assert retry.defer('video', queue, 'https://example.com/v', RuntimeError())
+    stop.set()
+    await retry.settle((queue,), stop)
+    assert queue.empty()
+    assert retry.failures['video:https://example.com/v']['error'] == 'RuntimeError'